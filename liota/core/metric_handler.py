@@ -30,31 +30,174 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 
-from Queue import Queue, PriorityQueue, Full
-import heapq
+from Queue import Queue, PriorityQueue, Full, Empty
+from collections import deque
+from functools import partial
+from multiprocessing import Pool
 import logging
-from threading import Thread, Condition, Lock
-from time import time as _time
+import pickle
+import traceback
+import weakref
+from threading import Thread, Condition, Lock, RLock
+from time import time as _time, sleep as _sleep
 
-from liota.lib.utilities.utility import getUTCmillis
+from liota.lib.utilities.utility import getUTCmillis, getMonotonicMillis
 from liota.lib.utilities.utility import read_liota_config
 
+try:
+    import asyncio
+except ImportError:
+    try:
+        import trollius as asyncio
+    except ImportError:
+        asyncio = None
+
 log = logging.getLogger(__name__)
 
 event_ds = None
 collect_queue = None
 send_queue = None
 event_checker_thread = None
-send_thread = None
 collect_thread_pool = None
+collect_batch_size = 1
+async_engine = None
+async_max_concurrency = 1000
+process_engine = None
+process_pool_size = 0
+metric_buffer_capacity = 0
+metric_stats_enabled = True
+collect_timeout_s = 0
+quarantine_max_backoff_s = 3600
+# metrics started and not stopped, for statistics
+collecting_metrics = set()
+phase_spreading = False
+max_jitter_ms = 0
+# width in milliseconds of the phase slots counted by get_schedule_stats()
+phase_stats_slot_ms = 100
 
 
 class EventsPriorityQueue(PriorityQueue):
+    """
+    Indexed binary heap of events.  Every event records its position in the
+    heap in its '_event_index' attribute, so that a given metric can be
+    removed or moved in O(log n) without scanning the heap.
+    """
 
     def __init__(self):
         PriorityQueue.__init__(self)
         self.first_element_changed = Condition(self.mutex)
 
+    def _put(self, item, heappush=None):
+        item._event_index = len(self.queue)
+        self.queue.append(item)
+        self._sift_up(item._event_index)
+
+    def _get(self, heappop=None):
+        return self._remove_at(0)
+
+    def _sift_up(self, pos):
+        queue = self.queue
+        item = queue[pos]
+        while pos > 0:
+            parent_pos = (pos - 1) >> 1
+            parent = queue[parent_pos]
+            if not item < parent:
+                break
+            queue[pos] = parent
+            parent._event_index = pos
+            pos = parent_pos
+        queue[pos] = item
+        item._event_index = pos
+
+    def _sift_down(self, pos):
+        queue = self.queue
+        end_pos = len(queue)
+        item = queue[pos]
+        child_pos = 2 * pos + 1
+        while child_pos < end_pos:
+            right_pos = child_pos + 1
+            if right_pos < end_pos and queue[right_pos] < queue[child_pos]:
+                child_pos = right_pos
+            if not queue[child_pos] < item:
+                break
+            queue[pos] = queue[child_pos]
+            queue[pos]._event_index = pos
+            pos = child_pos
+            child_pos = 2 * pos + 1
+        queue[pos] = item
+        item._event_index = pos
+
+    def _fix(self, pos):
+        if pos > 0 and self.queue[pos] < self.queue[(pos - 1) >> 1]:
+            self._sift_up(pos)
+        else:
+            self._sift_down(pos)
+
+    def _remove_at(self, pos):
+        queue = self.queue
+        last = queue.pop()
+        if pos == len(queue):
+            item = last
+        else:
+            item = queue[pos]
+            queue[pos] = last
+            last._event_index = pos
+            self._fix(pos)
+        item._event_index = None
+        return item
+
+    def _index_of(self, item):
+        pos = getattr(item, '_event_index', None)
+        if pos is None or pos >= len(self.queue) or self.queue[pos] is not item:
+            return None
+        return pos
+
+    def snapshot(self):
+        """
+        Get the events currently waiting in the queue, in no particular order.
+        :return: list of events
+        """
+        with self.mutex:
+            return list(self.queue)
+
+    def cancel(self, item):
+        """
+        Remove event from events priority queue in O(log n).
+        :param item: the event to be removed
+        :return: True if the event was in the queue, otherwise False
+        """
+        with self.first_element_changed:
+            pos = self._index_of(item)
+            if pos is None:
+                return False
+            self._remove_at(pos)
+            if pos == 0:
+                self.first_element_changed.notify()
+            log.debug("Cancelled Event:" + str(item))
+            return True
+
+    def reschedule(self, item, new_interval):
+        """
+        Change the interval of a metric and move its pending event in
+        O(log n).  If the metric is not in the queue (i.e., it is being
+        collected), only its interval is changed and will be used when it
+        is put back.
+        :param item: the metric to be rescheduled
+        :param new_interval: new sampling interval in seconds
+        :return: True if the pending event was moved, otherwise False
+        """
+        with self.first_element_changed:
+            pos = self._index_of(item)
+            item.set_interval(new_interval, pos is not None)
+            if pos is None:
+                return False
+            first_element_before = self.queue[0]
+            self._fix(pos)
+            if first_element_before is not self.queue[0] or pos == 0:
+                self.first_element_changed.notify()
+            log.debug("Rescheduled Event:" + str(item))
+            return True
+
     def put_and_notify(self, item, block=True, timeout=None):
         """
         Add event into events priority queue and notify thread waiting to get.
@@ -96,6 +239,61 @@ class EventsPriorityQueue(PriorityQueue):
         finally:
             self.not_full.release()
 
+    def put_all_and_notify(self, items):
+        """
+        Add several events into events priority queue while holding the lock
+        once, and notify thread waiting to get if the first event changed.
+        :param items: list of events to be added
+        :return:
+        """
+        if not items:
+            return
+        with self.first_element_changed:
+            first_element_before_insertion = None
+            if self._qsize() > 0:
+                first_element_before_insertion = self.queue[0]
+            for item in items:
+                self._put(item)
+            self.unfinished_tasks += len(items)
+            self.not_empty.notify()
+            if first_element_before_insertion is not self.queue[0]:
+                self.first_element_changed.notify()
+
+    def get_ready_elements(self):
+        """
+        Wait until the first event is ready, then pop every event that is
+        ready at that moment in one critical section:
+        SystemExit event and dead events are always ready; SystemExit ends
+        the batch.
+        :return: list of ready events
+        """
+        with self.first_element_changed:
+            while True:
+                if self._qsize() > 0:
+                    first_element = self.queue[0]
+                    now = getUTCmillis()
+                    if isinstance(first_element, SystemExit) \
+                            or not first_element.flag_alive \
+                            or first_element.get_next_run_time() <= now:
+                        break
+                    timeout = (first_element.get_next_run_time() - now) / 1000.0
+                    log.debug("Waiting on acquired first_element_changed LOCK "
+                              + "for: %.2f" % timeout)
+                    self.first_element_changed.wait(timeout)
+                else:
+                    self.first_element_changed.wait()
+            ready = []
+            while self._qsize() > 0:
+                first_element = self.queue[0]
+                if isinstance(first_element, SystemExit):
+                    ready.append(self._get())
+                    break
+                if first_element.flag_alive \
+                        and first_element.get_next_run_time() > now:
+                    break
+                ready.append(self._get())
+            return ready
+
     def get_next_element_when_ready(self):
         """
         Get next event from events priority queue when it is ready:
@@ -137,6 +335,364 @@ class EventsPriorityQueue(PriorityQueue):
             self.first_element_changed.release()
 
 
+class EventsTimerWheel:
+    """
+    Hierarchical timing wheel with the same interface as EventsPriorityQueue.
+
+    Level 0 has one slot per tick; every slot of level L spans
+    wheel_size ** L ticks.  An event is put into the lowest level whose span
+    covers its delay and is cascaded down one level at a time as the wheel
+    turns, so both insertion and expiry are O(1) regardless of the number of
+    scheduled metrics.  The wheel is driven by the monotonic clock, so wall
+    clock adjustments do not stall or burst collection.
+    """
+
+    def __init__(self, tick_ms=10, wheel_bits=6, levels=4):
+        """
+        :param tick_ms: resolution of the wheel in milliseconds
+        :param wheel_bits: log2 of the number of slots per level
+        :param levels: number of levels of the wheel
+        """
+        if tick_ms <= 0:
+            raise ValueError("'tick_ms' must be a positive number")
+        self.tick_ms = tick_ms
+        self._bits = wheel_bits
+        self._size = 1 << wheel_bits
+        self._mask = self._size - 1
+        self._levels = levels
+        self._range = 1 << (wheel_bits * levels)
+        self._wheels = [[{} for _ in range(self._size)]
+                        for _ in range(levels)]
+        self._overflow = {}
+        self._ready = deque()
+        self._count = 0
+        self._current_tick = self._now_tick()
+        self._wait_until_tick = None
+        self.mutex = Lock()
+        self.first_element_changed = Condition(self.mutex)
+
+    def _now_tick(self):
+        return getMonotonicMillis() // self.tick_ms
+
+    def qsize(self):
+        """
+        Get the number of events in the wheel.
+        :return: number of events
+        """
+        with self.mutex:
+            return self._count
+
+    def _insert(self, expiry_tick, item):
+        delta = expiry_tick - self._current_tick
+        if delta <= 0:
+            item._event_slot = None
+            self._ready.append(item)
+            return
+        if delta >= self._range:
+            item._event_slot = self._overflow
+            self._overflow[id(item)] = (expiry_tick, item)
+            return
+        level = 0
+        while delta >= (1 << (self._bits * (level + 1))):
+            level += 1
+        slot = self._wheels[level][
+            (expiry_tick >> (self._bits * level)) & self._mask]
+        item._event_slot = slot
+        slot[id(item)] = (expiry_tick, item)
+
+    def _unlink(self, item):
+        """
+        Remove item from the wheel in O(1) (O(ready) if already expired).
+        :return: expiry tick of the item, or None if it is not in the wheel
+        """
+        slot = getattr(item, '_event_slot', None)
+        if slot is not None and id(item) in slot:
+            expiry_tick, _ = slot.pop(id(item))
+            item._event_slot = None
+            return expiry_tick
+        # compare by identity, metrics with same run time compare equal
+        for i, ready in enumerate(self._ready):
+            if ready is item:
+                del self._ready[i]
+                return self._current_tick
+        return None
+
+    def _next_event_tick(self):
+        """
+        Get the earliest tick at which a slot of any level has to be
+        processed, either expired (level 0) or cascaded (upper levels).
+        :return: tick or None if the wheel is empty
+        """
+        next_tick = None
+        for level in range(self._levels):
+            shift = self._bits * level
+            base = self._current_tick >> shift
+            slots = self._wheels[level]
+            for k in range(1, self._size + 1):
+                if slots[(base + k) & self._mask]:
+                    tick = (base + k) << shift
+                    if next_tick is None or tick < next_tick:
+                        next_tick = tick
+                    break
+        if self._overflow:
+            tick = min(e for e, _ in self._overflow.itervalues()) \
+                - self._range + 1
+            if next_tick is None or tick < next_tick:
+                next_tick = tick
+        return next_tick
+
+    def _process_tick(self):
+        tick = self._current_tick
+        for level in range(1, self._levels):
+            shift = self._bits * level
+            if tick & ((1 << shift) - 1):
+                break
+            slot = (tick >> shift) & self._mask
+            entries = self._wheels[level][slot]
+            if entries:
+                self._wheels[level][slot] = {}
+                for expiry_tick, item in entries.itervalues():
+                    self._insert(expiry_tick, item)
+        if self._overflow:
+            overflow = self._overflow
+            self._overflow = {}
+            for expiry_tick, item in overflow.itervalues():
+                self._insert(expiry_tick, item)
+        slot = tick & self._mask
+        entries = self._wheels[0][slot]
+        if entries:
+            self._wheels[0][slot] = {}
+            for _, item in entries.itervalues():
+                item._event_slot = None
+                self._ready.append(item)
+
+    def _advance(self, now_tick):
+        """
+        Turn the wheel up to now_tick, skipping ticks without any work.
+        """
+        while self._current_tick < now_tick:
+            next_tick = self._next_event_tick()
+            if next_tick is None or next_tick > now_tick:
+                self._current_tick = now_tick
+                break
+            self._current_tick = max(next_tick, self._current_tick + 1)
+            self._process_tick()
+
+    def put_and_notify(self, item, block=True, timeout=None):
+        """
+        Add event into the wheel and notify thread waiting to get if the
+        event is due earlier than what it is waiting for.
+        :param item: the event to be added
+        :param block: unused, the wheel is unbounded
+        :param timeout: unused, the wheel is unbounded
+        :return:
+        """
+        log.debug("Adding Event:" + str(item))
+        with self.first_element_changed:
+            self._count += 1
+            if isinstance(item, SystemExit):
+                self._ready.appendleft(item)
+                self.first_element_changed.notify()
+                return
+            expiry_tick = self._expiry_tick(item)
+            self._insert(expiry_tick, item)
+            if self._ready or self._wait_until_tick is None \
+                    or expiry_tick < self._wait_until_tick:
+                self.first_element_changed.notify()
+
+    def _expiry_tick(self, item):
+        delay_ms = item.get_next_run_time() - getUTCmillis()
+        # round up so that an event never fires before its run time
+        return -(-(getMonotonicMillis() + delay_ms) // self.tick_ms)
+
+    def snapshot(self):
+        """
+        Get the events currently waiting in the wheel, in no particular order.
+        :return: list of events
+        """
+        with self.mutex:
+            items = list(self._ready)
+            for slots in self._wheels:
+                for slot in slots:
+                    items.extend(item for _, item in slot.itervalues())
+            items.extend(item for _, item in self._overflow.itervalues())
+            return items
+
+    def cancel(self, item):
+        """
+        Remove event from the wheel in O(1).
+        :param item: the event to be removed
+        :return: True if the event was in the wheel, otherwise False
+        """
+        with self.first_element_changed:
+            if self._unlink(item) is None:
+                return False
+            self._count -= 1
+            log.debug("Cancelled Event:" + str(item))
+            return True
+
+    def reschedule(self, item, new_interval):
+        """
+        Change the interval of a metric and move its pending event in O(1).
+        If the metric is not in the wheel (i.e., it is being collected),
+        only its interval is changed and will be used when it is put back.
+        :param item: the metric to be rescheduled
+        :param new_interval: new sampling interval in seconds
+        :return: True if the pending event was moved, otherwise False
+        """
+        with self.first_element_changed:
+            scheduled = self._unlink(item) is not None
+            item.set_interval(new_interval, scheduled)
+            if not scheduled:
+                return False
+            expiry_tick = self._expiry_tick(item)
+            self._insert(expiry_tick, item)
+            if self._ready or self._wait_until_tick is None \
+                    or expiry_tick < self._wait_until_tick:
+                self.first_element_changed.notify()
+            log.debug("Rescheduled Event:" + str(item))
+            return True
+
+    def put_all_and_notify(self, items):
+        """
+        Add several events into the wheel while holding the lock once.
+        :param items: list of events to be added
+        :return:
+        """
+        if not items:
+            return
+        with self.first_element_changed:
+            notify = False
+            for item in items:
+                expiry_tick = self._expiry_tick(item)
+                self._insert(expiry_tick, item)
+                if self._wait_until_tick is None \
+                        or expiry_tick < self._wait_until_tick:
+                    notify = True
+            self._count += len(items)
+            if notify or self._ready:
+                self.first_element_changed.notify()
+
+    def get_ready_elements(self):
+        """
+        Wait until at least one event is ready, then pop every ready event
+        in one critical section.
+        :return: list of ready events
+        """
+        with self.first_element_changed:
+            self._wait_ready()
+            ready = list(self._ready)
+            self._ready.clear()
+            self._count -= len(ready)
+            return ready
+
+    def get_next_element_when_ready(self):
+        """
+        Get next event from the wheel when it is ready:
+        for SystemExit event, return immediately;
+        for other events, wait until their tick expires.
+        :return:
+        """
+        with self.first_element_changed:
+            self._wait_ready()
+            self._count -= 1
+            return self._ready.popleft()
+
+    def _wait_ready(self):
+        """
+        Wait with the lock held until there is at least one ready event.
+        """
+        while True:
+            if not self._ready:
+                self._advance(self._now_tick())
+            if self._ready:
+                self._wait_until_tick = None
+                return
+            next_tick = self._next_event_tick()
+            self._wait_until_tick = next_tick
+            if next_tick is None:
+                timeout = None
+            else:
+                timeout = max(next_tick * self.tick_ms
+                              - getMonotonicMillis(), 0) / 1000.0
+            log.debug("Waiting on timer wheel for: %s" % str(timeout))
+            self.first_element_changed.wait(timeout)
+
+
+class BoundedQueue(Queue):
+    """
+    Queue with a backpressure policy applied when it is full:
+        - block: block the producer until there is room
+        - drop_oldest: evict the oldest item to make room for the new one
+        - drop_newest: discard the new item
+    Dropped items are counted and handed to on_drop, if given.  SystemExit
+    signals are never dropped.
+    """
+
+    BLOCK = "block"
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+    def __init__(self, maxsize=0, policy=BLOCK, on_drop=None):
+        """
+        :param maxsize: capacity of the queue, 0 for unbounded
+        :param policy: one of POLICIES
+        :param on_drop: function called with every dropped item
+        """
+        if policy not in BoundedQueue.POLICIES:
+            raise ValueError("Queue policy must be one of %s"
+                             % str(BoundedQueue.POLICIES))
+        Queue.__init__(self, maxsize)
+        self.policy = policy
+        self.num_dropped = 0
+        self._on_drop = on_drop
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Put an item into the queue, applying the policy if it is full.
+        :param item: item to be put
+        :return: True if the item was queued, False if it was dropped
+        """
+        if self.policy == BoundedQueue.BLOCK \
+                or isinstance(item, SystemExit):
+            Queue.put(self, item, block, timeout)
+            return True
+        dropped = item
+        with self.not_full:
+            if self.maxsize <= 0 or self._qsize() < self.maxsize:
+                dropped = None
+            elif self.policy == BoundedQueue.DROP_OLDEST \
+                    and not isinstance(self.queue[0], SystemExit):
+                dropped = self._get()
+            if dropped is not item:
+                self._put(item)
+                self.unfinished_tasks += 1
+                self.not_empty.notify()
+            if dropped is not None:
+                self.num_dropped += 1
+        if dropped is not None and self._on_drop is not None:
+            self._on_drop(dropped)
+        return dropped is not item
+
+
+def skip_collection(metrics):
+    """
+    Skip this collection of metrics dropped from collect queue: put them
+    back into events data structure for their next run.
+    :param metrics: batch of RegisteredMetric
+    :return:
+    """
+    log.warning("Collect queue is full, skipped collection of %d metrics"
+                % len(metrics))
+    next_events = []
+    for metric in metrics:
+        if metric.flag_alive:
+            metric.set_next_run_time()
+            next_events.append(metric)
+    event_ds.put_all_and_notify(next_events)
+
+
 class EventCheckerThread(Thread):
 
     def __init__(self, name=None):
@@ -147,10 +703,11 @@ class EventCheckerThread(Thread):
     def run(self):
         """
         The execution function of EventCheckerThread.
-        Loop on events priority queue to get next ready event:
+        Loop on events priority queue to get all the events ready at once:
         for SystemExit event, kill the thread;
         for dead event, discard it;
-        for active event, put it into collect queue for execution.
+        for active events, put them into collect queue for execution in
+            batches of at most collect_batch_size metrics.
         :return:
         """
         log.info("Started EventCheckerThread")
@@ -158,110 +715,876 @@ class EventCheckerThread(Thread):
         global collect_queue
         while self.flag_alive:
             log.debug("Waiting for event...")
-            metric = event_ds.get_next_element_when_ready()
-            if isinstance(metric, SystemExit):
-                log.debug("Got exit signal")
+            metrics = event_ds.get_ready_elements()
+            batch = []
+            async_batch = []
+            process_batch = []
+            got_exit = False
+            for metric in metrics:
+                if isinstance(metric, SystemExit):
+                    log.debug("Got exit signal")
+                    got_exit = True
+                    break
+                if not metric.flag_alive:
+                    log.debug("Discarded dead metric: %s" % str(metric))
+                    continue
+                if AsyncCollectionEngine.accepts(metric):
+                    async_batch.append(metric)
+                elif ProcessCollectionEngine.accepts(metric):
+                    process_batch.append(metric)
+                else:
+                    batch.append(metric)
+            log.debug("Got %d events" % (len(batch) + len(async_batch)
+                                         + len(process_batch)))
+            for i in range(0, len(batch), collect_batch_size):
+                collect_queue.put(batch[i:i + collect_batch_size])
+            if collect_thread_pool is not None:
+                collect_thread_pool.autoscale()
+            if async_batch:
+                get_async_engine().submit(async_batch)
+            if process_batch:
+                get_process_engine().submit(process_batch)
+            if got_exit:
                 break
-            log.debug("Got event:" + str(metric))
-            if not metric.flag_alive:
-                log.debug("Discarded dead metric: %s" % str(metric))
-                continue
-            collect_queue.put(metric)
         log.info("Thread exits: %s" % str(self.name))
 
 
 class SendThread(Thread):
 
-    def __init__(self, name=None):
+    def __init__(self, lane, name=None):
         Thread.__init__(self, name=name)
         self.flag_alive = True
+        self._lane = lane
         self.start()
 
     def run(self):
         """
         The execution function of SendThread.
-        Loop on send queue to get next ready send task:
+        Loop on the send queue of its DCC to get next ready send tasks:
         for SystemExit, kill the thread;
         for dead metric task, discard it;
-        for active metric task, send metric data out.
+        for active metric tasks, send metric data out, in one batch if
+            more than one metric was ready within the linger time.
         :return:
         """
         log.info("Started SendThread")
-        global send_queue
         while self.flag_alive:
             log.debug("Waiting to send...")
-            metric = send_queue.get()
-            if isinstance(metric, SystemExit):
+            metrics = self._lane.get_batch()
+            got_exit = isinstance(metrics[-1], SystemExit)
+            if got_exit:
                 log.debug("Got exit signal")
+                metrics.pop()
+            log.debug("Got %d items in send_queue" % len(metrics))
+            try:
+                alive = []
+                for metric in metrics:
+                    if metric.flag_alive:
+                        alive.append(metric)
+                    else:
+                        log.debug("Discarded dead metric: %s" % str(metric))
+                if len(alive) == 1:
+                    self._lane.task_done(alive, alive[0].send_data() is not False)
+                elif alive:
+                    self._lane.task_done(alive, send_batch(alive))
+            finally:
+                self._lane.release(metrics)
+            if got_exit:
                 break
-            log.debug("Got item in send_queue: " + str(metric))
-            if not metric.flag_alive:
-                log.debug("Discarded dead metric: %s" % str(metric))
-                continue
-            metric.send_data()
         log.info("Thread exits: %s" % str(self.name))
 
 
+def send_batch(metrics):
+    """
+    Send collected data of several metrics of the same DCC out at once.
+    :param metrics: list of RegisteredMetric sharing the same ref_dcc
+    :return: False if publishing failed, otherwise True
+    """
+    metrics = [m for m in metrics if m.values.qsize() > 0]
+    if not metrics:
+        # No values measured since last report_data
+        return True
+    log.info("Publishing values for %d resources" % len(metrics))
+    started = _time()
+    succeeded = True
+    try:
+        metrics[0].ref_dcc.publish_batch(metrics)
+    except Exception:
+        log.error("Exception while publishing message", exc_info=True)
+        succeeded = False
+    if metric_stats_enabled:
+        ended = _time()
+        for metric in metrics:
+            metric.record_send(started, ended, succeeded)
+    return succeeded
+
+
+class DccSendLane:
+    """
+    Bounded send queue and worker threads of one DCC instance, so that a
+    slow or failing DCC only delays its own metrics.
+
+    A metric is queued at most once per lane: while it is waiting or being
+    sent, further send requests are coalesced, as the next send_data() will
+    publish every value collected in the meantime anyway.  When the queue
+    is full, the policy decides whether to block the collection thread
+    ("block"), drop the oldest send request ("drop_oldest"), or drop the new
+    one ("coalesce").  Values of a dropped send request stay buffered in the
+    metric and go out with its next send.
+    """
+
+    POLICIES = {
+        "block": BoundedQueue.BLOCK,
+        "drop_oldest": BoundedQueue.DROP_OLDEST,
+        "coalesce": BoundedQueue.DROP_NEWEST
+    }
+
+    def __init__(self, dcc, num_workers, maxsize, batch_linger_ms=0,
+                 batch_max_size=1, policy="coalesce"):
+        """
+        :param dcc: DataCenterComponent instance
+        :param num_workers: number of SendThread for this DCC
+        :param maxsize: capacity of the send queue of this DCC
+        :param batch_linger_ms: how long a worker waits for more metrics to
+                publish them in one batch, 0 to publish metrics one by one
+        :param batch_max_size: max number of metrics published in one batch
+        :param policy: what to do when the send queue is full: "block",
+                "drop_oldest" or "coalesce"
+        """
+        if policy not in DccSendLane.POLICIES:
+            raise ValueError("Send queue policy must be one of %s"
+                             % str(sorted(DccSendLane.POLICIES)))
+        self.name = "%s-%x" % (type(dcc).__name__, id(dcc))
+        self._batch_linger = batch_linger_ms / 1000.0
+        self._batch_max_size = max(batch_max_size, 1)
+        self._queue = BoundedQueue(maxsize, DccSendLane.POLICIES[policy],
+                                   on_drop=self._on_drop)
+        self._pending = set()
+        self._stat_lock = Lock()
+        self._num_sent = 0
+        self._num_failed = 0
+        self._num_dropped = 0
+        self._num_coalesced = 0
+        self._workers = [SendThread(self, name="Sender-%s-%d" % (self.name, j + 1))
+                         for j in range(num_workers)]
+
+    def put(self, metric):
+        """
+        Queue a metric to send, applying the policy if the queue is full.
+        :param metric: RegisteredMetric ready to send
+        :return: True if queued, False if coalesced or dropped
+        """
+        with self._stat_lock:
+            if id(metric) in self._pending:
+                self._num_coalesced += 1
+                return False
+            self._pending.add(id(metric))
+        return self._queue.put(metric)
+
+    def _on_drop(self, metric):
+        with self._stat_lock:
+            self._pending.discard(id(metric))
+            self._num_dropped += 1
+        log.warning("Send queue of %s is full, dropped send of %s"
+                    % (self.name, str(metric)))
+
+    def get_batch(self):
+        """
+        Wait for a metric to send, then wait up to the linger time for more
+        metrics to send along with it.
+        :return: list of metrics, ending with SystemExit if got exit signal
+        """
+        batch = [self._queue.get()]
+        if self._batch_linger <= 0 or isinstance(batch[0], SystemExit):
+            return batch
+        deadline = _time() + self._batch_linger
+        while len(batch) < self._batch_max_size:
+            remaining = deadline - _time()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get(block=False)
+            except Empty:
+                break
+            batch.append(item)
+            if isinstance(item, SystemExit):
+                break
+        return batch
+
+    def task_done(self, metrics, succeeded):
+        with self._stat_lock:
+            if succeeded:
+                self._num_sent += len(metrics)
+            else:
+                self._num_failed += len(metrics)
+
+    def release(self, metrics):
+        with self._stat_lock:
+            for metric in metrics:
+                self._pending.discard(id(metric))
+
+    def stop(self):
+        """
+        Signal every worker of the lane to exit.
+        :return:
+        """
+        for worker in self._workers:
+            worker.flag_alive = False
+            self._queue.put(SystemExit())
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        """
+        Get the status of the lane.
+        :return: [queued, sent, failed, dropped, coalesced, workers]
+        """
+        with self._stat_lock:
+            return [self._queue.qsize(),
+                    self._num_sent,
+                    self._num_failed,
+                    self._num_dropped,
+                    self._num_coalesced,
+                    len(self._workers)]
+
+
+class SendStage:
+    """
+    Send stage of the metric pipeline: routes each metric ready to send to
+    the DccSendLane of its DCC, created on first use.  Lanes are keyed by
+    weak references to their DCC, and stopped once it is garbage-collected.
+    """
+
+    def __init__(self, num_workers_per_dcc, maxsize_per_dcc,
+                 batch_linger_ms=0, batch_max_size=1, policy="coalesce"):
+        """
+        :param num_workers_per_dcc: number of SendThread per DCC instance
+        :param maxsize_per_dcc: capacity of the send queue of each DCC
+        :param batch_linger_ms: linger time of batch publishing, 0 to disable
+        :param batch_max_size: max number of metrics per batch
+        :param policy: policy of send queues when full, see DccSendLane
+        """
+        if policy not in DccSendLane.POLICIES:
+            raise ValueError("Send queue policy must be one of %s"
+                             % str(sorted(DccSendLane.POLICIES)))
+        self._num_workers_per_dcc = num_workers_per_dcc
+        self._maxsize_per_dcc = maxsize_per_dcc
+        self._batch_linger_ms = batch_linger_ms
+        self._batch_max_size = batch_max_size
+        self._policy = policy
+        # weak reference of DCC: DccSendLane
+        self._lanes = {}
+        # reentrant, as _remove_lane() may run from garbage collection in a
+        # thread holding it
+        self._lanes_lock = RLock()
+
+    def get_lane(self, dcc):
+        """
+        Get the send lane of a DCC instance, creating it if needed.
+        :param dcc: DataCenterComponent instance
+        :return: DccSendLane
+        """
+        lane = self._lanes.get(weakref.ref(dcc))
+        if lane is None:
+            with self._lanes_lock:
+                lane = self._lanes.get(weakref.ref(dcc))
+                if lane is None:
+                    lane = DccSendLane(dcc, self._num_workers_per_dcc,
+                                       self._maxsize_per_dcc,
+                                       self._batch_linger_ms,
+                                       self._batch_max_size,
+                                       self._policy)
+                    self._lanes[weakref.ref(dcc, self._remove_lane)] = lane
+        return lane
+
+    def _remove_lane(self, dcc_ref):
+        """
+        Stop the send lane of a garbage-collected DCC.
+        :param dcc_ref: dead weak reference of the DCC
+        :return:
+        """
+        with self._lanes_lock:
+            lane = self._lanes.pop(dcc_ref, None)
+        if lane is not None:
+            log.info("Stopping send lane of collected %s" % lane.name)
+            lane.stop()
+
+    def put(self, metric):
+        """
+        Route a metric to the send lane of its DCC; SystemExit stops all
+        lanes.
+        :param metric: RegisteredMetric ready to send, or SystemExit
+        :return:
+        """
+        if isinstance(metric, SystemExit):
+            with self._lanes_lock:
+                for lane in self._lanes.values():
+                    lane.stop()
+            return
+        self.get_lane(metric.ref_dcc).put(metric)
+
+    def qsize(self):
+        """
+        Get the number of metrics waiting to be sent over all DCCs.
+        :return: number of metrics
+        """
+        with self._lanes_lock:
+            return sum(lane.qsize() for lane in self._lanes.values())
+
+    def get_stats(self):
+        """
+        Get the status of every send lane.
+        :return: dict of lane name to DccSendLane.get_stats()
+        """
+        with self._lanes_lock:
+            lanes = self._lanes.values()
+        return dict((lane.name, lane.get_stats()) for lane in lanes)
+
+
 class CollectionThread(Thread):
 
-    def __init__(self, worker_stat_lock, name=None):
+    def __init__(self, worker_stat_lock, name=None, pool=None):
         Thread.__init__(self, name=name)
         self.daemon = True
         self.working_obj = None
+        self.working_since = None
+        self.last_active = getMonotonicMillis()
+        # set by the watchdog when it gives up on a hung collection
+        self.abandoned = False
         self._worker_stat_lock = worker_stat_lock
+        self._pool = pool
+        self._batch = []
+        self._batch_pos = 0
+        self._next_events = []
         self.start()
 
     def run(self):
         """
         The execution function of CollectionThread.
-        Loop on collect queue to get next ready collection task:
+        Loop on collect queue to get next batch of ready collection tasks:
+        for SystemExit, retire the thread from its pool;
         for dead metric task, discard it;
-        for active metric task, collect data for that metric, then put
-            its next event into events priority queue; if its data is
-            ready to send, put it into send queue and reset for next round.
+        for quarantined metric task whose previous collection is still
+            hung, back off again without collecting;
+        for active metric task, collect data for that metric; if its data
+            is ready to send, put it into send queue and reset for next
+            round.
+        Next events of the whole batch are put into events priority queue
+        at once.  If the watchdog abandoned the thread, it exits as soon as
+        the hung collection returns.
         :return:
         """
         global event_ds
         global collect_queue
         global send_queue
         while True:
-            metric = collect_queue.get()
+            metrics = collect_queue.get()
+            if isinstance(metrics, SystemExit):
+                if self._pool is not None:
+                    self._pool.remove(self)
+                log.info("Thread exits: %s" % str(self.name))
+                return
+            if not self._collect_batch(metrics):
+                log.info("Thread exits after hung collection: %s"
+                         % str(self.name))
+                return
+
+    def _collect_batch(self, metrics):
+        """
+        Collect a batch of metrics.
+        :return: False if the thread was abandoned by the watchdog
+        """
+        with self._worker_stat_lock:
+            self._batch = metrics
+            self._next_events = []
+        try:
+            for i, metric in enumerate(metrics):
+                log.debug("Collecting stats for metric: " + str(metric))
+                try:
+                    if not metric.flag_alive:
+                        log.debug("Discarded dead metric: %s" % str(metric))
+                        continue
+                    if metric.hung_collection:
+                        metric.quarantine()
+                        self._next_events.append(metric)
+                        continue
+                    with self._worker_stat_lock:
+                        self._batch_pos = i
+                        self.working_obj = metric
+                        self.working_since = getMonotonicMillis()
+                    metric.collect()
+                    with self._worker_stat_lock:
+                        if self.abandoned:
+                            metric.hung_collection = False
+                            return False
+                        self.working_obj = None
+                    metric.quarantine_count = 0
+                    if complete_collection(metric):
+                        self._next_events.append(metric)
+                except Exception as e:
+                    with self._worker_stat_lock:
+                        if self.abandoned:
+                            metric.hung_collection = False
+                            return False
+                    log.error("Error collecting data for metric" + str(metric))
+                    if metrics[i + 1:]:
+                        # hand the rest of the batch to other threads
+                        collect_queue.put(metrics[i + 1:])
+                    raise e
+            return True
+        finally:
+            with self._worker_stat_lock:
+                next_events = [] if self.abandoned else self._next_events
+                self._batch = []
+                self._next_events = []
+            self.last_active = getMonotonicMillis()
+            event_ds.put_all_and_notify(next_events)
+
+    def abandon(self):
+        """
+        Give up on the hung collection of the thread.  Called by the
+        watchdog with worker_stat_lock held.
+        :return: (metrics of the batch not collected yet, metrics already
+                collected to be put back into events data structure)
+        """
+        self.abandoned = True
+        return self._batch[self._batch_pos + 1:], self._next_events
+
+
+class CollectionWatchdog(Thread):
+    """
+    Periodically checks the collection thread pool for collections running
+    longer than the deadline of their metric.
+    """
+
+    def __init__(self, pool, interval_s, name=None):
+        Thread.__init__(self, name=name)
+        self.daemon = True
+        self.flag_alive = True
+        self._pool = pool
+        self._interval = interval_s
+        self.start()
+
+    def run(self):
+        log.info("Started CollectionWatchdog")
+        while self.flag_alive:
+            _sleep(self._interval)
+            try:
+                self._pool.check_hung()
+            except Exception:
+                log.error("Error checking collection threads", exc_info=True)
+        log.info("Thread exits: %s" % str(self.name))
+
+
+class AsyncCollectionEngine(Thread):
+    """
+    Event loop thread running coroutine sampling functions (asyncio, or
+    trollius on Python 2), so that thousands of I/O-bound polls can be in
+    flight at the same time without holding a CollectionThread each.
+    Metrics with plain sampling functions keep going to the thread pool.
+    """
+
+    def __init__(self, max_concurrency, name=None):
+        Thread.__init__(self, name=name)
+        self.daemon = True
+        self._max_concurrency = max_concurrency
+        self._num_in_flight = 0
+        self._pending = deque()
+        self._loop = asyncio.new_event_loop()
+        self._ensure_future = getattr(asyncio, 'ensure_future', None) \
+            or getattr(asyncio, 'async')
+        self.start()
+
+    @staticmethod
+    def accepts(metric):
+        """
+        Check whether the metric has a coroutine sampling function.
+        :param metric: RegisteredMetric
+        :return: True or False
+        """
+        return asyncio is not None and asyncio.iscoroutinefunction(
+            metric.ref_entity.sampling_function)
+
+    def run(self):
+        log.info("Started AsyncCollectionEngine")
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        log.info("Thread exits: %s" % str(self.name))
+
+    def submit(self, metrics):
+        """
+        Schedule collection of metrics on the event loop.  Thread-safe.
+        :param metrics: list of RegisteredMetric
+        :return:
+        """
+        self._loop.call_soon_threadsafe(self._enqueue, metrics)
+
+    def stop(self):
+        """
+        Stop the event loop.  Thread-safe.
+        :return:
+        """
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def get_stats(self):
+        """
+        Get the number of collections in flight and waiting for a slot.
+        :return: [in flight, pending]
+        """
+        return [self._num_in_flight, len(self._pending)]
+
+    def _enqueue(self, metrics):
+        self._pending.extend(metrics)
+        self._start_pending()
+
+    def _start_pending(self):
+        while self._pending and self._num_in_flight < self._max_concurrency:
+            metric = self._pending.popleft()
+            if not metric.flag_alive:
+                log.debug("Discarded dead metric: %s" % str(metric))
+                continue
             log.debug("Collecting stats for metric: " + str(metric))
+            if metric_stats_enabled:
+                metric.record_schedule_lag()
+            started = _time()
             try:
-                if not metric.flag_alive:
-                    log.debug("Discarded dead metric: %s" % str(metric))
-                    continue
-                with self._worker_stat_lock:
-                    self.working_obj = metric
-                metric.collect()
-                with self._worker_stat_lock:
-                    self.working_obj = None
-                if not metric.flag_alive:
-                    log.debug("Discarded dead metric: %s" % str(metric))
-                    continue
-                metric.set_next_run_time()
+                future = self._ensure_future(metric.call_sampling_function(),
+                                             loop=self._loop)
+            except Exception:
+                self._on_failed(metric)
+                continue
+            self._num_in_flight += 1
+            future.add_done_callback(partial(self._on_collected, metric,
+                                             started))
+
+    def _on_collected(self, metric, started, future):
+        self._num_in_flight -= 1
+        if metric_stats_enabled:
+            metric.stats.sampling_wall.record((_time() - started) * 1000)
+        try:
+            metric.add_sample(future.result())
+        except Exception:
+            self._on_failed(metric)
+        else:
+            try:
+                if complete_collection(metric):
+                    event_ds.put_and_notify(metric)
+            except Exception:
+                log.error("Error collecting data for metric" + str(metric),
+                          exc_info=True)
+        self._start_pending()
+
+    def _on_failed(self, metric):
+        """
+        Log a failed collection and schedule the next one of the metric, so
+        that it keeps being collected.  Must be called while the exception
+        is handled.
+        :param metric: RegisteredMetric
+        :return:
+        """
+        log.error("Error collecting data for metric" + str(metric),
+                  exc_info=True)
+        if not metric.flag_alive:
+            log.debug("Discarded dead metric: %s" % str(metric))
+            return
+        try:
+            metric.set_next_run_time()
+            event_ds.put_and_notify(metric)
+        except Exception:
+            log.error("Error rescheduling metric" + str(metric),
+                      exc_info=True)
+
+
+def _run_sampling_function(payload):
+    """
+    Run a sampling function in a worker process.  Exceptions are returned
+    rather than raised, because Pool.apply_async has no error callback.
+    :param payload: pickled (sampling function, arguments)
+    :return: (True, sampled value) or (False, formatted traceback)
+    """
+    try:
+        sampling_function, args = pickle.loads(payload)
+        return True, sampling_function(*args)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+class ProcessCollectionEngine:
+    """
+    multiprocessing worker pool for metrics created with
+    execution_mode="process", so that CPU-heavy sampling functions run on
+    all cores instead of serializing on the GIL with the collection threads.
+    Results are piped back to RegisteredMetric.add_sample() from the pool's
+    result handler thread.
+    """
+
+    def __init__(self, num_processes):
+        """
+        :param num_processes: number of worker processes, 0 for one per CPU
+        """
+        log.info("Starting process pool for collection")
+        self._pool = Pool(num_processes or None)
+        self._stat_lock = Lock()
+        self._num_in_flight = 0
+
+    @staticmethod
+    def accepts(metric):
+        """
+        Check whether the metric has to be collected in a worker process.
+        :param metric: RegisteredMetric
+        :return: True or False
+        """
+        return metric.ref_entity.execution_mode == "process"
+
+    def submit(self, metrics):
+        """
+        Send collection of metrics to worker processes.
+        :param metrics: list of RegisteredMetric
+        :return:
+        """
+        for metric in metrics:
+            if not metric.flag_alive:
+                log.debug("Discarded dead metric: %s" % str(metric))
+                continue
+            log.debug("Collecting stats for metric: " + str(metric))
+            if metric_stats_enabled:
+                metric.record_schedule_lag()
+            # pickled here, so that a pickling error is not lost in the
+            # pool's task handler thread without calling back
+            try:
+                payload = pickle.dumps((metric.ref_entity.sampling_function,
+                                        metric.get_sampling_args()),
+                                       pickle.HIGHEST_PROTOCOL)
+                with self._stat_lock:
+                    self._num_in_flight += 1
+                try:
+                    self._pool.apply_async(
+                        _run_sampling_function, (payload,),
+                        callback=partial(self._on_collected, metric, _time()))
+                except Exception:
+                    with self._stat_lock:
+                        self._num_in_flight -= 1
+                    raise
+            except Exception:
+                self._on_failed(metric, traceback.format_exc())
+
+    def stop(self):
+        """
+        Terminate worker processes.
+        :return:
+        """
+        self._pool.terminate()
+
+    def get_stats(self):
+        """
+        Get the number of collections sent to worker processes and not
+        completed yet.
+        :return: [in flight]
+        """
+        with self._stat_lock:
+            return [self._num_in_flight]
+
+    def _on_collected(self, metric, started, result):
+        with self._stat_lock:
+            self._num_in_flight -= 1
+        if metric_stats_enabled:
+            # includes time waiting for a free worker process
+            metric.stats.sampling_wall.record((_time() - started) * 1000)
+        succeeded, value = result
+        if not succeeded:
+            self._on_failed(metric, value)
+            return
+        try:
+            metric.add_sample(value)
+        except Exception:
+            self._on_failed(metric, traceback.format_exc())
+            return
+        try:
+            if complete_collection(metric):
                 event_ds.put_and_notify(metric)
-                if metric.is_ready_to_send():
-                    send_queue.put(metric)
-                    metric.reset_aggregation_size()
-            except Exception as e:
-                log.error("Error collecting data for metric" + str(metric))
-                raise e
+        except Exception:
+            log.error("Error collecting data for metric" + str(metric),
+                      exc_info=True)
+
+    def _on_failed(self, metric, formatted_traceback):
+        """
+        Log a failed collection and schedule the next one of the metric, so
+        that it keeps being collected.
+        :param metric: RegisteredMetric
+        :param formatted_traceback: traceback of the error
+        :return:
+        """
+        log.error("Error collecting data for metric" + str(metric)
+                  + "\n" + formatted_traceback)
+        if not metric.flag_alive:
+            log.debug("Discarded dead metric: %s" % str(metric))
+            return
+        metric.set_next_run_time()
+        event_ds.put_and_notify(metric)
+
+
+def complete_collection(metric):
+    """
+    Post-collection step shared by collection engines:
+    for dead metric, discard it;
+    for active metric, compute its next run time; if its data (or data of
+        one of its sinks) is ready to send, put it into send queue and reset
+        for next round.
+    :param metric: RegisteredMetric just collected
+    :return: True if the metric has to be put back into events data structure
+    """
+    if not metric.flag_alive:
+        log.debug("Discarded dead metric: %s" % str(metric))
+        return False
+    metric.set_next_run_time()
+    for m in [metric] + metric.sinks:
+        if m.is_ready_to_send():
+            if metric_stats_enabled:
+                m.stats.send_queued_at = _time()
+            send_queue.put(m)
+            m.reset_aggregation_size()
+    return True
+
+
+def get_async_engine():
+    """
+    Get the event loop engine for coroutine sampling functions, starting
+    it on first use.
+    :return: AsyncCollectionEngine
+    """
+    global async_engine
+    if async_engine is None:
+        async_engine = AsyncCollectionEngine(async_max_concurrency,
+                                             name="AsyncCollectionEngine")
+    return async_engine
+
+
+def get_process_engine():
+    """
+    Get the worker process pool for process mode metrics, started by
+    initialize() (or on first use if metric handling is not initialized).
+    :return: ProcessCollectionEngine
+    """
+    global process_engine
+    if process_engine is None:
+        process_engine = ProcessCollectionEngine(process_pool_size)
+    return process_engine
 
 
 class CollectionThreadPool:
+    """
+    Pool of CollectionThread, scaled between min_threads and num_threads:
+    it grows when batches wait in collect queue with no idle thread to take
+    them, or when the oldest of them is late by more than grow_lag_ms, and
+    it shrinks by threads idle for idle_timeout_s.  Scaling is decided by
+    autoscale(), called by EventCheckerThread after each dispatch.
+    """
 
-    def __init__(self, num_threads):
+    def __init__(self, num_threads, min_threads=None, idle_timeout_s=60,
+                 grow_queue_depth=1, grow_lag_ms=1000, watchdog_interval_s=0):
+        """
+        :param num_threads: max number of threads
+        :param min_threads: min number of threads, which the pool starts
+                with; None for a fixed size pool of num_threads
+        :param idle_timeout_s: how long a thread stays idle before retiring
+        :param grow_queue_depth: number of batches waiting for a thread
+                above which the pool grows
+        :param grow_lag_ms: lag of the oldest waiting batch above which
+                the pool grows
+        :param watchdog_interval_s: how often hung collections are checked,
+                0 to disable the watchdog
+        """
         self._num_threads = num_threads
+        if min_threads is None:
+            min_threads = num_threads
+        self._min_threads = max(min(min_threads, num_threads), 1)
+        self._idle_timeout = idle_timeout_s * 1000
+        self._grow_queue_depth = grow_queue_depth
+        self._grow_lag_ms = grow_lag_ms
         self._pool = []
         self._worker_stat_lock = Lock()
+        self._next_thread_id = 1
+        self._num_retiring = 0
+        self._num_grown = 0
+        self._num_shrunk = 0
+        self._num_replaced = 0
+
+        log.info("Starting " + str(self._min_threads) + " for collection")
+        with self._worker_stat_lock:
+            self._add_threads(self._min_threads)
+        self._watchdog = None
+        if watchdog_interval_s > 0:
+            self._watchdog = CollectionWatchdog(
+                self, watchdog_interval_s, name="CollectionWatchdog")
 
-        log.info("Starting " + str(num_threads) + " for collection")
-        for j in range(num_threads):
+    def _add_threads(self, count):
+        for _ in range(count):
             self._pool.append(CollectionThread(
                 self._worker_stat_lock,
-                name="Collector-%d" % (j + 1)
+                name="Collector-%d" % self._next_thread_id,
+                pool=self
             ))
+            self._next_thread_id += 1
+
+    def remove(self, thread):
+        """
+        Remove a retired thread from the pool.
+        :param thread: CollectionThread exiting
+        :return:
+        """
+        with self._worker_stat_lock:
+            if thread in self._pool:
+                self._pool.remove(thread)
+                self._num_retiring = max(self._num_retiring - 1, 0)
+
+    def check_hung(self):
+        """
+        Abandon threads whose collection runs longer than the deadline of
+        its metric: quarantine the metric, hand the rest of the thread's
+        batch to other threads, and replace the thread with a fresh one.
+        :return: number of threads replaced
+        """
+        now = getMonotonicMillis()
+        hung = []
+        with self._worker_stat_lock:
+            for tref in self._pool:
+                metric = tref.working_obj
+                if metric is None or tref.abandoned:
+                    continue
+                timeout = metric.get_collection_timeout()
+                if not timeout or now - tref.working_since < timeout * 1000:
+                    continue
+                metric.hung_collection = True
+                rest, collected = tref.abandon()
+                hung.append((tref, metric, rest, collected))
+            if not hung:
+                return 0
+            for tref, _, _, _ in hung:
+                self._pool.remove(tref)
+            self._add_threads(len(hung))
+            self._num_replaced += len(hung)
+        for tref, metric, rest, collected in hung:
+            log.warning("Collection of metric %s hung for more than %ss, "
+                        "replaced %s" % (str(metric),
+                                         str(metric.get_collection_timeout()),
+                                         str(tref.name)))
+            if metric.flag_alive:
+                metric.quarantine()
+                collected = collected + [metric]
+            event_ds.put_all_and_notify(collected)
+            if rest:
+                collect_queue.put(rest)
+        return len(hung)
+
+    def stop(self):
+        """
+        Stop the watchdog.
+        :return:
+        """
+        if self._watchdog is not None:
+            self._watchdog.flag_alive = False
 
     def get_num_threads(self):
         """
@@ -270,11 +1593,72 @@ class CollectionThreadPool:
         """
         return self._num_threads
 
+    def _get_queue_lag(self):
+        """
+        Get how late the oldest batch waiting in collect queue is.
+        :return: lag in milliseconds, 0 if collect queue is empty
+        """
+        with collect_queue.mutex:
+            if not collect_queue.queue:
+                return 0
+            first = collect_queue.queue[0]
+        if isinstance(first, SystemExit) or not first:
+            return 0
+        return getUTCmillis() - first[0].get_next_run_time()
+
+    def autoscale(self):
+        """
+        Grow or shrink the pool according to load of collect queue.
+        :return: number of threads added (positive) or retired (negative)
+        """
+        if collect_queue is None or self._min_threads >= self._num_threads:
+            return 0
+        depth = collect_queue.qsize()
+        lag = self._get_queue_lag()
+        now = getMonotonicMillis()
+        with self._worker_stat_lock:
+            # threads killed by a sampling function error are replaced
+            self._pool = [t for t in self._pool if t.isAlive()]
+            size = len(self._pool) - self._num_retiring
+            idle = [t for t in self._pool if t.working_obj is None]
+            # retiring threads are idle and their exit signals queued
+            waiting = depth - len(idle)
+            if size < self._num_threads and waiting > 0 and \
+                    (waiting >= self._grow_queue_depth or lag >= self._grow_lag_ms):
+                count = min(max(waiting, 1), self._num_threads - size)
+                self._add_threads(count)
+                self._num_grown += count
+                log.info("Collection pool grows by %d threads (queued: %d, "
+                         "lag: %d ms)" % (count, depth, lag))
+                return count
+            if depth > self._num_retiring:
+                return 0
+            count = min(len([t for t in idle
+                             if now - t.last_active >= self._idle_timeout])
+                        - self._num_retiring,
+                        size - self._min_threads)
+            if count <= 0:
+                return 0
+            self._num_retiring += count
+            self._num_shrunk += count
+        for _ in range(count):
+            try:
+                collect_queue.put(SystemExit(), block=False)
+            except Full:
+                with self._worker_stat_lock:
+                    self._num_retiring -= 1
+                    self._num_shrunk -= 1
+        log.info("Collection pool shrinks by %d idle threads" % count)
+        return -count
+
     def get_stats_working(self):
         """
         Get the status of threads:
         the number of working threads, the number of alive threads,
-        the number of all the threads and the number of threads.
+        the number of all the threads, the number of threads (max),
+        the min number of threads, the number of threads added and
+        retired by autoscaling so far, and the number of threads replaced
+        because of a hung collection.
         :return: the status of threads
         """
         num_working = 0
@@ -289,19 +1673,108 @@ class CollectionThreadPool:
                     num_alive += 1
                 if not tref.working_obj is None:
                     num_working += 1
-        return [num_working,
-                num_alive,
-                num_all,
-                self._num_threads]
+            return [num_working,
+                    num_alive,
+                    num_all,
+                    self._num_threads,
+                    self._min_threads,
+                    self._num_grown,
+                    self._num_shrunk,
+                    self._num_replaced]
+
+
+def get_schedule_stats():
+    """
+    Get how the metrics waiting in events data structure are spread over
+    their interval: for each interval, the number of metrics and the most
+    metrics scheduled in the same phase slot of phase_stats_slot_ms.
+    :return: dict of interval: [metrics, peak metrics per slot]
+    """
+    if event_ds is None:
+        return {}
+    slots = {}
+    for metric in event_ds.snapshot():
+        if not hasattr(metric, 'get_phase'):
+            continue
+        interval = metric.ref_entity.interval
+        slot = metric.get_phase() // phase_stats_slot_ms
+        counts = slots.setdefault(interval, {})
+        counts[slot] = counts.get(slot, 0) + 1
+    return dict((interval, [sum(counts.values()), max(counts.values())])
+                for interval, counts in slots.items())
+
+
+def get_drop_stats():
+    """
+    Get the number of items dropped by bounded stages of the pipeline so
+    far: collections skipped by collect queue, send requests dropped by
+    send queues, and samples dropped by buffers of metrics waiting in
+    events data structure.
+    :return: [collections, sends, samples]
+    """
+    stats = [0, 0, 0]
+    if isinstance(collect_queue, BoundedQueue):
+        stats[0] = collect_queue.num_dropped
+    if isinstance(send_queue, SendStage):
+        stats[1] = sum(lane[3] for lane in send_queue.get_stats().values())
+    if event_ds is not None:
+        stats[2] = sum(metric.values.num_dropped
+                       for metric in event_ds.snapshot()
+                       if hasattr(metric, 'values'))
+    return stats
+
+
+def get_top_metrics(n=10, histogram="sampling_wall"):
+    """
+    Get the metrics with the highest total of a statistics histogram, e.g.
+    the most expensive metrics to sample.
+    :param n: max number of metrics
+    :param histogram: one of MetricStats.HISTOGRAMS
+    :return: list of (metric name, total, Histogram.get_stats())
+    """
+    top = []
+    for metric in list(collecting_metrics):
+        h = metric.stats.get_histogram(histogram)
+        top.append((h.total, str(metric.ref_entity.name), h.get_stats()))
+    top.sort(key=lambda t: t[0], reverse=True)
+    return [(name, total, stats) for total, name, stats in top[:n]]
+
 
 is_initialization_done = False
 
 
+def _core_cfg(name, default):
+    """
+    Read a configuration of the CORE_CFG section, which may be absent from
+    the liota.conf of an older installation.
+    :param name: name of the configuration
+    :param default: value used when it is absent
+    :return: configuration value
+    """
+    return read_liota_config('CORE_CFG', name, default)
+
+
+def create_event_ds(scheduler):
+    """
+    Create events data structure for the configured scheduler backend.
+    :param scheduler: "heap" (default) or "timer_wheel"
+    :return: EventsPriorityQueue or EventsTimerWheel
+    """
+    if scheduler == "timer_wheel":
+        tick_ms = int(_core_cfg('timer_wheel_tick_ms', '10'))
+        log.info("Using timer wheel scheduler with %d ms ticks" % tick_ms)
+        return EventsTimerWheel(tick_ms)
+    if scheduler != "heap":
+        log.warning("Unknown event_scheduler %s, using heap" % scheduler)
+    return EventsPriorityQueue()
+
+
 def initialize():
     """
     Initialization for metric handling:
-    create events priority queue, collect queue, and send queue;
-    spawn event check thread and send thread; and
+    start worker process pool;
+    create events priority queue, collect queue, and send stage;
+    spawn event check thread; and
     create collection thread pool.
     :return:
     """
@@ -311,45 +1784,92 @@ def initialize():
         pass
     else:
         log.debug("Initializing.............")
+        global process_pool_size
+        process_pool_size = int(
+            _core_cfg('process_pool_size', '0'))
+        global process_engine
+        if process_engine is None:
+            # forked before threads of metric handling start, so that worker
+            # processes do not inherit locks held by them
+            process_engine = ProcessCollectionEngine(process_pool_size)
         global event_ds
         if event_ds is None:
-            event_ds = EventsPriorityQueue()
+            event_ds = create_event_ds(
+                _core_cfg('event_scheduler', 'heap'))
         global event_checker_thread
         if event_checker_thread is None:
             event_checker_thread = EventCheckerThread(
                 name="EventCheckerThread")
         global collect_queue
         if collect_queue is None:
-            collect_queue = Queue()
+            collect_queue = BoundedQueue(
+                int(_core_cfg('collect_queue_size', '1000')),
+                _core_cfg('collect_queue_policy', 'block'),
+                on_drop=skip_collection)
         global send_queue
         if send_queue is None:
-            send_queue = Queue()
-        global send_thread
-        if send_thread is None:
-            send_thread = SendThread(name="SendThread")
+            send_queue = SendStage(
+                int(_core_cfg('send_workers_per_dcc', '1')),
+                int(_core_cfg('send_queue_size_per_dcc', '10000')),
+                int(_core_cfg('send_batch_linger_ms', '0')),
+                int(_core_cfg('send_batch_max_size', '100')),
+                _core_cfg('send_queue_policy', 'coalesce'))
+        global metric_buffer_capacity
+        metric_buffer_capacity = int(
+            _core_cfg('metric_buffer_capacity', '10000'))
+        global collect_batch_size
+        collect_batch_size = int(_core_cfg('collect_batch_size', '8'))
+        global async_max_concurrency
+        async_max_concurrency = int(
+            _core_cfg('async_max_concurrency', '1000'))
+        global phase_spreading
+        phase_spreading = _core_cfg('phase_spreading', 'False') == "True"
+        global collect_timeout_s
+        collect_timeout_s = int(
+            _core_cfg('collect_timeout_s', '0'))
+        global quarantine_max_backoff_s
+        quarantine_max_backoff_s = int(
+            _core_cfg('quarantine_max_backoff_s', '3600'))
+        global metric_stats_enabled
+        metric_stats_enabled = _core_cfg('metric_stats_enabled', 'True') == "True"
+        global max_jitter_ms
+        max_jitter_ms = int(_core_cfg('max_jitter_ms', '0'))
         global collect_thread_pool
         collect_thread_pool_size = int(read_liota_config('CORE_CFG','collect_thread_pool_size')) 
-        collect_thread_pool = CollectionThreadPool(collect_thread_pool_size)
+        collect_thread_pool = CollectionThreadPool(
+            collect_thread_pool_size,
+            int(_core_cfg('collect_thread_pool_min_size',
+                          str(collect_thread_pool_size))),
+            int(_core_cfg('collect_thread_idle_timeout_s', '60')),
+            int(_core_cfg('collect_thread_grow_queue_depth', '2')),
+            int(_core_cfg('collect_thread_grow_lag_ms', '1000')),
+            int(_core_cfg('collect_watchdog_interval_s', '1')))
         is_initialization_done = True
 
 
 def terminate():
     """
     Terminate metric handling:
-    signal events priority queue and send queue to exit;
-    disable event check thread and send thread; and
+    signal events priority queue and send stage to exit;
+    disable event check thread and send threads; and
     create collection thread pool.
     :return:
     """
     global event_checker_thread
     if event_checker_thread:
         event_checker_thread.flag_alive = False
-    global send_thread
-    if send_thread:
-        send_thread.flag_alive = False
     global event_ds
     if event_ds:
         event_ds.put_and_notify(SystemExit(), timeout=0)
     global send_queue
     if send_queue:
         send_queue.put(SystemExit())
+    global async_engine
+    if async_engine:
+        async_engine.stop()
+    global process_engine
+    if process_engine:
+        process_engine.stop()
+    global collect_thread_pool
+    if collect_thread_pool:
+        collect_thread_pool.stop()
@@ -403,18 +403,39 @@ class PackageThread(Thread):
             else:
                 log.info("packages {0} is not loaded".format(query_pkg))
             return
+        if parameters[0] == "top":
+            from liota.core.metric_handler import get_top_metrics
+            from liota.lib.utilities.metric_stats import MetricStats
+
+            histogram = "sampling_wall"
+            if len(parameters) > 1:
+                histogram = parameters[1]
+            if histogram not in MetricStats.HISTOGRAMS:
+                log.warning("Unknown metric statistics: %s, expecting one of %s"
+                            % (histogram, str(MetricStats.HISTOGRAMS)))
+                return
+            for name, total, stats in get_top_metrics(10, histogram):
+                log.warning(("Metric %s %s - \t"
+                             + "Total: %.1f ms\t"
+                             + "Count: %d\t"
+                             + "Mean: %.2f ms\t"
+                             + "P50: %.2f ms\t"
+                             + "P99: %.2f ms\t"
+                             + "Max: %.2f ms"
+                             ) % tuple([name, histogram, total] + stats))
+            return
         if len(parameters) != 1:
             log.warning("Invalid format of stat command: %s" % parameters[0])
             return
         if parameters[0] == "metrics" or parameters[0] == "met":
             from liota.core.metric_handler \
                 import event_ds, collect_queue, send_queue, \
-                CollectionThreadPool, collect_thread_pool
+                CollectionThreadPool, collect_thread_pool, get_drop_stats
 
             stats = ["n/a", "n/a", "n/a", "n/a"]
-            if isinstance(event_ds, Queue):
+            if event_ds is not None:
                 stats[0] = str(event_ds.qsize())
-            if isinstance(send_queue, Queue):
+            if send_queue is not None:
                 stats[1] = str(send_queue.qsize())
             if isinstance(collect_queue, Queue):
                 stats[2] = str(collect_queue.qsize())
@@ -423,15 +444,20 @@ class PackageThread(Thread):
             log.warning(("Number of metrics in - \t"
                          + "Waiting queue: %s\t"
                          + "Sending queue: %s\t"
-                         + "Collecting queue: %s\t"
+                         + "Collecting queue (batches): %s\t"
                          + "Collecting threads: %s"
                          ) % tuple(stats))
+            log.warning(("Number of dropped - \t"
+                         + "Collections: %s\t"
+                         + "Sends: %s\t"
+                         + "Samples: %s"
+                         ) % tuple(get_drop_stats()))
             return
         if parameters[0] == "collection_threads" or parameters[0] == "col":
             from liota.core.metric_handler \
                 import CollectionThreadPool, collect_thread_pool
 
-            stats = ["n/a", "n/a", "n/a", "n/a"]
+            stats = ["n/a", "n/a", "n/a", "n/a", "n/a", "n/a", "n/a", "n/a"]
             if isinstance(collect_thread_pool, CollectionThreadPool):
                 stats = map(
                     lambda n: str(n),
@@ -441,9 +467,40 @@ class PackageThread(Thread):
                          + "Collecting: %s\t"
                          + "Alive: %s\t"
                          + "Pool: %s\t"
-                         + "Capacity: %s"
+                         + "Capacity: %s\t"
+                         + "Min: %s\t"
+                         + "Grown: %s\t"
+                         + "Shrunk: %s\t"
+                         + "Replaced: %s"
                          ) % tuple(stats))
             return
+        if parameters[0] == "send_lanes" or parameters[0] == "snd":
+            from liota.core.metric_handler import SendStage, send_queue
+
+            if not isinstance(send_queue, SendStage):
+                log.warning("Send stage is not initialized")
+                return
+            for name, stats in sorted(send_queue.get_stats().items()):
+                log.warning(("Status of send lane %s - \t"
+                             + "Queued: %s\t"
+                             + "Sent: %s\t"
+                             + "Failed: %s\t"
+                             + "Dropped: %s\t"
+                             + "Coalesced: %s\t"
+                             + "Workers: %s"
+                             ) % tuple([name] + stats))
+            return
+        if parameters[0] == "schedule" or parameters[0] == "sch":
+            from liota.core.metric_handler \
+                import get_schedule_stats, phase_stats_slot_ms
+
+            for interval, stats in sorted(get_schedule_stats().items()):
+                log.warning(("Schedule of metrics every %ss - \t"
+                             + "Waiting: %s\t"
+                             + "Most in same %d ms: %s"
+                             ) % (interval, stats[0], phase_stats_slot_ms,
+                                  stats[1]))
+            return
         if parameters[0] == "threads" or parameters[0] == "th":
             import threading
 
@@ -30,7 +30,10 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 import logging
+import select
 import socket
+import threading
+import time
 
 from liota.dcc_comms.dcc_comms import DCCComms
 
@@ -38,57 +41,297 @@ from liota.dcc_comms.dcc_comms import DCCComms
 log = logging.getLogger(__name__)
 
 
+class _SocketConnection(object):
+    """
+    One connection of SocketDccComms to a BSD socket server, with its write buffer and reconnect back-off.
+    """
+
+    def __init__(self, address, connect_timeout_s, send_timeout_s, reconnect_min_s, reconnect_max_s):
+        """
+        :param address: (ip, port) tuple of the BSD socket server
+        :param connect_timeout_s: Timeout in seconds to establish the connection
+        :param send_timeout_s: Timeout in seconds of a write, None to block
+        :param reconnect_min_s: Delay in seconds before the first reconnect attempt
+        :param reconnect_max_s: Max delay in seconds between reconnect attempts
+        """
+        self.address = address
+        self.connect_timeout_s = connect_timeout_s
+        self.send_timeout_s = send_timeout_s
+        self.reconnect_min_s = reconnect_min_s
+        self.reconnect_max_s = reconnect_max_s
+        self.sock = None
+        self.lock = threading.Lock()
+        self.buffer = []
+        self.buffered_size = 0
+        self.buffered_since = None
+        # Bytes of the data of the last write() which were written
+        self.written = 0
+        self.reconnect_delay = reconnect_min_s
+        self.next_attempt_time = 0
+        self.num_connects = 0
+        self.num_failures = 0
+
+    def is_available(self):
+        """
+        :return: True if connected or a reconnect attempt is due
+        """
+        return self.sock is not None or time.time() >= self.next_attempt_time
+
+    def connect(self):
+        """
+        Connects to the server, raising socket.error while in reconnect back-off.  Caller must hold the lock.
+
+        :return:
+        """
+        if self.sock is not None:
+            return
+        if time.time() < self.next_attempt_time:
+            raise socket.error("Not connected to %s:%s, next attempt in %.1fs" % (
+                self.address[0], self.address[1], self.next_attempt_time - time.time()))
+        try:
+            sock = socket.create_connection(self.address, self.connect_timeout_s)
+        except Exception:
+            self._schedule_reconnect()
+            raise
+        sock.settimeout(self.send_timeout_s)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for option, value in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3)):
+            if hasattr(socket, option):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+        self.sock = sock
+        self.reconnect_delay = self.reconnect_min_s
+        self.num_connects += 1
+        log.info("Socket connection established with %s:%s" % self.address)
+
+    def close(self):
+        """
+        Closes the socket, if any.  Caller must hold the lock.
+
+        :return:
+        """
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+    def _schedule_reconnect(self):
+        self.close()
+        self.num_failures += 1
+        self.next_attempt_time = time.time() + self.reconnect_delay
+        log.warning("Socket connection with %s:%s lost, reconnecting in %.1fs" % (
+            self.address[0], self.address[1], self.reconnect_delay))
+        self.reconnect_delay = min(self.reconnect_delay * 2, self.reconnect_max_s)
+
+    def _peer_closed(self):
+        # The servers never write to us, so a readable socket means EOF or an error: the peer is gone and
+        # writing would only fail on the next write, after losing this one.
+        try:
+            readable = select.select([self.sock], [], [], 0)[0]
+        except (select.error, ValueError):
+            return True
+        return bool(readable)
+
+    def write(self, data):
+        """
+        Writes data, reconnecting first if needed.  On failure the socket is closed and back-off scheduled, and
+        written tells how much of data was written before.  Caller must hold the lock.
+
+        :param data: String to write
+        :return:
+        """
+        self.written = 0
+        if self.sock is not None and self._peer_closed():
+            self._schedule_reconnect()
+        self.connect()
+        view = memoryview(data)
+        try:
+            while self.written < len(data):
+                self.written += self.sock.send(view[self.written:])
+        except Exception:
+            self._schedule_reconnect()
+            raise
+
+    def flush(self):
+        """
+        Writes buffered data.  If writing fails, messages not completely written are kept in the buffer, to be
+        written whole again: servers drop the incomplete message a lost connection ends with.  Caller must hold
+        the lock.
+
+        :return:
+        """
+        if not self.buffer:
+            return
+        try:
+            self.write(''.join(self.buffer))
+        except Exception:
+            written = self.written
+            count = 0
+            while count < len(self.buffer) and len(self.buffer[count]) <= written:
+                written -= len(self.buffer[count])
+                count += 1
+            del self.buffer[:count]
+            self.buffered_size = sum(len(message) for message in self.buffer)
+            if not self.buffer:
+                self.buffered_since = None
+            raise
+        self.buffer = []
+        self.buffered_size = 0
+        self.buffered_since = None
+
+
 class SocketDccComms(DCCComms):
     """
     DccComms for BSD Socket transport.
+
+    Connections are re-established with exponential back-off when they fail.  Optionally, small messages are
+    coalesced in a buffer flushed when full or after flush_interval_ms, and several connections (e.g. to a set of
+    carbon relays) are used in turn.
     """
 
-    def __init__(self, ip, port):
+    def __init__(self, ip, port, addresses=None, pool_size=1, flush_interval_ms=0, max_buffer_size=65536,
+                 reconnect_min_s=1, reconnect_max_s=60, connect_timeout_s=10, send_timeout_s=30):
         """
         Init method for SocketDccComms.
 
         :param ip: IP address of the BSD socket server.
         :param port: Port number
+        :param addresses: Optional list of (ip, port) of further servers to spread connections across
+        :param pool_size: Number of connections, assigned to the servers in turn
+        :param flush_interval_ms: Max time messages are buffered before being written, 0 to write each one at once
+        :param max_buffer_size: Buffered bytes per connection beyond which the buffer is flushed
+        :param reconnect_min_s: Delay in seconds before the first reconnect attempt
+        :param reconnect_max_s: Max delay in seconds between reconnect attempts
+        :param connect_timeout_s: Timeout in seconds to establish a connection
+        :param send_timeout_s: Timeout in seconds of a write, None to block
         """
         self.ip = ip
         self.port = port
+        servers = [(ip, int(port))] + [(a, int(p)) for a, p in (addresses or [])]
+        self.flush_interval_ms = flush_interval_ms
+        self.max_buffer_size = max_buffer_size
+        self._connections = [_SocketConnection(servers[i % len(servers)], connect_timeout_s, send_timeout_s,
+                                               reconnect_min_s, reconnect_max_s)
+                             for i in range(max(1, pool_size, len(servers)))]
+        self._next = 0
+        self._next_lock = threading.Lock()
+        self._flusher = None
+        self._stop_event = threading.Event()
         self._connect()
 
+    @property
+    def client(self):
+        return self._connections[0].sock
+
     def _connect(self):
         """
-        Establishes connection to the BSD socket server.
+        Establishes connections to the BSD socket servers.  Raises if none of them could be established.
         :return:
         """
-        self.client = socket.socket()
         log.info("Establishing Socket Connection")
-        try:
-            self.client.connect((self.ip, self.port))
-            log.info("Socket Created")
-        except Exception as ex:
-            log.exception(
-                "Unable to establish socket connection. Please check the firewall rules and try again.")
-            self.client.close()
-            self.client = None
-            raise ex
+        error = None
+        for conn in self._connections:
+            with conn.lock:
+                try:
+                    conn.connect()
+                except Exception as ex:
+                    error = ex
+        if all(conn.sock is None for conn in self._connections):
+            log.error("Unable to establish socket connection. Please check the firewall rules and try again.")
+            raise error
+        log.info("Socket Created")
+        if self.flush_interval_ms > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="SocketFlusher")
+            self._flusher.daemon = True
+            self._flusher.start()
 
     def _disconnect(self):
         """
-        Disconnect from BSD socket server.
-        TODO: To be implemented
+        Flushes buffered messages and disconnects from BSD socket servers.
         :return:
         """
-        raise NotImplementedError
+        self._stop_event.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        for conn in self._connections:
+            with conn.lock:
+                try:
+                    conn.flush()
+                except Exception:
+                    log.warning("Buffered messages to %s:%s are lost" % conn.address)
+                conn.close()
+
+    def _pick_connection(self):
+        with self._next_lock:
+            start = self._next
+            self._next = (start + 1) % len(self._connections)
+        for i in range(len(self._connections)):
+            conn = self._connections[(start + i) % len(self._connections)]
+            if conn.is_available():
+                return conn
+        return self._connections[start]
 
     def send(self, message, msg_attr=None):
         """
-        Sends message to the BSD socket server.
+        Sends message to a BSD socket server.  Raises socket.error if it can neither be sent nor buffered.
         :param message: Message to be published
         :param msg_attr: MessagingAttribute.  It is 'None' for BSD Socket.
         :return:
         """
-        log.debug("Publishing message:" + str(message))
-        if self.client is not None:
-            self.client.sendall(message)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Publishing message:" + str(message))
+        if self.flush_interval_ms <= 0:
+            self._send_now(message)
+            return
+        conn = self._pick_connection()
+        with conn.lock:
+            if conn.buffered_size >= self.max_buffer_size:
+                # Flush failed earlier and the server is still unreachable: let the caller handle the message
+                conn.flush()
+            conn.buffer.append(message)
+            conn.buffered_size += len(message)
+            if conn.buffered_since is None:
+                conn.buffered_since = time.time()
+            if conn.buffered_size >= self.max_buffer_size:
+                try:
+                    conn.flush()
+                except Exception:
+                    log.warning("Flushing to %s:%s failed, messages are kept buffered" % conn.address)
+
+    def _send_now(self, message):
+        error = None
+        for _ in range(len(self._connections)):
+            conn = self._pick_connection()
+            with conn.lock:
+                try:
+                    conn.write(message)
+                    return
+                except Exception as ex:
+                    error = ex
+        raise error
+
+    def _flush_loop(self):
+        interval = self.flush_interval_ms / 1000.0
+        while not self._stop_event.wait(interval / 2):
+            now = time.time()
+            for conn in self._connections:
+                if conn.buffered_since is None or now - conn.buffered_since < interval or not conn.is_available():
+                    continue
+                with conn.lock:
+                    try:
+                        conn.flush()
+                    except Exception:
+                        log.warning("Flushing to %s:%s failed, messages are kept buffered" % conn.address)
+
+    def get_stats(self):
+        """
+        :return: List of [address, connected, buffered bytes, connects, failures] per connection
+        """
+        return [[conn.address, conn.sock is not None, conn.buffered_size, conn.num_connects, conn.num_failures]
+                for conn in self._connections]
 
     def receive(self, msg_attr=None):
         """
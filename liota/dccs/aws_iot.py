@@ -130,15 +130,11 @@ class AWSIoT(DataCenterComponent):
         :param reg_metric: Registered Metric Object
         :return: Payload in JSON format
         """
-        met_cnt = reg_metric.values.qsize()
-        if 0 == met_cnt:
+        _timestamps, _values = reg_metric.values.drain()
+        if 0 == len(_timestamps):
             return
 
-        _list = []
-        for _ in range(met_cnt):
-            m = reg_metric.values.get(block=True)
-            if m is not None:
-                _list.append(OrderedDict([('value', m[1]), ('timestamp', m[0])]))
+        _list = [OrderedDict([('value', v), ('timestamp', ts)]) for ts, v in zip(_timestamps, _values)]
 
         payload = OrderedDict()
         if self.enclose_metadata:
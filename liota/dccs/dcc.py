@@ -31,11 +31,18 @@
 # ----------------------------------------------------------------------------#
 
 import logging
+import os
+import pickle
+import re
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from threading import Lock
 
 from liota.entities.entity import Entity
 from liota.dcc_comms.dcc_comms import DCCComms
 from liota.entities.metrics.registered_metric import RegisteredMetric
+from liota.lib.utilities.spool import SegmentSpool, SpoolReplayer
+from liota.lib.utilities.utility import read_liota_config
 
 log = logging.getLogger(__name__)
 
@@ -47,6 +54,14 @@ class DataCenterComponent:
     """
     __metaclass__ = ABCMeta
 
+    # SegmentSpool of messages which could not be sent, see enable_spool()
+    spool = None
+    # True if _format_data_batch() can format several metrics into one message, see publish_batch()
+    supports_batch = False
+    # Names of the spools in use, as two spools must not share a directory
+    _spool_names = set()
+    _spool_names_lock = Lock()
+
     @abstractmethod
     def __init__(self, comms):
         """
@@ -58,6 +73,7 @@ class DataCenterComponent:
             log.error("DCCComms object is expected.")
             raise TypeError("DCCComms object is expected.")
         self.comms = comms
+        self._init_spool()
 
     @abstractmethod
     def register(self, entity_obj):
@@ -113,9 +129,131 @@ class DataCenterComponent:
         message = self._format_data(reg_metric)
         if message:
             if hasattr(reg_metric, 'msg_attr'):
-                self.comms.send(message, reg_metric.msg_attr)
+                self._send(message, reg_metric.msg_attr)
             else:
-                self.comms.send(message, None)
+                self._send(message, None)
+
+    def _format_data_batch(self, reg_metrics):
+        """
+        Batch counterpart of _format_data: formats data of several RegisteredMetrics sharing the same parent
+        entity and MessagingAttributes into one message.  DCCs whose message structure can carry several metrics
+        should override this method and set supports_batch.
+
+        :param reg_metrics: List of RegisteredMetric Objects
+        :return: Formatted message string
+        """
+        raise NotImplementedError
+
+    def publish_batch(self, reg_metrics):
+        """
+        Publishes data of several RegisteredMetrics with one message per parent entity (and MessagingAttributes)
+        if the DCC supports it, otherwise with one message per RegisteredMetric.
+
+        :param reg_metrics: List of RegisteredMetric Objects.
+        :return:
+        """
+        groups = OrderedDict()
+        if not self.supports_batch:
+            for reg_metric in reg_metrics:
+                self.publish(reg_metric)
+            return
+        for reg_metric in reg_metrics:
+            if not isinstance(reg_metric, RegisteredMetric):
+                log.error("RegisteredMetric object is expected.")
+                raise TypeError("RegisteredMetric object is expected.")
+            msg_attr = getattr(reg_metric, 'msg_attr', None)
+            groups.setdefault((id(reg_metric.parent), id(msg_attr)), (msg_attr, []))[1].append(reg_metric)
+        for msg_attr, group in groups.values():
+            message = self._format_data_batch(group)
+            if message:
+                self._send(message, msg_attr)
+
+    def enable_spool(self, name, directory=None, segment_size=None, max_size=None, replay_rate=None):
+        """
+        Store messages which could not be sent in an on-disk SegmentSpool, and replay them in order from a
+        SpoolReplayer thread.  Messages published meanwhile are sent at once rather than after the spooled ones, so
+        that a backlog replayed at replay_rate does not hold back live data.  Parameters left to None are read from
+        liota.conf.
+
+        :param name: Name of the spool, unique among DCCs of the gateway and stable across restarts, since the
+                     messages spooled under this name are replayed by the DCC enabling it after a restart
+        :param directory: Parent directory of spools
+        :param segment_size: Size in bytes of spool segment files
+        :param max_size: Max size in bytes of the spool, beyond which oldest messages are dropped
+        :param replay_rate: Max number of spooled messages replayed per second, 0 for unlimited
+        :return:
+        """
+        if directory is None:
+            directory = read_liota_config('CORE_CFG', 'spool_dir', '/usr/lib/liota/spool')
+        if segment_size is None:
+            segment_size = int(read_liota_config('CORE_CFG', 'spool_segment_size', '4194304'))
+        if max_size is None:
+            max_size = int(read_liota_config('CORE_CFG', 'spool_max_size', '67108864'))
+        if replay_rate is None:
+            replay_rate = int(read_liota_config('CORE_CFG', 'spool_replay_rate', '100'))
+        with DataCenterComponent._spool_names_lock:
+            if name in DataCenterComponent._spool_names:
+                raise ValueError("Spool %s is used by another DCC" % name)
+            DataCenterComponent._spool_names.add(name)
+        try:
+            self.spool = SegmentSpool(os.path.join(directory, name), segment_size, max_size,
+                                      int(read_liota_config('CORE_CFG', 'spool_fsync_interval_ms', '1000')))
+        except Exception:
+            with DataCenterComponent._spool_names_lock:
+                DataCenterComponent._spool_names.discard(name)
+            raise
+        self._spool_replayer = SpoolReplayer(self.spool, self.comms.send, replay_rate,
+                                             name="SpoolReplayer-%s" % name)
+
+    def _init_spool(self):
+        """
+        Enable the spool of the DCC if spool_enabled is set in liota.conf, see enable_spool().  Spools are named
+        after the class of the DCC and the endpoint of its DccComms, see _spool_name().  DCC constructors not
+        calling DataCenterComponent.__init__ should call this method.
+
+        :return:
+        """
+        if read_liota_config('CORE_CFG', 'spool_enabled', 'False') != "True":
+            return
+        name = self._spool_name()
+        if name is None:
+            log.warning("Endpoint of {0} is unknown, call enable_spool() with a name to spool its messages".format(
+                type(self).__name__))
+            return
+        try:
+            self.enable_spool(name)
+        except Exception:
+            log.exception("Could not enable spool %s, messages which cannot be sent will be dropped" % name)
+
+    def _spool_name(self):
+        """
+        Name of the spool of the DCC, made of the class of the DCC and the url or ip, and port, its DccComms
+        connect to.
+
+        :return: Name of the spool, or None if the DccComms has none of these attributes
+        """
+        endpoint = [str(getattr(self.comms, attr)) for attr in ('url', 'ip', 'port')
+                    if getattr(self.comms, attr, None) is not None]
+        if not endpoint:
+            return None
+        return re.sub(r'[^\w.-]+', '_', "-".join([type(self).__name__.lower()] + endpoint))
+
+    def _send(self, message, msg_attr):
+        """
+        Send a message using DccComms, or spool it if sending fails.
+
+        :param message: Formatted message
+        :param msg_attr: MessagingAttributes Object or None
+        :return:
+        """
+        if self.spool is None:
+            self.comms.send(message, msg_attr)
+            return
+        try:
+            self.comms.send(message, msg_attr)
+        except Exception:
+            log.warning("Sending failed, message is spooled", exc_info=True)
+            self.spool.append(pickle.dumps((message, msg_attr), 2))
 
     @abstractmethod
     def set_properties(self, reg_entity, properties):
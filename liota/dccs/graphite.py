@@ -30,6 +30,13 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 import logging
+import struct
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 from liota.dccs.dcc import DataCenterComponent
 from liota.entities.metrics.registered_metric import RegisteredMetric
 from liota.entities.metrics.metric import Metric
@@ -43,15 +50,27 @@ class Graphite(DataCenterComponent):
     """
     DCC implementation for Graphite.
     """
-    def __init__(self, comms):
+    PLAINTEXT = "plaintext"
+    PICKLE = "pickle"
+    supports_batch = True
+
+    def __init__(self, comms, protocol=PLAINTEXT, max_bytes_per_write=0):
         """
         Init method for Graphite DCC.
 
         :param comms: DccComms Object.
+        :param protocol: "plaintext", or "pickle" for carbon's pickle protocol (comms must then connect to carbon's
+                pickle receiver port, 2004 by default).
+        :param max_bytes_per_write: Max size in bytes of a message, larger data being split into several messages,
+                0 for no limit.
         """
+        if protocol not in (Graphite.PLAINTEXT, Graphite.PICKLE):
+            raise ValueError("protocol must be 'plaintext' or 'pickle'")
         super(Graphite, self).__init__(
             comms=comms
         )
+        self.protocol = protocol
+        self.max_bytes_per_write = max_bytes_per_write
 
     def register(self, entity_obj):
         """
@@ -90,25 +109,103 @@ class Graphite(DataCenterComponent):
         Formats data as required by Graphite DCC.
 
         :param reg_metric: RegisteredMetric Object.
-        :return: Formatted message string.
+        :return: Formatted message string, or list of them if max_bytes_per_write requires several writes.
         """
-        met_cnt = reg_metric.values.qsize()
-        message = ''
-        if met_cnt == 0:
-            return
-        for _ in range(met_cnt):
-            v = reg_metric.values.get(block=True)
-            if v is not None:
-                # Graphite expects time in seconds, not milliseconds. Hence,
-                # dividing by 1000
-                message += '%s %s %d\n' % (reg_metric.ref_entity.name,
-                                           v[1], v[0] / 1000)
-        if message == '':
+        message = self._encode(self._format_records(reg_metric))
+        if not message:
             return
         log.info ("Publishing values to Graphite DCC")
-        log.debug("Formatted message: {0}".format(message))
+        if self.protocol == Graphite.PLAINTEXT:
+            log.debug("Formatted message: {0}".format(message))
+        return message
+
+    def _format_data_batch(self, reg_metrics):
+        """
+        Formats data of several metrics as one message (multi-line plaintext or one pickled list).
+
+        :param reg_metrics: List of RegisteredMetric Objects.
+        :return: Formatted message string, or list of them if max_bytes_per_write requires several writes.
+        """
+        records = []
+        for reg_metric in reg_metrics:
+            records.extend(self._format_records(reg_metric))
+        if not records:
+            return
+        log.info("Publishing values of {0} metrics to Graphite DCC".format(len(reg_metrics)))
+        message = self._encode(records)
+        if self.protocol == Graphite.PLAINTEXT:
+            log.debug("Formatted message: {0}".format(message))
         return message
 
+    def _format_records(self, reg_metric):
+        """
+        Drains collected values of a metric into (path, timestamp, value) records.
+
+        :param reg_metric: RegisteredMetric Object.
+        :return: List of records.
+        """
+        timestamps, values = reg_metric.values.drain()
+        name = reg_metric.ref_entity.name
+        # Graphite expects time in seconds, not milliseconds. Hence,
+        # dividing by 1000
+        return [(name, ts / 1000, v) for ts, v in zip(timestamps, values)]
+
+    def _encode(self, records):
+        """
+        Encodes records with the configured protocol, splitting them into several messages if needed.
+
+        :param records: List of (path, timestamp, value) records.
+        :return: Message string, list of message strings, or None if there is no record.
+        """
+        if not records:
+            return
+        if self.protocol == Graphite.PICKLE:
+            messages = self._encode_pickle(records)
+        else:
+            messages = self._encode_plaintext(records)
+        if len(messages) == 1:
+            return messages[0]
+        return messages
+
+    def _encode_plaintext(self, records):
+        lines = ['%s %s %d\n' % (name, v, ts) for name, ts, v in records]
+        if not self.max_bytes_per_write:
+            return [''.join(lines)]
+        messages = []
+        chunk = []
+        size = 0
+        for line in lines:
+            if chunk and size + len(line) > self.max_bytes_per_write:
+                messages.append(''.join(chunk))
+                chunk = []
+                size = 0
+            chunk.append(line)
+            size += len(line)
+        messages.append(''.join(chunk))
+        return messages
+
+    def _encode_pickle(self, records):
+        payload = pickle.dumps([(name, (ts, v)) for name, ts, v in records], 2)
+        message = struct.pack('!L', len(payload)) + payload
+        if self.max_bytes_per_write and len(message) > self.max_bytes_per_write and len(records) > 1:
+            half = len(records) // 2
+            return self._encode_pickle(records[:half]) + self._encode_pickle(records[half:])
+        return [message]
+
+    def _send(self, message, msg_attr):
+        """
+        Sends a message, or each message of a list of them.
+
+        :param message: Message string or list of message strings
+        :param msg_attr: MessagingAttributes Object or None
+        :return:
+        """
+        if isinstance(message, list):
+            for m in message:
+                super(Graphite, self)._send(m, msg_attr)
+        else:
+            super(Graphite, self)._send(message, msg_attr)
+
     def set_properties(self, reg_entity, properties):
         raise NotImplementedError
 
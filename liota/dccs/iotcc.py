@@ -48,6 +48,9 @@ from liota.dccs.dcc import DataCenterComponent, RegistrationFailure
 from liota.entities.metrics.metric import Metric
 from liota.lib.utilities.utility import LiotaConfigPath, getUTCmillis, mkdir, read_liota_config
 from liota.lib.utilities.si_unit import parse_unit
+from liota.lib.utilities.inbound import LazyMessage, WorkerPool
+from liota.lib.utilities.request_mux import Future, RequestMultiplexer
+from liota.lib.utilities.write_behind import WriteBehindFiles
 from liota.entities.metrics.registered_metric import RegisteredMetric
 from liota.entities.registered_entity import RegisteredEntity
 
@@ -55,17 +58,11 @@ log = logging.getLogger(__name__)
 timeout = int(read_liota_config('IOTCC_PATH', 'iotcc_response_timeout'))
 
 
-class Request:
-    def __init__(self, transaction_id, user_queue):
-        # assume transaction_id will be unique in one process
-        self.transaction_id = transaction_id
-        self.user_queue = user_queue
-
-
 class IotControlCenter(DataCenterComponent):
     """ The implementation of IoTCC cloud provider solution
 
     """
+    supports_batch = True
 
     def __init__(self, con):
         """
@@ -89,14 +86,34 @@ class IotControlCenter(DataCenterComponent):
         recv_thread.start()
         # Wait for Subscription to be complete and then proceed to publish message
         time.sleep(0.5)
+        self.file_ops_lock = Lock()
+        # In-memory copies of iotcc.json (with its Devices indexed by uuid) and of entity files, written behind
+        self._store_writer = WriteBehindFiles(int(read_liota_config('IOTCC_PATH', 'iotcc_store_debounce_ms', '200')),
+                                              name="IotccStoreWriter")
+        self._iotcc_doc = {
+            "iotcc": {
+                "EdgeSystem": {"SystemName": "", "EntityType": "", "uuid": "", "LocalUuid": ""},
+                "OGProperties": {"OrganizationGroup": ""},
+                "Devices": []
+            }
+        }
+        self._iotcc_devices = {}
+        self._entity_props = {}
         self._iotcc_json = self._create_iotcc_json()
-        self._iotcc_json_load_retry = int(read_liota_config('IOTCC_PATH', 'iotcc_load_retry'))
         self.enable_reboot_getprop = read_liota_config('IOTCC_PATH', 'enable_reboot_getprop')
         self._sys_properties = read_liota_config('IOTCC_PATH', 'system_properties')
         self.counter = 0
+        self._id_lock = Lock()
         self._recv_msg_queue = self.comms.userdata
-        self._req_ops_lock = Lock()
-        self._req_dict = {}
+        # Outstanding requests, completed by responses carrying their transactionID
+        self._mux = RequestMultiplexer(self.comms.send,
+                                       int(read_liota_config('IOTCC_PATH', 'iotcc_max_outstanding_requests', '256')),
+                                       timeout, name="IotccRequest")
+        # Handlers of unsolicited messages (e.g. actions) per message type, run by the action workers
+        self._message_handlers = {}
+        self._action_pool = WorkerPool(int(read_liota_config('IOTCC_PATH', 'iotcc_action_workers', '4')),
+                                       int(read_liota_config('IOTCC_PATH', 'iotcc_action_queue_size', '1024')),
+                                       name="IotccAction")
         dispatch_thread = threading.Thread(target=self._dispatch_recvd_msg)
         dispatch_thread.daemon = True
         # This thread will continuously run in background to check and dispatch received responses
@@ -104,7 +121,25 @@ class IotControlCenter(DataCenterComponent):
         self.dev_file_path = self._get_file_storage_path("dev_file_path")
         # Liota internal entity file system path special for iotcc
         self.entity_file_path = self._get_file_storage_path("entity_file_path")
-        self.file_ops_lock = Lock()
+        # Properties known to IoTCC, with the uuid of the resource they were set on, and properties waiting to
+        # be coalesced, per local uuid of entities
+        self._props_cond = threading.Condition()
+        self._sent_props = {}
+        self._pending_props = {}
+        self._props_coalesce_s = int(read_liota_config('IOTCC_PATH', 'iotcc_property_coalesce_ms', '100')) / 1000.0
+        props_thread = threading.Thread(target=self._flush_properties_loop, name="IotccPropertyFlusher")
+        props_thread.daemon = True
+        props_thread.start()
+        # Warm start: registrations found in entity files are trusted and revalidated in the background
+        self._warm_cache = None
+        self._warm_started = set()
+        self._revalidate_q = Queue.Queue()
+        if read_liota_config('IOTCC_PATH', 'iotcc_warm_start', 'False') == "True":
+            self._warm_cache = self._load_warm_cache()
+            revalidate_thread = threading.Thread(target=self._revalidate, name="IotccRevalidator")
+            revalidate_thread.daemon = True
+            revalidate_thread.start()
+        self._init_spool()
 
     def register(self, entity_obj):
         """
@@ -113,6 +148,29 @@ class IotControlCenter(DataCenterComponent):
         :param entity_obj: Metric or Entity Object
         :return: RegisteredMetric or RegisteredEntity Object
         """
+        _reg_obj = self._registered_locally(entity_obj)
+        if _reg_obj is not None:
+            return _reg_obj
+        return self._registered(entity_obj, self._register_request(entity_obj).result())
+
+    def register_async(self, entity_obj):
+        """
+        Asynchronous counterpart of register().
+
+        :param entity_obj: Metric or Entity Object
+        :return: Future of the RegisteredMetric or RegisteredEntity Object
+        """
+        _reg_obj = self._registered_locally(entity_obj)
+        if _reg_obj is not None:
+            return Future.completed(_reg_obj)
+        return self._register_request(entity_obj).then(lambda json_msg: self._registered(entity_obj, json_msg))
+
+    def _registered_locally(self, entity_obj):
+        """
+        :param entity_obj: Metric or Entity Object
+        :return: RegisteredMetric Object, RegisteredEntity Object from the warm start cache, or None if entity_obj
+                 must be registered with IoTCC
+        """
         self._assert_input(entity_obj.name, 50)
         self._assert_input(entity_obj.entity_type, 50)
 
@@ -120,61 +178,255 @@ class IotControlCenter(DataCenterComponent):
             # reg_entity_id should be parent's one: not known here yet
             # will add in creat_relationship(); publish_unit should be done inside
             return RegisteredMetric(entity_obj, self, None)
-        else:
-            # finally will create a RegisteredEntity
-            log.info("Registering resource with IoTCC {0}".format(entity_obj.name))
-            reg_resp_q = Queue.Queue()
-
-            def on_response(msg, reg_resp_q):
-                log.debug("Received msg: {0}".format(msg))
-                json_msg = json.loads(msg)
-                log.debug("Processing msg: {0}".format(json_msg["type"]))
-                self._check_version(json_msg)
-                if json_msg["type"] == "create_or_find_resource_response" and json_msg["body"]["uuid"] != "null" and \
-                                json_msg["body"]["id"] == entity_obj.entity_id:
-                    log.info("FOUND RESOURCE: {0}".format(json_msg["body"]["uuid"]))
-                    self.reg_entity_id = json_msg["body"]["uuid"]
+        return self._warm_register(entity_obj)
+
+    def _register_request(self, entity_obj):
+        """
+        Send the create_or_find_resource request of an entity.
+
+        :param entity_obj: Entity Object
+        :return: Future of the create_or_find_resource_response
+        """
+        log.info("Registering resource with IoTCC {0}".format(entity_obj.name))
+        if entity_obj.entity_type == "EdgeSystem":
+            entity_obj.entity_type = "HelixGateway"
+
+        def accept(json_msg):
+            if json_msg["version"] == self._version and (
+                            json_msg["type"] != "create_or_find_resource_response" or
+                            json_msg["body"].get("uuid") == "null" or
+                            json_msg["body"].get("id") != entity_obj.entity_id):
+                log.info("Waiting for resource creation")
+                return False
+            return True
+
+        return self._request(lambda transaction_id: self._registration(transaction_id, entity_obj.entity_id,
+                                                                       entity_obj.name, entity_obj.entity_type),
+                             accept)
+
+    def _registered(self, entity_obj, json_msg):
+        return self._complete_registration(entity_obj, self._registered_uuid(json_msg))
+
+    def _registered_uuid(self, json_msg):
+        """
+        :param json_msg: create_or_find_resource_response
+        :return: uuid of the resource in IoTCC
+        """
+        self._check_version(json_msg)
+        reg_entity_id = json_msg["body"].get("uuid")
+        if not reg_entity_id:
+            raise RegistrationFailure()
+        log.info("FOUND RESOURCE: {0}".format(reg_entity_id))
+        return reg_entity_id
+
+    def register_many(self, entity_objs, window=None):
+        """
+        Register several entity Objects to IoT Pulse DCC, keeping up to window registration requests in flight
+        instead of waiting for each response before sending the next request.  Results are yielded as responses
+        arrive, so not necessarily in the order of entity_objs.
+
+        :param entity_objs: Iterable of Metric or Entity Objects
+        :param window: Max number of registration requests awaiting a response, None to read it from liota.conf
+        :return: Generator of (entity_obj, RegisteredMetric or RegisteredEntity Object, or the Exception raised while
+                 registering entity_obj)
+        """
+        if self._warm_cache:
+            cold_entity_objs = []
+            for entity_obj in entity_objs:
+                _reg_entity_obj = None
+                if not isinstance(entity_obj, Metric):
+                    _reg_entity_obj = self._warm_register(entity_obj)
+                if _reg_entity_obj is not None:
+                    yield entity_obj, _reg_entity_obj
                 else:
-                    log.info("Waiting for resource creation")
-                    on_response(reg_resp_q.get(True, timeout), reg_resp_q)
-
-            if entity_obj.entity_type == "EdgeSystem":
-                entity_obj.entity_type = "HelixGateway"
-            transaction_id = self._next_id()
-            req = Request(transaction_id, reg_resp_q)
-            log.debug("Updating resource registration queue for transaction_id:{0}".format(transaction_id))
-            with self._req_ops_lock:
-                self._req_dict.update({transaction_id: req})
-            self.comms.send(json.dumps(
-                self._registration(transaction_id, entity_obj.entity_id, entity_obj.name, entity_obj.entity_type)))
-            on_response(reg_resp_q.get(True, timeout), reg_resp_q)
-            if not self.reg_entity_id:
-                raise RegistrationFailure()
-            log.info("Resource Registered {0}".format(entity_obj.name))
-            if entity_obj.entity_type == "HelixGateway":
-                with self.file_ops_lock:
-                    self._store_reg_entity_details(entity_obj.entity_type, entity_obj.name, self.reg_entity_id,
-                                                   entity_obj.entity_id)
-                    self._store_reg_entity_attributes("EdgeSystem", entity_obj,
-                                                      self.reg_entity_id, None, None)
+                    cold_entity_objs.append(entity_obj)
+            entity_objs = cold_entity_objs
+        for entity_obj, result in self._register_requests(entity_objs, window):
+            if isinstance(result, basestring):
+                try:
+                    result = self._complete_registration(entity_obj, result)
+                except Exception as ex:
+                    log.exception("Registration of resource {0} failed".format(entity_obj.name))
+                    result = ex
+            yield entity_obj, result
+
+    def _register_requests(self, entity_objs, window):
+        """
+        Pipelined create_or_find_resource requests of register_many.
+
+        :param entity_objs: Iterable of Metric or Entity Objects
+        :param window: Max number of registration requests awaiting a response, None to read it from liota.conf
+        :return: Generator of (entity_obj, uuid of the resource in IoTCC, or RegisteredMetric Object, or the
+                 Exception raised while registering entity_obj)
+        """
+        if window is None:
+            window = int(read_liota_config('IOTCC_PATH', 'iotcc_registration_window', '32'))
+        window = max(1, window)
+        entity_objs = iter(entity_objs)
+        done_q = Queue.Queue()
+        in_flight = 0
+        while True:
+            for entity_obj in entity_objs:
+                try:
+                    self._assert_input(entity_obj.name, 50)
+                    self._assert_input(entity_obj.entity_type, 50)
+                except ValueError as ex:
+                    yield entity_obj, ex
+                    continue
+                if isinstance(entity_obj, Metric):
+                    yield entity_obj, RegisteredMetric(entity_obj, self, None)
+                    continue
+                self._register_request(entity_obj).add_done_callback(
+                    lambda future, entity_obj=entity_obj: done_q.put((entity_obj, future)))
+                in_flight += 1
+                if in_flight >= window:
+                    break
+            if not in_flight:
+                return
+            entity_obj, future = done_q.get()
+            in_flight -= 1
+            try:
+                result = self._registered_uuid(future.result())
+            except Exception as ex:
+                log.error("Registration of resource {0} failed: {1!r}".format(entity_obj.name, ex))
+                result = ex
+            yield entity_obj, result
+
+    def _complete_registration(self, entity_obj, reg_entity_id):
+        """
+        Store details of a resource registered with IoTCC, and set its system properties.
+
+        :param entity_obj: Entity Object
+        :param reg_entity_id: uuid of the resource in IoTCC
+        :return: RegisteredEntity Object
+        """
+        log.info("Resource Registered {0}".format(entity_obj.name))
+        self._store_registration(entity_obj, reg_entity_id)
+        _reg_entity_obj = RegisteredEntity(entity_obj, self, reg_entity_id)
+        self._set_sys_properties(_reg_entity_obj)
+        return _reg_entity_obj
+
+    def _store_registration(self, entity_obj, reg_entity_id):
+        if entity_obj.entity_type == "HelixGateway":
+            with self.file_ops_lock:
+                self._store_reg_entity_details(entity_obj.entity_type, entity_obj.name, reg_entity_id,
+                                               entity_obj.entity_id)
+                self._store_reg_entity_attributes("EdgeSystem", entity_obj,
+                                                  reg_entity_id, None, None)
+        else:
+            # get dev_type, and prop_dict if possible
+            with self.file_ops_lock:
+                self._store_reg_entity_attributes("Devices", entity_obj, reg_entity_id,
+                                                  entity_obj.entity_type, None)
+
+    def _set_sys_properties(self, reg_entity_obj):
+        if self._sys_properties:
+            _sys_prop_dict = ast.literal_eval(self._sys_properties)
+            if isinstance(_sys_prop_dict, dict) and _sys_prop_dict:
+                self._queue_properties(reg_entity_obj, _sys_prop_dict)
+                log.info(
+                    "System Properties {0} defined for the resource {1}".format(self._sys_properties,
+                                                                                reg_entity_obj.ref_entity.name))
             else:
-                # get dev_type, and prop_dict if possible
-                with self.file_ops_lock:
-                    self._store_reg_entity_attributes("Devices", entity_obj, self.reg_entity_id,
-                                                      entity_obj.entity_type, None)
-
-            _reg_entity_obj = RegisteredEntity(entity_obj, self, self.reg_entity_id)
-            if self._sys_properties:
-                _sys_prop_dict = ast.literal_eval(self._sys_properties)
-                if isinstance(_sys_prop_dict, dict) and _sys_prop_dict:
-                    self.set_properties(_reg_entity_obj, _sys_prop_dict)
-                    log.info(
-                        "System Properties {0} defined for the resource {1}".format(self._sys_properties,
-                                                                                    entity_obj.name))
-                else:
-                    log.info("System Properties {0} not defined for the resource {1}".format(self._sys_properties,
-                                                                                             entity_obj.name))
-            return _reg_entity_obj
+                log.info("System Properties {0} not defined for the resource {1}".format(
+                    self._sys_properties, reg_entity_obj.ref_entity.name))
+
+    def _load_warm_cache(self):
+        """
+        Index registrations found in entity files by local uuid of the entity.  If several files have the same
+        local uuid, the one with the newest Entity_Timestamp is used.
+
+        :return: Dict of local uuid to (uuid of the resource in IoTCC, entity file properties)
+        """
+        warm_cache = {}
+        if not self.entity_file_path:
+            return warm_cache
+        for file_name in os.listdir(self.entity_file_path):
+            if not file_name.endswith('.json'):
+                continue
+            reg_entity_id = file_name[:-len('.json')]
+            prop_dict = self._read_entity_file(reg_entity_id)
+            if isinstance(prop_dict, dict) and prop_dict.get('local uuid'):
+                # an entity may have left several files: keep the last written one
+                cached = warm_cache.get(prop_dict['local uuid'])
+                if cached is None or (prop_dict.get('Entity_Timestamp', ''), reg_entity_id) > \
+                        (cached[1].get('Entity_Timestamp', ''), cached[0]):
+                    warm_cache[prop_dict['local uuid']] = (reg_entity_id, prop_dict)
+        log.info("Warm start with {0} cached registrations".format(len(warm_cache)))
+        return warm_cache
+
+    def _warm_register(self, entity_obj):
+        """
+        Register an entity Object from the warm start cache, and queue its revalidation with IoTCC.
+
+        :param entity_obj: Entity Object
+        :return: RegisteredEntity Object, or None if entity_obj must be registered with IoTCC
+        """
+        if not self._warm_cache or entity_obj.entity_id not in self._warm_cache:
+            return None
+        reg_entity_id, prop_dict = self._warm_cache[entity_obj.entity_id]
+        if entity_obj.entity_type in ("EdgeSystem", "HelixGateway"):
+            matches = prop_dict.get('entity type') == "EdgeSystem"
+        else:
+            matches = prop_dict.get('entity type') == "Devices" and \
+                      prop_dict.get('device type') == entity_obj.entity_type
+        if not matches or prop_dict.get('name') != entity_obj.name:
+            return None
+        if entity_obj.entity_type == "EdgeSystem":
+            entity_obj.entity_type = "HelixGateway"
+        if entity_obj.entity_type == "HelixGateway":
+            with self.file_ops_lock:
+                self._store_reg_entity_details(entity_obj.entity_type, entity_obj.name, reg_entity_id,
+                                               entity_obj.entity_id)
+        log.info("Resource {0} registered from warm start cache".format(entity_obj.name))
+        _reg_entity_obj = RegisteredEntity(entity_obj, self, reg_entity_id)
+        self._warm_started.add(_reg_entity_obj)
+        self._revalidate_q.put(("register", _reg_entity_obj))
+        return _reg_entity_obj
+
+    def _revalidate(self):
+        """
+        Revalidate warm started registrations with IoTCC, and run the requests deferred until then.  Registrations
+        queued together are pipelined.
+        """
+        while True:
+            items = [self._revalidate_q.get(True)]
+            while True:
+                try:
+                    items.append(self._revalidate_q.get_nowait())
+                except Queue.Empty:
+                    break
+            try:
+                self._revalidate_items(items)
+            except Exception:
+                log.exception("Exception while revalidating warm started resources")
+
+    def _revalidate_items(self, items):
+        reg_entities = dict((item[1].ref_entity, item[1]) for item in items if item[0] == "register")
+        for entity_obj, result in self._register_requests(reg_entities.keys(), None):
+            _reg_entity_obj = reg_entities[entity_obj]
+            try:
+                if not isinstance(result, basestring):
+                    raise result
+                if result != _reg_entity_obj.reg_entity_id:
+                    log.warning("Resource {0} is registered as {1} instead of cached {2}".format(
+                        entity_obj.name, result, _reg_entity_obj.reg_entity_id))
+                    previous_reg_entity_id = _reg_entity_obj.reg_entity_id
+                    self._reset_properties(_reg_entity_obj, result)
+                    with self.file_ops_lock:
+                        self._remove_entity_file(previous_reg_entity_id)
+                self._store_registration(entity_obj, result)
+                self._set_sys_properties(_reg_entity_obj)
+                log.info("Warm started resource {0} revalidated".format(entity_obj.name))
+            except Exception:
+                log.exception("Revalidation of warm started resource {0} failed".format(entity_obj.name))
+            self._warm_started.discard(_reg_entity_obj)
+        for item in items:
+            try:
+                if item[0] == "relationship":
+                    self._relationship_created(item[1], item[2], self._relationship_request(item[1], item[2]).result())
+            except Exception:
+                log.exception("Deferred {0} request failed".format(item[0]))
 
     def _check_version(self, json_msg):
         if json_msg["version"] != self._version:
@@ -189,24 +441,35 @@ class IotControlCenter(DataCenterComponent):
         :param entity_obj: Registered Entity
         :return:
         """
+        self._unregistered(entity_obj, self._unregister_request(entity_obj).result())
 
+    def unregister_async(self, entity_obj):
+        """
+        Asynchronous counterpart of unregister().
+
+        :param entity_obj: Registered Entity
+        :return: Future of None, done once the entity is unregistered
+        """
+        return self._unregister_request(entity_obj).then(lambda json_msg: self._unregistered(entity_obj, json_msg))
+
+    def _unregister_request(self, entity_obj):
         log.info("Unregistering resource with IoTCC {0}".format(entity_obj.ref_entity.name))
-        unreg_resp_q = Queue.Queue()
-        transaction_id = self._next_id()
-        req = Request(transaction_id, unreg_resp_q)
-        log.debug("Updating unregister response queue for transaction_id:{0}".format(transaction_id))
-        with self._req_ops_lock:
-            self._req_dict.update({transaction_id: req})
-        self.comms.send(json.dumps(self._unregistration(transaction_id, entity_obj.ref_entity)))
-        response = self._handle_response(unreg_resp_q.get(True, timeout))
+        return self._request(lambda transaction_id: self._unregistration(transaction_id, entity_obj.ref_entity))
+
+    def _unregistered(self, entity_obj, json_msg):
+        response = self._handle_response(json_msg)
         if response:
             log.info("Unregistration of resource {0} with IoTCC succeeded".format(entity_obj.ref_entity.name))
-            if entity_obj.ref_entity.entity_type != "HelixGateway":
-                self._store_device_info(entity_obj.reg_entity_id, entity_obj.ref_entity.name,
-                                        entity_obj.ref_entity.entity_type, None, True)
-            else:
-                self._remove_reg_entity_details(entity_obj.ref_entity.name, entity_obj.reg_entity_id)
-                self._store_device_info(entity_obj.reg_entity_id, entity_obj.ref_entity.name, None, None, True)
+            with self._props_cond:
+                self._sent_props[entity_obj.ref_entity.entity_id] = (entity_obj.reg_entity_id, {})
+                self._pending_props.pop(entity_obj.ref_entity.entity_id, None)
+            with self.file_ops_lock:
+                if entity_obj.ref_entity.entity_type != "HelixGateway":
+                    self._store_device_info(entity_obj.reg_entity_id, entity_obj.ref_entity.name,
+                                            entity_obj.ref_entity.entity_type, None, True)
+                else:
+                    self._remove_reg_entity_details(entity_obj.ref_entity.name, entity_obj.reg_entity_id)
+                    self._store_device_info(entity_obj.reg_entity_id, entity_obj.ref_entity.name, None, None, True)
         else:
             raise Exception("Unregistration of resource {0} unsuccessful with IoTCC".format(entity_obj.ref_entity.name))
 
@@ -227,6 +490,30 @@ class IotControlCenter(DataCenterComponent):
         :param reg_entity_child:  Registered Device or Registered Metric Object
         :return: None
          """
+        future = self._start_relationship(reg_entity_parent, reg_entity_child)
+        if future is not None:
+            self._relationship_created(reg_entity_parent, reg_entity_child, future.result())
+
+    def create_relationship_async(self, reg_entity_parent, reg_entity_child):
+        """
+        Asynchronous counterpart of create_relationship().
+
+        :param reg_entity_parent: Registered EdgeSystem or Registered Device Object
+        :param reg_entity_child:  Registered Device or Registered Metric Object
+        :return: Future of None, done once the relationship is created
+        """
+        future = self._start_relationship(reg_entity_parent, reg_entity_child)
+        if future is None:
+            return Future.completed(None)
+        return future.then(
+            lambda json_msg: self._relationship_created(reg_entity_parent, reg_entity_child, json_msg))
+
+    def _start_relationship(self, reg_entity_parent, reg_entity_child):
+        """
+        Set up a relationship locally and send its create relationship request, unless none is needed now.
+
+        :return: Future of the response, or None
+        """
         # sanity check: must be RegisteredEntity or RegisteredMetricRegisteredMetric
         if (not isinstance(reg_entity_parent, RegisteredEntity)) \
                 or (not isinstance(reg_entity_child, RegisteredEntity) \
@@ -241,34 +528,42 @@ class IotControlCenter(DataCenterComponent):
             # If the units are passed from user code they`ll be set as unit properties
             if entity_obj.unit is not None:
                 self.publish_unit(reg_entity_child, entity_obj.name, entity_obj.unit)
+        elif reg_entity_child in self._warm_started:
+            self._revalidate_q.put(("relationship", reg_entity_parent, reg_entity_child))
         else:
-            # create relationship internal queue
-            rel_resp_q = Queue.Queue()
-            transaction_id = self._next_id()
-            req = Request(transaction_id, rel_resp_q)
-            log.debug("Updating create relationship response queue for transaction_id:{0}".format(transaction_id))
-            with self._req_ops_lock:
-                self._req_dict.update({transaction_id: req})
-            self.comms.send(json.dumps(self._relationship(transaction_id,
-                                                          reg_entity_parent.ref_entity,
-                                                          reg_entity_child.ref_entity)))
-            response = self._handle_response(rel_resp_q.get(True, timeout))
-            if response:
-                log.info("Relationship between entities {0} & {1} created successfully in IoTCC".format(
-                    reg_entity_parent.ref_entity.name, reg_entity_child.ref_entity.name))
-            else:
-                raise Exception("Relationship creation between entities {0} & {1} failed in IoTCC".format(
-                    reg_entity_parent.ref_entity.name, reg_entity_child.ref_entity.name))
+            return self._relationship_request(reg_entity_parent, reg_entity_child)
+
+    def _relationship_request(self, reg_entity_parent, reg_entity_child):
+        return self._request(lambda transaction_id: self._relationship(transaction_id, reg_entity_parent.ref_entity,
+                                                                       reg_entity_child.ref_entity))
+
+    def _relationship_created(self, reg_entity_parent, reg_entity_child, json_msg):
+        response = self._handle_response(json_msg)
+        if response:
+            log.info("Relationship between entities {0} & {1} created successfully in IoTCC".format(
+                reg_entity_parent.ref_entity.name, reg_entity_child.ref_entity.name))
+        else:
+            raise Exception("Relationship creation between entities {0} & {1} failed in IoTCC".format(
+                reg_entity_parent.ref_entity.name, reg_entity_child.ref_entity.name))
 
-    def _handle_response(self, msg):
+    def _request(self, build, accept=None):
+        """
+        Send a request through the multiplexer.
+
+        :param build: Function of a transaction ID returning the request message
+        :param accept: Function of a response returning False if the request must keep waiting for a later one
+        :return: Future of the response
+        """
+        transaction_id = self._next_id()
+        return self._mux.submit(transaction_id, json.dumps(build(transaction_id)), accept)
+
+    def _handle_response(self, json_msg):
         """
         Process the responses for various types of request messages
-        :param msg: response message received
+        :param json_msg: response message received
         :return: boolean
         """
-        log.debug("Received msg: {0}".format(msg))
-        json_msg = json.loads(msg)
-        log.debug("Processing msg: {0}".format(json_msg["type"]))
+        log.debug("Processing msg: %s", json_msg["type"])
         self._check_version(json_msg)
         return json_msg["body"]["result"] == "succeeded"
 
@@ -335,30 +630,42 @@ class IotControlCenter(DataCenterComponent):
         }
 
     def _format_data(self, reg_metric):
-        met_cnt = reg_metric.values.qsize()
-        if met_cnt == 0:
+        metric_data = self._metric_data(reg_metric)
+        if metric_data is None:
             return
-        _timestamps = []
-        _values = []
-        for _ in range(met_cnt):
-            m = reg_metric.values.get(block=True)
-            if m is not None:
-                _timestamps.append(m[0])
-                _values.append(m[1])
-        if _timestamps == []:
+        return self._add_stats(reg_metric.parent, [metric_data])
+
+    def _format_data_batch(self, reg_metrics):
+        """
+        Formats data of several metrics of the same parent entity as one add_stats message.
+
+        :param reg_metrics: List of RegisteredMetric Objects sharing the same parent
+        :return: Formatted message string
+        """
+        metric_data = [d for d in map(self._metric_data, reg_metrics) if d is not None]
+        if not metric_data:
             return
+        return self._add_stats(reg_metrics[0].parent, metric_data)
+
+    def _metric_data(self, reg_metric):
+        _timestamps, _values = reg_metric.values.drain()
+        if len(_timestamps) == 0:
+            return
+        return {
+            "statKey": reg_metric.ref_entity.name,
+            "timestamps": list(_timestamps),
+            "data": list(_values)
+        }
+
+    def _add_stats(self, reg_parent, metric_data):
         return json.dumps({
             "type": "add_stats",
             "version": self._version,
             "body": {
-                "kind": reg_metric.parent.ref_entity.entity_type,
-                "id": reg_metric.parent.ref_entity.entity_id,
-                "name": reg_metric.parent.ref_entity.name,
-                "metric_data": [{
-                    "statKey": reg_metric.ref_entity.name,
-                    "timestamps": _timestamps,
-                    "data": _values
-                }]
+                "kind": reg_parent.ref_entity.entity_type,
+                "id": reg_parent.ref_entity.entity_id,
+                "name": reg_parent.ref_entity.name,
+                "metric_data": metric_data
 
             }
         })
@@ -370,6 +677,31 @@ class IotControlCenter(DataCenterComponent):
         :param properties: Properties List
         :return:
         """
+        request = self._start_properties(reg_entity_obj, properties)
+        if request is not None:
+            future, entity, properties = request
+            self._properties_set(reg_entity_obj, entity, properties, future.result())
+
+    def set_properties_async(self, reg_entity_obj, properties):
+        """
+        Asynchronous counterpart of set_properties().
+
+        :param reg_entity_obj: RegisteredEntity Object
+        :param properties: Properties List
+        :return: Future of None, done once the properties are set
+        """
+        request = self._start_properties(reg_entity_obj, properties)
+        if request is None:
+            return Future.completed(None)
+        future, entity, properties = request
+        return future.then(lambda json_msg: self._properties_set(reg_entity_obj, entity, properties, json_msg))
+
+    def _start_properties(self, reg_entity_obj, properties):
+        """
+        Merge properties with those queued for the entity and send the ones that changed.
+
+        :return: (Future of the response, Entity Object, Properties Dict sent), or None if no property changed
+        """
         # RegisteredMetric get parent's resid; RegisteredEntity gets own resid
         reg_entity_id = reg_entity_obj.reg_entity_id
 
@@ -378,17 +710,54 @@ class IotControlCenter(DataCenterComponent):
         else:
             entity = reg_entity_obj.ref_entity
 
-        set_prop_resp_q = Queue.Queue()
-        # create and add register request into req_list (waiting list)
-        transaction_id = self._next_id()
-        req = Request(transaction_id, set_prop_resp_q)
-        log.debug("Updating set properties response queue for transaction_id:{0}".format(transaction_id))
-        with self._req_ops_lock:
-            self._req_dict.update({transaction_id: req})
-        self.comms.send(json.dumps(
-            self._properties(transaction_id, entity.entity_type, entity.entity_id, entity.name,
-                             getUTCmillis(), properties)))
-        response = self._handle_response(set_prop_resp_q.get(True, timeout))
+        with self._props_cond:
+            pending = self._pending_props.pop(entity.entity_id, None)
+            if pending is not None:
+                pending[1].update(properties)
+                properties = pending[1]
+            properties = self._changed_properties(entity, reg_entity_id, properties)
+        if not properties:
+            log.debug("Properties of resource {0} are unchanged".format(entity.name))
+            return None
+        return self._properties_request(entity, properties), entity, properties
+
+    def _properties_request(self, entity, properties):
+        """
+        Send an add_properties request.  The properties count as known to IoTCC while the request is in flight,
+        so that they are not sent again meanwhile, and no longer do if it fails.
+
+        :param entity: Entity Object the properties belong to
+        :param properties: Properties Dict
+        :return: Future of the response
+        """
+        with self._props_cond:
+            sent = self._sent_props.setdefault(entity.entity_id, (None, {}))[1]
+            sent.update(properties)
+
+        def on_done(future):
+            if future.exception() is not None or future.result()["body"]["result"] != "succeeded":
+                with self._props_cond:
+                    for key, value in properties.items():
+                        if sent.get(key) == value:
+                            del sent[key]
+
+        future = self._request(lambda transaction_id: self._properties(transaction_id, entity.entity_type,
+                                                                       entity.entity_id, entity.name,
+                                                                       getUTCmillis(), properties))
+        future.add_done_callback(on_done)
+        return future
+
+    def _properties_set(self, reg_entity_obj, entity, properties, json_msg):
+        """
+        Store the properties locally once IoTCC accepted them.
+
+        :param reg_entity_obj: RegisteredEntity or RegisteredMetric Object
+        :param entity: Entity Object the properties belong to
+        :param properties: Properties Dict
+        :param json_msg: add_properties response
+        :return:
+        """
+        response = self._handle_response(json_msg)
         if response:
             log.info("Properties defined for resource {0}".format(entity.name))
         else:
@@ -403,6 +772,109 @@ class IotControlCenter(DataCenterComponent):
                 self._store_reg_entity_attributes("Devices", entity, reg_entity_obj.reg_entity_id,
                                                   entity.entity_type, properties)
 
+    def _changed_properties(self, entity, reg_entity_id, properties):
+        """
+        Properties differing from those IoTCC knows for an entity, which are seeded from its entity file
+        whenever the entity is registered under another uuid.  Caller must hold _props_cond.
+
+        :param entity: Entity Object
+        :param reg_entity_id: uuid of the resource in IoTCC
+        :param properties: Properties Dict
+        :return: Dict of changed properties
+        """
+        sent_props = self._sent_props.get(entity.entity_id)
+        if sent_props is not None and sent_props[0] == reg_entity_id:
+            sent = sent_props[1]
+        else:
+            sent = {}
+            if reg_entity_id is not None and self.entity_file_path and \
+                    (reg_entity_id in self._entity_props or
+                         os.path.exists(self.entity_file_path + '/' + reg_entity_id + '.json')):
+                prop_dict = self._read_entity_file(reg_entity_id) or {}
+                for key, value in prop_dict.items():
+                    if key not in ('entity type', 'name', 'device type', 'Entity_Timestamp', 'local uuid'):
+                        sent[key] = value
+            self._sent_props[entity.entity_id] = (reg_entity_id, sent)
+        return dict((key, value) for key, value in properties.items() if sent.get(key) != value)
+
+    def _reset_properties(self, reg_entity_obj, reg_entity_id):
+        """
+        Move a registered entity to another uuid.  The properties known to IoTCC for its previous resource are
+        forgotten and queued to be set again on the new one.
+
+        :param reg_entity_obj: RegisteredEntity Object
+        :param reg_entity_id: New uuid of the resource in IoTCC
+        :return:
+        """
+        entity = reg_entity_obj.ref_entity
+        with self._props_cond:
+            self._changed_properties(entity, reg_entity_obj.reg_entity_id, {})
+            properties = self._sent_props[entity.entity_id][1]
+            self._sent_props[entity.entity_id] = (reg_entity_id, {})
+            reg_entity_obj.reg_entity_id = reg_entity_id
+        if properties:
+            self._queue_properties(reg_entity_obj, properties)
+
+    def _queue_properties(self, reg_entity_obj, properties):
+        """
+        Queue properties to be set for an entity without waiting.  Properties queued for the same entity within
+        iotcc_property_coalesce_ms are sent in one request, and only if they changed.
+
+        :param reg_entity_obj: RegisteredEntity or RegisteredMetric Object
+        :param properties: Properties Dict
+        :return:
+        """
+        if isinstance(reg_entity_obj, RegisteredMetric):
+            entity = reg_entity_obj.parent.ref_entity
+        else:
+            entity = reg_entity_obj.ref_entity
+        with self._props_cond:
+            pending = self._pending_props.get(entity.entity_id)
+            if pending is None:
+                self._pending_props[entity.entity_id] = (reg_entity_obj, dict(properties), time.time())
+                self._props_cond.notify()
+            else:
+                pending[1].update(properties)
+
+    def _flush_properties(self, force=False):
+        """
+        Send properties queued for longer than iotcc_property_coalesce_ms, or all of them if force is True.
+
+        :return: Time in seconds until the next queued properties are due, or None if none are queued
+        """
+        with self._props_cond:
+            now = time.time()
+            due = [entity_id for entity_id, pending in self._pending_props.items()
+                   if force or now - pending[2] >= self._props_coalesce_s]
+            batches = []
+            for entity_id in due:
+                reg_entity_obj, properties, _ = self._pending_props.pop(entity_id)
+                entity = reg_entity_obj.parent.ref_entity if isinstance(reg_entity_obj, RegisteredMetric) else \
+                    reg_entity_obj.ref_entity
+                batches.append((reg_entity_obj, entity,
+                                self._changed_properties(entity, reg_entity_obj.reg_entity_id, properties)))
+            next_due = min([pending[2] for pending in self._pending_props.values()] or [None])
+        for reg_entity_obj, entity, properties in batches:
+            if not properties:
+                log.debug("Properties of resource {0} are unchanged".format(entity.name))
+                continue
+            self._properties_request(entity, properties).then(
+                lambda json_msg, reg_entity_obj=reg_entity_obj, entity=entity, properties=properties:
+                self._properties_set(reg_entity_obj, entity, properties, json_msg)).add_done_callback(
+                lambda future, entity=entity: future.exception() and log.error(
+                    "Setting Properties for resource {0} failed: {1!r}".format(entity.name, future.exception())))
+        if next_due is not None:
+            return max(0, next_due + self._props_coalesce_s - time.time())
+
+    def _flush_properties_loop(self):
+        while True:
+            with self._props_cond:
+                while not self._pending_props:
+                    self._props_cond.wait()
+            delay = self._flush_properties()
+            if delay:
+                time.sleep(delay)
+
     def publish_unit(self, reg_entity_obj, metric_name, unit):
         """
          Publish SI units as properties for Metrics but RegisteredMetric object are simply returned
@@ -435,118 +907,73 @@ class IotControlCenter(DataCenterComponent):
             log.debug("{0} metric unit with prefix cannot be parsed and published to IoTCC for resource {1}".format(
                 metric_name, reg_entity_obj.parent.ref_entity.name))
         if properties_unit_dict:
-            self.set_properties(reg_entity_obj, properties_unit_dict)
-            log.info("Published units for metric {0} to IoTCC for resource {1}".format(metric_name,
-                                                                                       reg_entity_obj.parent.ref_entity.name))
+            self._queue_properties(reg_entity_obj, properties_unit_dict)
+            log.info("Queued units for metric {0} to IoTCC for resource {1}".format(metric_name,
+                                                                                    reg_entity_obj.parent.ref_entity.name))
 
     def _create_iotcc_json(self):
-        msg = {
-            "iotcc": {
-                "EdgeSystem": {"SystemName": "", "EntityType": "", "uuid": "", "LocalUuid": ""},
-                "OGProperties": {"OrganizationGroup": ""},
-                "Devices": []
-            }
-        }
-
         iotcc_path = read_liota_config('IOTCC_PATH', 'iotcc_path')
         path = os.path.dirname(iotcc_path)
         mkdir(path)
         try:
             with open(iotcc_path, 'w') as f:
-                json.dump(msg, f, sort_keys=True, indent=4, ensure_ascii=False)
+                f.write(self._render_iotcc_json())
                 log.debug('Initialized ' + iotcc_path)
-            f.close()
         except IOError, err:
-            log.error('Could not open {0} file '.format(iotcc_path) + err)
+            log.error('Could not open {0} file '.format(iotcc_path) + str(err))
         return iotcc_path
 
+    def _render_iotcc_json(self):
+        with self.file_ops_lock:
+            return json.dumps(self._iotcc_doc, sort_keys=True, indent=4, ensure_ascii=False)
+
     def _store_reg_entity_details(self, entity_type, entity_name, reg_entity_id, entity_local_uuid):
         if self._iotcc_json == '':
             log.warn('iotcc.json file missing')
             return
-        try:
-            f = open(self._iotcc_json, 'r')
-        except IOError, err:
-            log.exception('Could not open {0} file '.format(self._iotcc_json) + str(err))
-            return
-
-        def load_json_record(f):
-            record = ''
-            try:
-                record = json.load(f)
-            except:
-                log.exception('Could not load json record from {0} '.format(self._iotcc_json))
-            return record
-
-        local_cnt = 1
-        msg = load_json_record(f)
-        while ((msg == '') and (local_cnt <= self._iotcc_json_load_retry)):
-            local_cnt += 1
-            msg = load_json_record(f)
-        f.close()
-        if msg == '':
-            log.error('Tried {0} times, while failed to load record from {0}'.format(local_cnt, self._iotcc_json))
-            return
-
         log.debug('{0}:{1}'.format(entity_name, reg_entity_id))
+        msg = self._iotcc_doc
         if entity_type == "HelixGateway":
-            msg["iotcc"]["EdgeSystem"]["SystemName"] = entity_name
-            msg["iotcc"]["EdgeSystem"]["uuid"] = reg_entity_id
-            msg["iotcc"]["EdgeSystem"]["EntityType"] = entity_type
-            msg["iotcc"]["EdgeSystem"]["LocalUuid"] = entity_local_uuid
+            edge_system = msg["iotcc"].setdefault("EdgeSystem", {})
+            edge_system["SystemName"] = entity_name
+            edge_system["uuid"] = reg_entity_id
+            edge_system["EntityType"] = entity_type
+            edge_system["LocalUuid"] = entity_local_uuid
         else:
-            entity_exist = False
-            for device in msg["iotcc"]["Devices"]:
-                if device["uuid"] == reg_entity_id and device["EntityType"] == entity_type and device[
-                    "uuid"] == reg_entity_id:
-                    entity_exist = True
-                    break
-            if not entity_exist:
-                msg["iotcc"]["Devices"].append(
-                    {"DeviceName": entity_name, "uuid": reg_entity_id, "EntityType": entity_type,
-                     "LocalUuid": entity_local_uuid})
-        if msg != '':
-            with open(self._iotcc_json, 'w') as f:
-                json.dump(msg, f, sort_keys=True, indent=4, ensure_ascii=False)
-            f.close()
+            device = self._iotcc_devices.get(reg_entity_id)
+            if device is None or device["EntityType"] != entity_type:
+                device = {"DeviceName": entity_name, "uuid": reg_entity_id, "EntityType": entity_type,
+                          "LocalUuid": entity_local_uuid}
+                msg["iotcc"]["Devices"].append(device)
+                self._iotcc_devices[reg_entity_id] = device
+        self._store_writer.write(self._iotcc_json, self._render_iotcc_json)
 
     def _remove_reg_entity_details(self, entity_name, reg_entity_id):
         if self._iotcc_json == '':
             log.warn('iotcc.json file missing')
             return
-        try:
-            with open(self._iotcc_json, 'r') as f:
-                msg = json.load(f)
-            f.close()
-        except IOError, err:
-            log.error('Could not open {0} file '.format(self._iotcc_json) + str(err))
+        msg = self._iotcc_doc
         log.debug('Remove {0}:{1} from iotcc.json'.format(entity_name, reg_entity_id))
-        if msg["iotcc"]["EdgeSystem"]["SystemName"] == entity_name and msg["iotcc"]["EdgeSystem"][
-            "uuid"] == reg_entity_id:
+        edge_system = msg["iotcc"].get("EdgeSystem")
+        if edge_system is not None and edge_system["SystemName"] == entity_name and \
+                        edge_system["uuid"] == reg_entity_id:
             del msg["iotcc"]["EdgeSystem"]
             log.info("Removed {0} edge-system from iotcc.json".format(entity_name))
         else:
-            entity_exist = False
-            for device in msg["iotcc"]["Devices"]:
-                if device["uuid"] == reg_entity_id and device["uuid"] == reg_entity_id:
-                    entity_exist = True
-                    try:
-                        msg["iotcc"]["Devices"].remove(device)
-                        log.info("Device {0} removed from iotcc.json".format(entity_name))
-                        break
-                    except ValueError:
-                        pass
-            if not entity_exist:
+            device = self._iotcc_devices.pop(reg_entity_id, None)
+            if device is not None:
+                msg["iotcc"]["Devices"].remove(device)
+                log.info("Device {0} removed from iotcc.json".format(entity_name))
+            else:
                 log.error("No such device {0} exists".format(entity_name))
-        with open(self._iotcc_json, 'w') as f:
-            json.dump(msg, f, sort_keys=True, indent=4, ensure_ascii=False)
-        f.close()
+        self._store_writer.write(self._iotcc_json, self._render_iotcc_json)
 
     def _write_entity_json_file(self, prop_dict, attribute_list, uuid, remove):
         if prop_dict is not None:
             for key in prop_dict.iterkeys():
                 value = prop_dict[key]
-                if key == 'entity type' or key == 'name' or key == 'device type' or key == 'Entity_Timestamp':
+                if key == 'entity type' or key == 'name' or key == 'device type' or key == 'Entity_Timestamp' or \
+                                key == 'local uuid':
                     continue
                 attribute_list.append({key: value})
         attribute_list.append({"LastSeenTimestamp": strftime("%Y-%m-%dT%H:%M:%S", gmtime())})
@@ -560,13 +987,7 @@ class IotControlCenter(DataCenterComponent):
         log.debug('msg: {0}'.format(msg))
         log.debug("store_entity_json_file dev_file_path:{0}".format(self.dev_file_path))
         file_path = self.dev_file_path + '/' + uuid + '.json'
-        try:
-            with open(file_path, 'w') as f:
-                json.dump(msg, f, sort_keys=True, indent=4, ensure_ascii=False)
-                log.debug('Initialized ' + file_path)
-            f.close()
-        except IOError, err:
-            log.error('Could not open {0} file '.format(file_path) + err)
+        self._store_writer.write(file_path, json.dumps(msg, sort_keys=True, indent=4, ensure_ascii=False))
 
     def _store_edge_system_info(self, uuid, name, prop_dict, remove):
         """
@@ -617,15 +1038,16 @@ class IotControlCenter(DataCenterComponent):
     def _write_entity_file(self, prop_dict, res_uuid):
         file_path = self.entity_file_path + '/' + res_uuid + '.json'
         prop_dict.update({"Entity_Timestamp": datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")})
-        try:
-            with open(file_path, "w") as json_file:
-                if (prop_dict is not None):
-                    json_string = json.dumps(prop_dict)
-                    json_file.write(json_string)
-        except:
-            log.error('Write file error')
+        self._entity_props[res_uuid] = dict(prop_dict)
+        self._store_writer.write(file_path, json.dumps(prop_dict))
+
+    def _remove_entity_file(self, res_uuid):
+        self._entity_props.pop(res_uuid, None)
+        self._store_writer.remove(self.entity_file_path + '/' + res_uuid + '.json')
 
     def _read_entity_file(self, res_uuid):
+        if res_uuid in self._entity_props:
+            return dict(self._entity_props[res_uuid])
         file_path = self.entity_file_path + '/' + res_uuid + '.json'
         prop_dict = None
         try:
@@ -661,7 +1083,7 @@ class IotControlCenter(DataCenterComponent):
         # if not match, replace with new above info + only prop_dict
         # (old property will not be used since outdated already)
         file_path = self.entity_file_path + '/' + reg_entity_id + '.json'
-        if not os.path.exists(file_path):
+        if reg_entity_id not in self._entity_props and not os.path.exists(file_path):
             tmp_dict = {'entity type': str(entity_type), 'name': str(entity_name)}
             if (dev_type is not None):
                 tmp_dict.update({"device type": str(dev_type)})
@@ -700,6 +1122,7 @@ class IotControlCenter(DataCenterComponent):
                 else:
                     new_prop_dict = tmp_dict
 
+        new_prop_dict['local uuid'] = entity.entity_id
         # write new property dictionary to local entity file
         self._write_entity_file(new_prop_dict, reg_entity_id)
         ### Write IOTCC device file for AW agents
@@ -745,9 +1168,10 @@ class IotControlCenter(DataCenterComponent):
             return None
 
     def _next_id(self):
-        self.counter = (self.counter + 1) & 0xffffff
-        # Enforce even IDs
-        return int(self.counter * 2)
+        with self._id_lock:
+            self.counter = (self.counter + 1) & 0xffffff
+            # Enforce even IDs
+            return int(self.counter * 2)
 
     def _unregistration(self, msg_id, ref_entity):
         return {
@@ -765,37 +1189,40 @@ class IotControlCenter(DataCenterComponent):
         """
         Get the list of properties from IoT Pulse DCC
 
-        :param resource_uuid: Resource Unique Identifier
-        :return:
+        :param entity: Entity Object
+        :return: Property list, or None if it could not be got
+        """
+        try:
+            return self._property_list(self._get_properties_request(entity).result())
+        except Exception:
+            log.exception("Exception while getting properties")
+
+    def get_properties_async(self, entity):
+        """
+        Asynchronous counterpart of get_properties().
+
+        :param entity: Entity Object
+        :return: Future of the property list
         """
+        return self._get_properties_request(entity).then(self._property_list)
+
+    def _get_properties_request(self, entity):
         log.info("Get properties defined with IoTCC for resource {0}".format(entity.entity_id))
-        self.prop_list = None
-        get_prop_resp_q = Queue.Queue()
 
-        def on_response(msg, get_prop_resp_q):
-            try:
-                log.debug("Received msg: {0}".format(msg))
-                json_msg = json.loads(msg)
-                log.debug("Processing msg: {0}".format(json_msg["type"]))
-                self._check_version(json_msg)
-                if json_msg["type"] == "get_properties_response" and json_msg["body"]["id"] != "null" and \
-                                json_msg["body"]["id"] == entity.entity_id:
-                    log.info("FOUND PROPERTY LIST: {0}".format(json_msg["body"]["propertyList"]))
-                    self.prop_list = json_msg["body"]["propertyList"]
-                else:
-                    log.info("Waiting for getting properties")
-                    on_response(self.get_prop_resp_q.get(True, timeout), get_prop_resp_q)
-            except:
-                log.exception("Exception while getting properties")
+        def accept(json_msg):
+            if json_msg["version"] == self._version and (
+                            json_msg["type"] != "get_properties_response" or json_msg["body"]["id"] == "null" or
+                            json_msg["body"]["id"] != entity.entity_id):
+                log.info("Waiting for getting properties")
+                return False
+            return True
 
-        transaction_id = self._next_id()
-        req = Request(transaction_id, get_prop_resp_q)
-        log.debug("Updating get properties response queue for transaction_id:{0}".format(transaction_id))
-        with self._req_ops_lock:
-            self._req_dict.update({transaction_id: req})
-        self.comms.send(json.dumps(self._get_properties(transaction_id, entity)))
-        on_response(get_prop_resp_q.get(True, timeout), get_prop_resp_q)
-        return self.prop_list
+        return self._request(lambda transaction_id: self._get_properties(transaction_id, entity), accept)
+
+    def _property_list(self, json_msg):
+        self._check_version(json_msg)
+        log.info("FOUND PROPERTY LIST: {0}".format(json_msg["body"]["propertyList"]))
+        return json_msg["body"]["propertyList"]
 
     def _assert_input(self, input, max_length):
         """ validates if the input string contains only the whitelisted characters """
@@ -804,6 +1231,20 @@ class IotControlCenter(DataCenterComponent):
         if not len(input) <= max_length:
             raise ValueError("The provided string contains more than {0} characters : {1}".format(max_length, input))
 
+    def add_message_handler(self, msg_type, handler):
+        """
+        Handle unsolicited messages of a type received from IoTCC, e.g. actions.  Handlers run in a pool of
+        iotcc_action_workers threads, so that bursts of such messages do not delay responses to requests.
+
+        :param msg_type: Message type
+        :param handler: Function called with the message as a dict, None to remove the handler of msg_type
+        :return:
+        """
+        if handler is None:
+            self._message_handlers.pop(msg_type, None)
+        else:
+            self._message_handlers[msg_type] = handler
+
     def _dispatch_recvd_msg(self):
         log.debug("Dispatching received messages from IOTCC")
 
@@ -811,23 +1252,28 @@ class IotControlCenter(DataCenterComponent):
             try:
                 # block until there is an item available
                 msg = self._recv_msg_queue.get(True)
-                log.debug("Received msg: {0}".format(msg))
-                json_msg = json.loads(msg)
-                log.debug(
-                    "Processing msg: type:{0} transaction_id:{1}".format(json_msg["type"], json_msg["transactionID"]))
-                # search matched request in request dictionary
-                # assume transaction_id will be unique in one process
-                log.debug("Dictionary keys:{0}".format(self._req_dict.keys()))
-                req = self._req_dict.get(json_msg["transactionID"])
-                # get/delete request from dictionary
-                if (req is not None):
-                    with self._req_ops_lock:
-                        del self._req_dict[json_msg["transactionID"]]
-                    # put response into requester's reception queue
-                    log.debug("Msg:{0} dispatched to user queue".format(msg))
-                    req.user_queue.put(msg)
-                else:
-                    # TBD: it may be other messages, e.g., Actions, Armada Campaign
-                    log.warn("Received unexpected message {0}".format(msg))
+                # route on the transaction ID alone, the consumer of the message decodes it
+                message = LazyMessage(msg)
+                transaction_id = message.transaction_id()
+                if transaction_id is None or not self._mux.dispatch(transaction_id, message):
+                    if not self._action_pool.submit(self._handle_message, message):
+                        log.warning("Action queue is full, dropped message %s", msg)
             except Exception:
                 log.exception("Exception in dispatching the received messages")
+
+    def _handle_message(self, json_msg):
+        """
+        Process an unsolicited message in an action worker.
+
+        :param json_msg: LazyMessage received
+        :return:
+        """
+        msg_type = json_msg.get("type")
+        handler = self._message_handlers.get(msg_type)
+        if handler is None:
+            # TBD: Armada Campaign
+            log.warning("Received unexpected message %s", json_msg.raw)
+            return
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Processing msg: type:%s transaction_id:%s", msg_type, json_msg.get("transactionID"))
+        handler(json_msg.decoded())
@@ -30,9 +30,12 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 
+import pickle
+
 import pint
 from liota.entities.entity import Entity
 from liota.entities.metrics.registered_metric import RegisteredMetric
+from liota.lib.utilities.sample_buffer import SampleBuffer
 from liota.lib.utilities.utility import systemUUID
 
 
@@ -42,7 +45,14 @@ class Metric(Entity):
                  unit=None,
                  interval=60,
                  aggregation_size=1,
-                 sampling_function=None
+                 sampling_function=None,
+                 execution_mode="thread",
+                 buffer_capacity=None,
+                 overflow_policy=SampleBuffer.DROP_OLDEST,
+                 overrun_policy="catch_up",
+                 max_burst=3,
+                 collection_timeout=None,
+                 max_batch_latency=None
                  ):
         """
         Create a local metric object.
@@ -52,6 +62,20 @@ class Metric(Entity):
         :param interval: Metric sampling interval
         :param aggregation_size: How many sampling results will be aggregated before publishing
         :param sampling_function: Metric sampling function
+        :param execution_mode: "thread" to run sampling function in collection thread pool, or "process" to
+                run it in a worker process (for CPU-heavy sampling functions, which must then be picklable,
+                i.e., defined at module level)
+        :param buffer_capacity: Max number of samples buffered until published, 0 for unbounded, None for
+                metric_buffer_capacity of liota.conf
+        :param overflow_policy: What to do with samples beyond buffer_capacity: "drop_oldest", "drop_newest"
+                or "downsample"
+        :param overrun_policy: What to do when sampling falls behind the interval: "skip" missed runs,
+                "catch_up" with a single run, or "burst" up to max_burst missed runs back-to-back
+        :param max_burst: Max number of missed runs done back-to-back with "burst" overrun policy
+        :param collection_timeout: Deadline in seconds of a collection, after which the metric is quarantined,
+                0 for none, None for collect_timeout_s of liota.conf
+        :param max_batch_latency: Max time in seconds collected data waits for aggregation_size to be reached before
+                being published anyway, None for no limit
         :return:
         """
         if not (unit is None or isinstance(unit, pint.unit._Unit)) \
@@ -60,6 +84,30 @@ class Metric(Entity):
         ) \
                 or not isinstance(aggregation_size, int):
             raise TypeError()
+        if buffer_capacity is not None and \
+                (not isinstance(buffer_capacity, int) or buffer_capacity < 0):
+            raise TypeError("buffer_capacity must be a non negative int")
+        if overflow_policy not in SampleBuffer.OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of %s" % str(SampleBuffer.OVERFLOW_POLICIES))
+        if overrun_policy not in ("skip", "catch_up", "burst"):
+            raise ValueError("overrun_policy must be 'skip', 'catch_up' or 'burst'")
+        if not isinstance(max_burst, int) or max_burst < 1:
+            raise TypeError("max_burst must be a positive int")
+        if collection_timeout is not None and \
+                (not (isinstance(collection_timeout, int) or isinstance(collection_timeout, float))
+                 or collection_timeout < 0):
+            raise TypeError("collection_timeout must be a non negative number")
+        if max_batch_latency is not None and \
+                (not (isinstance(max_batch_latency, int) or isinstance(max_batch_latency, float))
+                 or max_batch_latency <= 0):
+            raise TypeError("max_batch_latency must be a positive number")
+        if execution_mode not in ("thread", "process"):
+            raise ValueError("execution_mode must be 'thread' or 'process'")
+        if execution_mode == "process" and sampling_function is not None:
+            try:
+                pickle.dumps(sampling_function)
+            except (pickle.PicklingError, TypeError):
+                raise TypeError("sampling function of a process mode metric must be picklable")
         super(Metric, self).__init__(
             name=name,
             entity_id=systemUUID().get_uuid(name),
@@ -69,6 +117,13 @@ class Metric(Entity):
         self.interval = interval
         self.aggregation_size = aggregation_size
         self.sampling_function = sampling_function
+        self.execution_mode = execution_mode
+        self.buffer_capacity = buffer_capacity
+        self.overflow_policy = overflow_policy
+        self.overrun_policy = overrun_policy
+        self.max_burst = max_burst
+        self.collection_timeout = collection_timeout
+        self.max_batch_latency = max_batch_latency
 
     def register(self, dcc_obj, reg_entity_id):
         """
@@ -30,12 +30,16 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 
-from Queue import Queue
+import hashlib
 import inspect
 import logging
+import random
+import time
 from liota.core import metric_handler
 from liota.entities.registered_entity import RegisteredEntity
-from liota.lib.utilities.utility import getUTCmillis
+from liota.lib.utilities.metric_stats import MetricStats
+from liota.lib.utilities.sample_buffer import SampleBuffer
+from liota.lib.utilities.utility import getUTCmillis, getThreadCPUMillis
 
 
 log = logging.getLogger(__name__)
@@ -49,11 +53,30 @@ class RegisteredMetric(RegisteredEntity):
                                   reg_entity_id=reg_entity_id)
         self.flag_alive = False
         self._next_run_time = None
+        # tick of the metric's interval grid the next run belongs to, which
+        # is later than _next_run_time while catching up an overrun
+        self._scheduled_time = None
+        self._burst_size = 0
+        # runs which started after their next tick was already due, and
+        # ticks skipped because of them
+        self.overrun_count = 0
+        self.skipped_ticks = 0
+        # set while a collection abandoned by the watchdog is still running,
+        # and number of hung collections in a row
+        self.hung_collection = False
+        self.quarantine_count = 0
         self.current_aggregation_size = 0
+        # time the first sample not sent yet was added
+        self._batch_start_time = None
         # -------------------------------------------------------------------
-        # Elements in this queue are (ts, v) pairs.
+        # Elements in this buffer are (ts, v) pairs.
         #
-        self.values = Queue()
+        self.values = SampleBuffer(ref_metric.buffer_capacity or 0,
+                                   ref_metric.overflow_policy)
+        self.stats = MetricStats()
+        # registrations of the same metric to other DCCs, fed with samples
+        # collected by this one, see add_sink()
+        self.sinks = []
 
     def start_collecting(self):
         """
@@ -63,10 +86,26 @@ class RegisteredMetric(RegisteredEntity):
         :return:
         """
         self.flag_alive = True
+        for sink in self.sinks:
+            sink.flag_alive = True
         # TODO: Add a check to ensure that start_collecting for a metric is
         # called only once by the client code
         metric_handler.initialize()
-        self._next_run_time = getUTCmillis() + (self.ref_entity.interval * 1000)
+        for m in [self] + self.sinks:
+            m._apply_buffer_capacity()
+        now = getUTCmillis()
+        interval = self.ref_entity.interval * 1000
+        if metric_handler.phase_spreading:
+            # first tick after now at the metric's phase offset, so that
+            # metrics sharing an interval do not all fire at once
+            self._scheduled_time = now + \
+                (self.get_phase_offset() - now) % long(interval)
+            if self._scheduled_time == now:
+                self._scheduled_time += interval
+        else:
+            self._scheduled_time = now + interval
+        self._next_run_time = self._scheduled_time + self._get_jitter()
+        metric_handler.collecting_metrics.add(self)
         metric_handler.event_ds.put_and_notify(self)
 
     def stop_collecting(self):
@@ -75,19 +114,88 @@ class RegisteredMetric(RegisteredEntity):
         :return:
         """
         self.flag_alive = False
+        for sink in self.sinks:
+            sink.flag_alive = False
+        metric_handler.collecting_metrics.discard(self)
+        if metric_handler.event_ds is not None:
+            metric_handler.event_ds.cancel(self)
         log.debug("Metric %s is marked for deletion" %
                  str(self.ref_entity.name))
 
+    def add_sink(self, reg_metric):
+        """
+        Fan out samples collected for this registered metric to another
+        registration of the same metric, e.g. to another DCC, so that the
+        sampling function is called once however many DCCs the metric is
+        published to.  The sink keeps its own buffer and is published by its
+        own DCC; it must not be started itself.
+        :param reg_metric: RegisteredMetric of the same metric
+        :return:
+        """
+        if not isinstance(reg_metric, RegisteredMetric):
+            raise TypeError("RegisteredMetric object is expected")
+        if reg_metric.ref_entity is not self.ref_entity:
+            raise ValueError("Sink must be a registration of the same metric")
+        if reg_metric is self or reg_metric.flag_alive:
+            raise ValueError("Sink must not be collecting itself")
+        reg_metric.flag_alive = self.flag_alive
+        if self.flag_alive:
+            reg_metric._apply_buffer_capacity()
+        self.sinks.append(reg_metric)
+
+    def _apply_buffer_capacity(self):
+        """
+        Bound the buffer of the metric with metric_buffer_capacity of
+        liota.conf, unless the metric sets its own capacity.  The overflow
+        policy is the metric's one already.
+        :return:
+        """
+        if self.ref_entity.buffer_capacity is None:
+            self.values.capacity = metric_handler.metric_buffer_capacity
+
+    def reschedule(self, interval):
+        """
+        Change sampling interval of the metric at runtime, without stopping
+        and re-registering it.  Its pending event is moved accordingly.
+        :param interval: new sampling interval in seconds
+        :return:
+        """
+        if not (isinstance(interval, int) or isinstance(interval, float)):
+            raise TypeError("interval must be a number")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        if self.flag_alive and metric_handler.event_ds is not None:
+            metric_handler.event_ds.reschedule(self, interval)
+        else:
+            self.set_interval(interval)
+        log.info("Metric %s is rescheduled with interval %s" %
+                 (str(self.ref_entity.name), str(interval)))
+
+    def set_interval(self, interval, scheduled=False):
+        """
+        Set sampling interval of the metric.  Called by events data
+        structure with its lock held.
+        :param interval: new sampling interval in seconds
+        :param scheduled: whether the metric is waiting for its next run,
+                in which case its next run time is shifted by the change
+        :return:
+        """
+        if scheduled and self._next_run_time is not None:
+            shift = long((interval - self.ref_entity.interval) * 1000)
+            self._next_run_time = self._next_run_time + shift
+            if self._scheduled_time is not None:
+                self._scheduled_time = self._scheduled_time + shift
+        self.ref_entity.interval = interval
+
     def add_collected_data(self, collected_data):
         """
-        For the metric, add collected data into values queue.
+        For the metric, add collected data into values buffer.
         :param collected_data: collected data which may be in the format
                 of list, tuple, and single sampled value
         :return: the length of added data
         """
         if isinstance(collected_data, list):
-            for data_sample in collected_data:
-                self.values.put(data_sample)
+            self.values.extend(collected_data)
             return len(collected_data)
         elif isinstance(collected_data, tuple):
             self.values.put(collected_data)
@@ -96,6 +204,64 @@ class RegisteredMetric(RegisteredEntity):
             self.values.put((getUTCmillis(), collected_data))
             return 1
 
+    def get_phase_offset(self):
+        """
+        Get offset in milliseconds, within the interval, at which the metric
+        is scheduled when phase spreading is enabled.  It is derived from the
+        metric UUID, so it stays the same across restarts.
+        :return: phase offset
+        """
+        digest = hashlib.md5(str(self.ref_entity.entity_id)).hexdigest()
+        return int(digest[:8], 16) % long(self.ref_entity.interval * 1000)
+
+    def get_phase(self):
+        """
+        Get offset in milliseconds, within the interval, of the tick the
+        metric is scheduled at.
+        :return: phase
+        """
+        scheduled_time = self._scheduled_time
+        if scheduled_time is None:
+            scheduled_time = self._next_run_time
+        return scheduled_time % long(self.ref_entity.interval * 1000)
+
+    def _get_jitter(self):
+        """
+        Get random delay, bounded by max_jitter_ms and the interval, of the
+        next run.
+        :return: delay in milliseconds
+        """
+        max_jitter = min(metric_handler.max_jitter_ms,
+                         long(self.ref_entity.interval * 1000) - 1)
+        if max_jitter <= 0:
+            return 0
+        return random.randint(0, max_jitter)
+
+    def get_collection_timeout(self):
+        """
+        Get deadline of a collection of the metric.
+        :return: deadline in seconds, 0 for none
+        """
+        if self.ref_entity.collection_timeout is not None:
+            return self.ref_entity.collection_timeout
+        return metric_handler.collect_timeout_s
+
+    def quarantine(self):
+        """
+        Quarantine the metric after a hung collection: its next run is
+        backed off exponentially, by interval * 2^(hung collections in a
+        row), up to quarantine_max_backoff_s.
+        :return:
+        """
+        self.quarantine_count += 1
+        backoff = min(self.ref_entity.interval * (2 ** self.quarantine_count),
+                      max(metric_handler.quarantine_max_backoff_s,
+                          self.ref_entity.interval))
+        self._scheduled_time = self._next_run_time = \
+            getUTCmillis() + long(backoff * 1000)
+        log.warning("Metric %s is quarantined for %ss" %
+                    (str(self.ref_entity.name), str(backoff)))
+
     def get_next_run_time(self):
         """
         Get next run time for the metric.
@@ -105,23 +271,62 @@ class RegisteredMetric(RegisteredEntity):
 
     def set_next_run_time(self):
         """
-        Set next run time for the metric.
+        Set next run time for the metric, to the next tick of its interval.
+        If that tick is already due (the run overran its interval, or the
+        collection pool is saturated), the overrun is counted and the
+        metric's overrun policy applies:
+            - skip: drop missed ticks and wait for the next future one
+            - catch_up: run once right away for all the missed ticks
+            - burst: run missed ticks back-to-back, at most max_burst of
+              them, then skip the rest
         :return:
         """
-        self._next_run_time = self._next_run_time + \
-            (self.ref_entity.interval * 1000)
+        interval = self.ref_entity.interval * 1000
+        if self._scheduled_time is None:
+            self._scheduled_time = self._next_run_time
+        target = self._scheduled_time + interval
+        now = getUTCmillis()
+        if target > now:
+            self._burst_size = 0
+            self._scheduled_time = target
+            self._next_run_time = target + self._get_jitter()
+        else:
+            self.overrun_count += 1
+            # ticks which are due, target included
+            missed = long((now - target) // interval) + 1
+            policy = self.ref_entity.overrun_policy
+            if policy == "burst" and self._burst_size < self.ref_entity.max_burst:
+                self._burst_size += 1
+                self._scheduled_time = self._next_run_time = target
+            elif policy == "catch_up":
+                self.skipped_ticks += missed - 1
+                self._scheduled_time = target + (missed - 1) * interval
+                self._next_run_time = now
+            else:
+                self._burst_size = 0
+                self.skipped_ticks += missed
+                self._scheduled_time = target + missed * interval
+                self._next_run_time = self._scheduled_time + self._get_jitter()
+            log.debug("Metric %s overran its interval, %d tick(s) due" %
+                      (str(self.ref_entity.name), missed))
         log.debug("Set next run time to:" + str(self._next_run_time))
 
     def is_ready_to_send(self):
         """
-        Check whether the metric is ready to send its collected data or not.
+        Check whether the metric is ready to send its collected data or not:
+        either aggregation size is reached, or the oldest sample not sent yet
+        is older than max batch latency.
         :return: True or False
         """
         log.debug("self.current_aggregation_size:" +
                   str(self.current_aggregation_size))
         log.debug("self.aggregation_size:" +
                   str(self.ref_entity.aggregation_size))
-        return self.current_aggregation_size >= self.ref_entity.aggregation_size
+        if self.current_aggregation_size >= self.ref_entity.aggregation_size:
+            return True
+        max_batch_latency = self.ref_entity.max_batch_latency
+        return bool(max_batch_latency) and self._batch_start_time is not None \
+            and getUTCmillis() - self._batch_start_time >= max_batch_latency * 1000
 
     def collect(self):
         """
@@ -132,18 +337,85 @@ class RegisteredMetric(RegisteredEntity):
         """
         log.debug("Collecting values for the resource {0} ".format(
             self.ref_entity.name))
+        if not metric_handler.metric_stats_enabled:
+            self.add_sample(self.call_sampling_function())
+            return
+        self.record_schedule_lag()
+        started = time.time()
+        cpu_started = getThreadCPUMillis()
+        collected_data = self.call_sampling_function()
+        self.stats.sampling_wall.record((time.time() - started) * 1000)
+        if cpu_started is not None:
+            self.stats.sampling_cpu.record(getThreadCPUMillis() - cpu_started)
+        self.add_sample(collected_data)
+
+    def record_schedule_lag(self):
+        """
+        Record how late the collection starting now is.
+        :return:
+        """
+        self.stats.schedule_lag.record(
+            max(getUTCmillis() - self._next_run_time, 0))
+
+    def record_send(self, started, ended, succeeded):
+        """
+        Record time the metric waited in send queue, and publish latency.
+        :param started: time, in seconds, publishing started
+        :param ended: time, in seconds, publishing ended
+        :param succeeded: whether publishing succeeded
+        :return:
+        """
+        if self.stats.send_queued_at is not None:
+            self.stats.send_queue.record(
+                (started - self.stats.send_queued_at) * 1000)
+            self.stats.send_queued_at = None
+        self.stats.publish.record((ended - started) * 1000)
+        if not succeeded:
+            self.stats.num_publish_failed += 1
+
+    def call_sampling_function(self):
+        """
+        Call the metric's sampling function.  For a coroutine sampling
+        function, the returned value is a coroutine object that has to be
+        run by an event loop, and its result passed to add_sample().
+        :return: value returned by the sampling function
+        """
+        return self.ref_entity.sampling_function(*self.get_sampling_args())
+
+    def get_sampling_args(self):
+        """
+        Get the arguments to call the metric's sampling function with.
+        :return: tuple of arguments
+        """
         self.args_required = len(inspect.getargspec(
             self.ref_entity.sampling_function)[0])
         if self.args_required is not 0:
-            self.collected_data = self.ref_entity.sampling_function(1)
+            return (1,)
         else:
-            self.collected_data = self.ref_entity.sampling_function()
+            return ()
+
+    def add_sample(self, collected_data):
+        """
+        Add data returned by the sampling function into data queue, and
+        update current aggregation size.
+        :param collected_data: value returned by the sampling function
+        :return:
+        """
+        if self.sinks and collected_data is not None \
+                and not isinstance(collected_data, (list, tuple)):
+            # timestamp once, so that every sink gets the same sample
+            collected_data = (getUTCmillis(), collected_data)
+        for sink in self.sinks:
+            sink.add_sample(collected_data)
+        self.collected_data = collected_data
         log.debug("Size of the queue {0}".format(self.values.qsize()))
         #  Sampling function might return 'None' because of filtering
         if self.collected_data is not None:
             log.info("{0} Sample Value: {1}".format(
                 self.ref_entity.name, self.collected_data))
             no_of_values_added = self.add_collected_data(self.collected_data)
+            if no_of_values_added and self._batch_start_time is None:
+                self._batch_start_time = getUTCmillis()
             self.current_aggregation_size = self.current_aggregation_size + no_of_values_added
 
     def reset_aggregation_size(self):
@@ -152,21 +424,29 @@ class RegisteredMetric(RegisteredEntity):
         :return:
         """
         self.current_aggregation_size = 0
+        self._batch_start_time = None
 
     def send_data(self):
         """
         Send the metric's collected data out.
-        :return:
+        :return: False if publishing failed, otherwise True
         """
         log.info("Publishing values for the resource {0} ".format(
             self.ref_entity.name))
         if self.values.qsize() == 0:
             # No values measured since last report_data
+            self.stats.send_queued_at = None
             return True
+        started = time.time()
+        succeeded = True
         try:
             self.ref_dcc.publish(self)
         except Exception:
             log.error("Exception while publishing message", exc_info=True)
+            succeeded = False
+        if metric_handler.metric_stats_enabled:
+            self.record_send(started, time.time(), succeeded)
+        return succeeded
 
     def __str__(self, *args, **kwargs):
         return str(self.ref_entity.name) + ":" + str(self._next_run_time)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import json
+import logging
+import re
+from Queue import Queue, Full
+from threading import Thread
+
+log = logging.getLogger(__name__)
+
+_TRANSACTION_ID = re.compile(r'\s*\{\s*"transactionID"\s*:\s*(-?\d+)\s*[,}]')
+
+
+def peek_transaction_id(msg):
+    """
+    Extract the transaction ID of a JSON object message without decoding it,
+    provided it is the first member of the object.  Anchoring on the first
+    member keeps a "transactionID" nested in the message from matching.
+
+    :param msg: JSON message string
+    :return: transaction ID, or None if it is not an integer or not the
+             first member of the message
+    """
+    match = _TRANSACTION_ID.match(msg)
+    if match is not None:
+        return int(match.group(1))
+    return None
+
+
+class LazyMessage(object):
+    """
+    Read-only mapping over a JSON object message, decoded on first access,
+    so that routing a message does not pay for decoding it and the thread
+    consuming it does.
+    """
+
+    def __init__(self, msg):
+        """
+        :param msg: JSON message string
+        """
+        self.raw = msg
+        self._decoded = None
+
+    def decoded(self):
+        """
+        :return: dict decoded from the message
+        :raise: ValueError if the message is not valid JSON
+        """
+        if self._decoded is None:
+            self._decoded = json.loads(self.raw)
+        return self._decoded
+
+    def transaction_id(self):
+        """
+        Transaction ID of the message, peeked when it comes first in the
+        message and decoded otherwise.
+
+        :return: transaction ID, or None if it is not an integer or the
+                 message is no JSON object carrying one
+        """
+        transaction_id = peek_transaction_id(self.raw)
+        if transaction_id is None:
+            try:
+                decoded = self.decoded()
+            except ValueError:
+                return None
+            if isinstance(decoded, dict):
+                transaction_id = decoded.get("transactionID")
+            if isinstance(transaction_id, bool) or not isinstance(transaction_id, (int, long)):
+                return None
+        return transaction_id
+
+    def __getitem__(self, key):
+        return self.decoded()[key]
+
+    def __contains__(self, key):
+        return key in self.decoded()
+
+    def __iter__(self):
+        return iter(self.decoded())
+
+    def __len__(self):
+        return len(self.decoded())
+
+    def get(self, key, default=None):
+        return self.decoded().get(key, default)
+
+    def keys(self):
+        return self.decoded().keys()
+
+    def items(self):
+        return self.decoded().items()
+
+    def __repr__(self):
+        return "LazyMessage(%r)" % self.raw
+
+
+class WorkerPool(object):
+    """
+    Fixed set of daemon threads running submitted functions from a bounded
+    queue.  submit() never blocks: when the queue is full the function is
+    dropped, so that a burst of work cannot stall the submitting thread.
+    """
+
+    def __init__(self, size=4, queue_size=1024, name="WorkerPool"):
+        """
+        :param size: number of worker threads
+        :param queue_size: max number of functions waiting for a worker
+        :param name: prefix of the names of the worker threads
+        """
+        self.name = name
+        self._queue = Queue(queue_size)
+        self.num_dropped = 0
+        for i in range(max(1, size)):
+            thread = Thread(target=self._run, name="%s-%d" % (name, i))
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, function, *args):
+        """
+        :param function: function to run in a worker thread
+        :param args: arguments of function
+        :return: False if the queue is full and function was dropped
+        """
+        try:
+            self._queue.put_nowait((function, args))
+            return True
+        except Full:
+            self.num_dropped += 1
+            return False
+
+    def pending(self):
+        """
+        :return: number of functions waiting for a worker
+        """
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            function, args = self._queue.get()
+            try:
+                function(*args)
+            except Exception:
+                log.exception("Exception in worker of %s", self.name)
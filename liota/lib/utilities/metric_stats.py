@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+from bisect import bisect_left
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram of durations in milliseconds.  Recording a value
+    is a bisect over a short tuple and a few additions, cheap enough to be
+    left on in production.  Updates are not locked: a concurrent update may
+    rarely be lost, which is fine for statistics.
+    """
+
+    # upper bounds of buckets, in milliseconds; last bucket is unbounded
+    BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+              1000, 2500, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """
+        Record a duration.
+        :param value: duration in milliseconds
+        :return:
+        """
+        self.counts[bisect_left(Histogram.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def mean(self):
+        """
+        :return: mean of recorded durations, 0 if none was recorded
+        """
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def percentile(self, p):
+        """
+        Get upper bound of the bucket holding the p-th percentile.
+        :param p: percentile, between 0 and 100
+        :return: duration in milliseconds (max recorded duration for the
+                unbounded bucket), 0 if none was recorded
+        """
+        if self.count == 0:
+            return 0.0
+        rank = self.count * p / 100.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                if i < len(Histogram.BOUNDS):
+                    return min(Histogram.BOUNDS[i], self.max)
+                return self.max
+        return self.max
+
+    def get_stats(self):
+        """
+        :return: [count, mean, p50, p99, max]
+        """
+        return [self.count, self.mean(), self.percentile(50),
+                self.percentile(99), self.max]
+
+
+class MetricStats(object):
+    """
+    Latency and cost statistics of a registered metric:
+        - schedule_lag: how late collection started after its run time
+        - sampling_wall: wall time of the sampling function
+        - sampling_cpu: CPU time of the sampling function (thread
+          collection only)
+        - send_queue: time waiting in send queue
+        - publish: latency of publishing to the DCC
+    """
+
+    HISTOGRAMS = ("schedule_lag", "sampling_wall", "sampling_cpu",
+                  "send_queue", "publish")
+
+    def __init__(self):
+        for name in MetricStats.HISTOGRAMS:
+            setattr(self, name, Histogram())
+        self.num_publish_failed = 0
+        # time, in seconds, the metric was put into send queue
+        self.send_queued_at = None
+
+    def get_histogram(self, name):
+        """
+        :param name: one of HISTOGRAMS
+        :return: Histogram
+        """
+        if name not in MetricStats.HISTOGRAMS:
+            raise ValueError("Unknown metric statistics: %s" % name)
+        return getattr(self, name)
+
+    def get_stats(self):
+        """
+        :return: dict of histogram name: Histogram.get_stats()
+        """
+        return dict((name, getattr(self, name).get_stats())
+                    for name in MetricStats.HISTOGRAMS)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import heapq
+import itertools
+import logging
+from Queue import Queue
+from threading import Condition, Lock, Thread
+from time import time as _time
+
+log = logging.getLogger(__name__)
+
+# Stale deadlines of completed requests tolerated before the heap is compacted
+_MIN_COMPACTED_DEADLINES = 64
+
+
+class RequestTimeout(Exception):
+    """
+    Raised by Future.result() when no response arrived before the deadline
+    of the request.
+    """
+    pass
+
+
+class RequestCancelled(Exception):
+    """
+    Raised by Future.result() when the request was cancelled.
+    """
+    pass
+
+
+class Future(object):
+    """
+    Result of an asynchronous request, set once.
+
+    Callbacks added with add_done_callback() and functions chained with
+    then() run in the executor given at init (a function called with a
+    function), or in the completing thread if none.
+    """
+
+    def __init__(self, executor=None, on_cancel=None):
+        """
+        :param executor: function running a function, None to run inline
+        :param on_cancel: function called with this future when cancelled
+        """
+        self._cond = Condition(Lock())
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+        self._executor = executor
+        self._on_cancel = on_cancel
+
+    @staticmethod
+    def completed(result):
+        """
+        :param result: result of the future
+        :return: Future already set to result
+        """
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def done(self):
+        return self._done
+
+    def cancelled(self):
+        return isinstance(self._exception, RequestCancelled)
+
+    def cancel(self):
+        """
+        Cancel the request if it is still pending.
+
+        :return: True if cancelled
+        """
+        if not self.set_exception(RequestCancelled()):
+            return False
+        if self._on_cancel is not None:
+            self._on_cancel(self)
+        return True
+
+    def result(self, timeout=None):
+        """
+        Wait for the result.
+
+        :param timeout: max time in seconds to wait, None to wait until done
+        :return: result of the request
+        :raise: exception of the request, or RequestTimeout if timeout expired
+        """
+        with self._cond:
+            if not self._done:
+                if timeout is None:
+                    while not self._done:
+                        self._cond.wait()
+                else:
+                    deadline = _time() + timeout
+                    while not self._done and deadline > _time():
+                        self._cond.wait(deadline - _time())
+                    if not self._done:
+                        raise RequestTimeout()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """
+        :return: exception of the request once done, None otherwise
+        """
+        return self._exception
+
+    def set_result(self, result):
+        """
+        :return: False if the future was already done
+        """
+        return self._set(result, None)
+
+    def set_exception(self, exception):
+        """
+        :return: False if the future was already done
+        """
+        return self._set(None, exception)
+
+    def _set(self, result, exception):
+        with self._cond:
+            if self._done:
+                return False
+            self._result = result
+            self._exception = exception
+            self._done = True
+            self._cond.notify_all()
+            callbacks, self._callbacks = self._callbacks, None
+        for callback in callbacks:
+            self._run(callback)
+        return True
+
+    def _run(self, callback):
+        if self._executor is None:
+            self._call(callback)
+        else:
+            self._executor(lambda: self._call(callback))
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            log.exception("Exception in future callback")
+
+    def add_done_callback(self, callback):
+        """
+        :param callback: function called with this future once done
+        :return:
+        """
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(callback)
+                return
+        self._run(callback)
+
+    def then(self, function):
+        """
+        Chain a function of the result.
+
+        :param function: function called with the result of this future
+        :return: Future of the value returned by function, or of the
+                 exception of this future or of function
+        """
+        chained = Future(self._executor, lambda f: self.cancel())
+
+        def on_done(future):
+            if chained.done():
+                return
+            if future.exception() is not None:
+                chained.set_exception(future.exception())
+                return
+            try:
+                chained.set_result(function(future.result()))
+            except Exception as ex:
+                chained.set_exception(ex)
+
+        self.add_done_callback(on_done)
+        return chained
+
+
+class RequestMultiplexer(object):
+    """
+    Matches responses to outstanding requests by transaction ID.
+
+    submit() sends a request and returns a Future of its response, so that
+    many requests can be in flight without holding a thread each.  A request
+    fails with RequestTimeout at its deadline, and at most max_outstanding
+    requests are in flight: submit() blocks while the limit is reached.
+    Callbacks of futures run in one callback thread, never in the thread
+    dispatching responses, so they may wait for other responses.
+    """
+
+    def __init__(self, send, max_outstanding=256, timeout=600, name="RequestMultiplexer"):
+        """
+        :param send: function sending a request message
+        :param max_outstanding: max number of requests awaiting a response
+        :param timeout: default time in seconds to wait for a response
+        :param name: prefix of the names of the multiplexer threads
+        """
+        self._send = send
+        self._max_outstanding = max_outstanding
+        self._timeout = timeout
+        self._cond = Condition(Lock())
+        self._pending = {}
+        # heap of (deadline, sequence number, transaction ID, future), with stale entries of completed requests
+        # left until popped or compacted
+        self._deadlines = []
+        self._seq = itertools.count()
+        self._callbacks = Queue()
+        self.num_timeouts = 0
+        self.num_cancelled = 0
+        for target, suffix in ((self._expire_loop, "Deadlines"), (self._callback_loop, "Callbacks")):
+            thread = Thread(target=target, name=name + suffix)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, transaction_id, message, accept=None, timeout=None):
+        """
+        Send a request.
+
+        :param transaction_id: ID the response to the request will carry
+        :param message: request message
+        :param accept: function called with a response, returning False if
+                the request must keep waiting for a later response
+        :param timeout: time in seconds to wait for a response, None for the
+                default
+        :return: Future of the response
+        """
+        deadline = _time() + (self._timeout if timeout is None else timeout)
+        future = Future(self._callbacks.put, lambda f: self._forget(transaction_id, f))
+        with self._cond:
+            while len(self._pending) >= self._max_outstanding:
+                if _time() >= deadline:
+                    raise RequestTimeout("Too many outstanding requests")
+                self._cond.wait(deadline - _time())
+            self._pending[transaction_id] = (future, accept)
+            if not self._deadlines or deadline < self._deadlines[0][0]:
+                self._cond.notify_all()
+            heapq.heappush(self._deadlines, (deadline, next(self._seq), transaction_id, future))
+        try:
+            self._send(message)
+        except Exception as ex:
+            self._forget(transaction_id, future)
+            future.set_exception(ex)
+        return future
+
+    def dispatch(self, transaction_id, response):
+        """
+        Complete the request a response belongs to.
+
+        :param transaction_id: transaction ID of the response
+        :param response: response message
+        :return: False if no request awaits the response
+        """
+        with self._cond:
+            entry = self._pending.get(transaction_id)
+            if entry is None:
+                return False
+            future, accept = entry
+            if accept is not None and not accept(response):
+                return True
+            self._remove(transaction_id, future)
+        future.set_result(response)
+        return True
+
+    def outstanding(self):
+        """
+        :return: number of requests awaiting a response
+        """
+        return len(self._pending)
+
+    def _remove(self, transaction_id, future):
+        # Caller must hold _cond
+        if self._pending.get(transaction_id, (None,))[0] is future:
+            del self._pending[transaction_id]
+            self._cond.notify_all()
+            # every pending request has one deadline, the other deadlines are stale
+            if len(self._deadlines) > 2 * len(self._pending) + _MIN_COMPACTED_DEADLINES:
+                self._deadlines = [entry for entry in self._deadlines if self._is_pending(entry)]
+                heapq.heapify(self._deadlines)
+
+    def _is_pending(self, entry):
+        # Caller must hold _cond
+        return self._pending.get(entry[2], (None,))[0] is entry[3]
+
+    def _forget(self, transaction_id, future):
+        with self._cond:
+            self._remove(transaction_id, future)
+        if future.cancelled():
+            self.num_cancelled += 1
+
+    def _expire_loop(self):
+        while True:
+            expired = []
+            with self._cond:
+                now = _time()
+                while self._deadlines and (self._deadlines[0][0] <= now or not self._is_pending(self._deadlines[0])):
+                    entry = heapq.heappop(self._deadlines)
+                    if self._is_pending(entry):
+                        self._remove(entry[2], entry[3])
+                        expired.append(entry[3])
+                if not expired:
+                    self._cond.wait(self._deadlines[0][0] - now if self._deadlines else None)
+            for future in expired:
+                if future.set_exception(RequestTimeout()):
+                    self.num_timeouts += 1
+
+    def _callback_loop(self):
+        while True:
+            callback = self._callbacks.get()
+            try:
+                callback()
+            except Exception:
+                log.exception("Exception in request callback")
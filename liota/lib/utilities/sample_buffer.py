@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+from array import array
+from Queue import Empty
+from threading import Lock
+import logging
+import sys
+
+log = logging.getLogger(__name__)
+
+
+# Millisecond epoch timestamps overflow a 32-bit C long: store them as
+# doubles (exact up to 2**53) where array('l') is 32-bit
+_TIMESTAMP_TYPECODE = 'l' if array('l').itemsize >= 8 else 'd'
+
+
+class SampleBuffer(object):
+    """
+    Bounded buffer of the (timestamp, value) samples of a metric.
+
+    Samples are kept in two parallel columns: timestamps in an array('l')
+    (array('d') where a C long is 32-bit) and values in an array('l') or array('d') while every value is an int
+    or a float respectively (a plain list otherwise), which takes a fraction
+    of the memory of a queue of tuples.  Once capacity is reached, samples
+    are dropped according to the overflow policy:
+        - drop_oldest: overwrite the oldest sample (ring buffer)
+        - drop_newest: discard the new sample
+        - downsample: keep every other sample, halving the resolution of
+          the buffered period
+    """
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    DOWNSAMPLE = "downsample"
+    OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DOWNSAMPLE)
+
+    def __init__(self, capacity=0, overflow_policy=DROP_OLDEST):
+        """
+        :param capacity: max number of samples, 0 for unbounded
+        :param overflow_policy: one of OVERFLOW_POLICIES
+        """
+        if not isinstance(capacity, int) or capacity < 0:
+            raise TypeError("capacity must be a non negative int")
+        if overflow_policy not in SampleBuffer.OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of %s"
+                             % str(SampleBuffer.OVERFLOW_POLICIES))
+        self.capacity = capacity
+        self.overflow_policy = overflow_policy
+        self.num_dropped = 0
+        self._lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self._timestamps = array(_TIMESTAMP_TYPECODE)
+        self._values = None
+        # index of the oldest sample once the ring buffer has wrapped
+        self._head = 0
+
+    @staticmethod
+    def _new_column(value):
+        if type(value) in (int, long) and -sys.maxint - 1 <= value <= sys.maxint:
+            return array('l')
+        if type(value) is float:
+            return array('d')
+        return []
+
+    def _fits(self, value):
+        values = self._values
+        if isinstance(values, list):
+            return True
+        if values.typecode == 'l':
+            return type(value) in (int, long) and \
+                -sys.maxint - 1 <= value <= sys.maxint
+        return type(value) is float
+
+    def _linearize(self):
+        if self._head:
+            self._timestamps = self._timestamps[self._head:] + \
+                self._timestamps[:self._head]
+            self._values = self._values[self._head:] + \
+                self._values[:self._head]
+            self._head = 0
+
+    def _append(self, timestamp, value):
+        if self._values is None:
+            self._values = self._new_column(value)
+        elif not self._fits(value):
+            # keep values exact: no int to float promotion
+            self._values = list(self._values)
+        size = len(self._timestamps)
+        if self.capacity and size >= self.capacity:
+            self.num_dropped += 1
+            if self.overflow_policy == SampleBuffer.DROP_NEWEST:
+                return
+            if self.overflow_policy == SampleBuffer.DROP_OLDEST:
+                self._timestamps[self._head] = int(timestamp)
+                self._values[self._head] = value
+                self._head = (self._head + 1) % size
+                return
+            self._linearize()
+            self._timestamps = self._timestamps[1::2]
+            self._values = self._values[1::2]
+            self.num_dropped += size - len(self._timestamps) - 1
+        self._timestamps.append(int(timestamp))
+        self._values.append(value)
+
+    def put(self, sample):
+        """
+        Add a sample.
+        :param sample: (timestamp, value) pair
+        :return:
+        """
+        with self._lock:
+            self._append(sample[0], sample[1])
+
+    def extend(self, samples):
+        """
+        Add several samples at once.
+        :param samples: list of (timestamp, value) pairs
+        :return:
+        """
+        with self._lock:
+            for sample in samples:
+                self._append(sample[0], sample[1])
+
+    def qsize(self):
+        """
+        Get the number of buffered samples.
+        :return: number of samples
+        """
+        return len(self._timestamps)
+
+    def get(self, block=True, timeout=None):
+        """
+        Pop the oldest sample, for compatibility with Queue consumers.
+        Prefer drain(), which takes every sample in one call.
+        :return: (timestamp, value) pair
+        """
+        with self._lock:
+            if not self._timestamps:
+                raise Empty
+            self._linearize()
+            sample = (long(self._timestamps.pop(0)), self._values.pop(0))
+            return sample
+
+    def drain(self):
+        """
+        Take every buffered sample, oldest first.
+        :return: (timestamps, values) columns, as arrays (timestamps are a
+                list of longs where a C long is 32-bit, values may also be
+                a list if they are not all ints or all floats)
+        """
+        with self._lock:
+            self._linearize()
+            timestamps = self._timestamps
+            values = self._values if self._values is not None else array('d')
+            self._reset()
+            if timestamps.typecode != 'l':
+                timestamps = [long(ts) for ts in timestamps]
+            return timestamps, values
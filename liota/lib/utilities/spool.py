@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import logging
+import mmap
+import os
+import pickle
+import struct
+import zlib
+from threading import Condition, Lock, Thread
+from time import time as _time, sleep as _sleep
+
+from liota.lib.utilities.utility import mkdir
+
+log = logging.getLogger(__name__)
+
+
+class SegmentSpool(object):
+    """
+    Append-only on-disk spool of messages, for store-and-forward of
+    messages which could not be published.
+
+    Records are appended to memory-mapped segment files preallocated to
+    segment_size, and synced to disk every fsync_interval_ms or every
+    fsync_batch records rather than on each append.  A record is a header
+    (payload length, crc32) followed by the payload; a zero length marks the
+    end of a segment, and a record with bad crc (torn by a crash) too.
+    Records are read in order by a single consumer: get() returns the oldest
+    record until commit() is called.  The read position is persisted along
+    with syncs, so after a crash some records may be replayed twice.
+    When the spool grows beyond max_size, oldest segments are dropped.
+    """
+
+    HEADER = struct.Struct('<II')
+    SEGMENT_SUFFIX = ".seg"
+    CURSOR_FILE = "cursor"
+
+    def __init__(self, directory, segment_size=4194304, max_size=67108864,
+                 fsync_interval_ms=1000, fsync_batch=100):
+        """
+        :param directory: directory of segment files, created if needed
+        :param segment_size: size in bytes of a segment file
+        :param max_size: max size in bytes of all segment files
+        :param fsync_interval_ms: max time appended records stay unsynced
+        :param fsync_batch: max number of unsynced appended records
+        """
+        if segment_size <= SegmentSpool.HEADER.size or max_size < segment_size:
+            raise ValueError("Invalid spool segment size or max size")
+        mkdir(directory)
+        self.directory = directory
+        self._segment_size = segment_size
+        self._max_size = max_size
+        self._fsync_interval = fsync_interval_ms / 1000.0
+        self._fsync_batch = fsync_batch
+        self._lock = Lock()
+        self._not_empty = Condition(self._lock)
+        self.num_appended = 0
+        self.num_committed = 0
+        self.num_dropped_segments = 0
+        self._unsynced = 0
+        self._last_sync = _time()
+        self._cursor_dirty = False
+        self._read_mm = None
+        self._read_mm_seq = None
+        self._pending = None
+
+        # segment sequence number: file size
+        self._segments = {}
+        for name in os.listdir(directory):
+            if name.endswith(SegmentSpool.SEGMENT_SUFFIX):
+                seq = int(name[:-len(SegmentSpool.SEGMENT_SUFFIX)])
+                self._segments[seq] = os.path.getsize(self._path(seq))
+        self._read_seq, self._read_offset = self._load_cursor()
+        if self._segments:
+            seq = max(self._segments)
+            self._open_writer(seq, self._scan_end(seq))
+        else:
+            self._open_writer(0, 0)
+        if self._read_seq not in self._segments:
+            self._read_seq, self._read_offset = min(self._segments), 0
+
+    def _path(self, seq):
+        return os.path.join(self.directory,
+                            "%020d%s" % (seq, SegmentSpool.SEGMENT_SUFFIX))
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, SegmentSpool.CURSOR_FILE)) as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (IOError, ValueError):
+            return -1, 0
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, SegmentSpool.CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write("%d %d" % (self._read_seq, self._read_offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(path + ".tmp", path)
+        self._cursor_dirty = False
+
+    @staticmethod
+    def _read_record(mm, offset):
+        """
+        :return: payload of the record at offset, or None at end of segment
+        """
+        header_end = offset + SegmentSpool.HEADER.size
+        if header_end > len(mm):
+            return None
+        length, crc = SegmentSpool.HEADER.unpack(mm[offset:header_end])
+        if length == 0 or header_end + length > len(mm):
+            return None
+        payload = mm[header_end:header_end + length]
+        if zlib.crc32(payload) & 0xffffffff != crc:
+            return None
+        return payload
+
+    def _scan_end(self, seq):
+        """
+        Find the end of valid records of a segment, after a restart.
+        """
+        with open(self._path(seq), "rb") as f:
+            if self._segments[seq] == 0:
+                return 0
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                offset = 0
+                while True:
+                    payload = self._read_record(mm, offset)
+                    if payload is None:
+                        return offset
+                    offset += SegmentSpool.HEADER.size + len(payload)
+            finally:
+                mm.close()
+
+    def _open_writer(self, seq, offset, min_size=0):
+        size = max(self._segments.get(seq, 0), self._segment_size, min_size)
+        f = open(self._path(seq), "r+b" if seq in self._segments else "w+b")
+        try:
+            f.truncate(size)
+            self._write_mm = mmap.mmap(f.fileno(), size)
+        finally:
+            f.close()
+        self._segments[seq] = size
+        self._write_seq = seq
+        self._write_offset = offset
+
+    def _roll(self, record_size):
+        self._write_mm.flush()
+        self._write_mm.close()
+        self._open_writer(self._write_seq + 1, 0,
+                          record_size + SegmentSpool.HEADER.size)
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        while sum(self._segments.values()) > self._max_size \
+                and len(self._segments) > 1:
+            seq = min(self._segments)
+            if seq == self._read_seq:
+                self._read_seq, self._read_offset = \
+                    min(s for s in self._segments if s > seq), 0
+                self._pending = None
+                self._cursor_dirty = True
+            self._remove_segment(seq)
+            self.num_dropped_segments += 1
+            log.warning("Spool %s is full, dropped oldest segment"
+                        % self.directory)
+
+    def _remove_segment(self, seq):
+        if self._read_mm_seq == seq:
+            self._read_mm.close()
+            self._read_mm = self._read_mm_seq = None
+        del self._segments[seq]
+        try:
+            os.remove(self._path(seq))
+        except OSError:
+            log.error("Could not remove spool segment %d" % seq)
+
+    def _reader_mm(self):
+        if self._read_seq == self._write_seq:
+            return self._write_mm
+        if self._read_mm_seq != self._read_seq:
+            if self._read_mm is not None:
+                self._read_mm.close()
+            with open(self._path(self._read_seq), "rb") as f:
+                self._read_mm = mmap.mmap(f.fileno(), 0,
+                                          access=mmap.ACCESS_READ)
+            self._read_mm_seq = self._read_seq
+        return self._read_mm
+
+    def _sync(self):
+        self._write_mm.flush()
+        if self._cursor_dirty:
+            self._save_cursor()
+        self._unsynced = 0
+        self._last_sync = _time()
+
+    def append(self, payload):
+        """
+        Append a record.
+        :param payload: non-empty string
+        :return:
+        """
+        record_size = SegmentSpool.HEADER.size + len(payload)
+        with self._lock:
+            if self._write_offset + record_size > len(self._write_mm):
+                self._roll(record_size)
+            offset = self._write_offset
+            self._write_mm[offset:offset + record_size] = \
+                SegmentSpool.HEADER.pack(len(payload),
+                                         zlib.crc32(payload) & 0xffffffff) \
+                + payload
+            self._write_offset += record_size
+            self.num_appended += 1
+            self._unsynced += 1
+            if self._unsynced >= self._fsync_batch \
+                    or _time() - self._last_sync >= self._fsync_interval:
+                self._sync()
+            self._not_empty.notify()
+
+    def _has_backlog(self):
+        return self._read_seq != self._write_seq \
+            or self._read_offset < self._write_offset
+
+    def has_backlog(self):
+        """
+        Check whether records are waiting to be read.
+        :return: True or False
+        """
+        with self._lock:
+            return self._has_backlog()
+
+    def get(self, timeout=None):
+        """
+        Get the oldest record not committed yet, waiting for one if needed.
+        :param timeout: max time to wait in seconds, None to wait forever
+        :return: payload, or None on timeout
+        """
+        with self._lock:
+            if not self._has_backlog():
+                self._not_empty.wait(timeout)
+            while self._has_backlog():
+                payload = self._read_record(self._reader_mm(),
+                                            self._read_offset)
+                if payload is not None:
+                    self._pending = (self._read_seq, self._read_offset
+                                     + SegmentSpool.HEADER.size + len(payload))
+                    return payload
+                if self._read_seq == self._write_seq:
+                    return None
+                # end of a sealed segment
+                seq = self._read_seq
+                self._read_seq = min(s for s in self._segments if s > seq)
+                self._read_offset = 0
+                self._remove_segment(seq)
+                self._cursor_dirty = True
+            return None
+
+    def commit(self):
+        """
+        Mark the record returned by last get() as done.
+        :return:
+        """
+        with self._lock:
+            if self._pending is None:
+                return
+            self._read_seq, self._read_offset = self._pending
+            self._pending = None
+            self._cursor_dirty = True
+            self.num_committed += 1
+
+    def sync(self, force=False):
+        """
+        Sync appended records and read position to disk, if the sync
+        interval elapsed or if forced.
+        :return:
+        """
+        with self._lock:
+            if force or (self._unsynced or self._cursor_dirty) and \
+                    _time() - self._last_sync >= self._fsync_interval:
+                self._sync()
+
+    def get_size(self):
+        """
+        :return: size in bytes of segment files
+        """
+        with self._lock:
+            return sum(self._segments.values())
+
+    def get_stats(self):
+        """
+        :return: [appended, committed, dropped segments, size in bytes]
+        """
+        with self._lock:
+            return [self.num_appended, self.num_committed,
+                    self.num_dropped_segments, sum(self._segments.values())]
+
+    def close(self):
+        """
+        Sync and close the spool.
+        :return:
+        """
+        with self._lock:
+            self._sync()
+            self._write_mm.close()
+            if self._read_mm is not None:
+                self._read_mm.close()
+                self._read_mm = self._read_mm_seq = None
+
+
+class SpoolReplayer(Thread):
+    """
+    Replays messages of a SegmentSpool in order, at most rate messages per
+    second, backing off exponentially while sending fails.
+    """
+
+    def __init__(self, spool, send, rate=0, max_backoff_s=60, name=None):
+        """
+        :param spool: SegmentSpool of pickled (message, msg_attr) records
+        :param send: function called with message and msg_attr
+        :param rate: max number of messages replayed per second, 0 for
+                unlimited
+        :param max_backoff_s: max delay in seconds between failed sends
+        """
+        Thread.__init__(self, name=name)
+        self.daemon = True
+        self.flag_alive = True
+        self._spool = spool
+        self._send = send
+        self._interval = 1.0 / rate if rate > 0 else 0
+        self._max_backoff = max_backoff_s
+        self.start()
+
+    def run(self):
+        log.info("Started SpoolReplayer")
+        backoff = 1
+        while self.flag_alive:
+            payload = self._spool.get(timeout=1)
+            if payload is None:
+                self._spool.sync()
+                continue
+            message, msg_attr = pickle.loads(payload)
+            try:
+                self._send(message, msg_attr)
+            except Exception:
+                log.warning("Replay of spooled message failed, retrying in %ss"
+                            % backoff)
+                _sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+                continue
+            backoff = 1
+            self._spool.commit()
+            if self._interval:
+                _sleep(self._interval)
+        log.info("Thread exits: %s" % str(self.name))
@@ -48,6 +48,8 @@ import stat
 import json
 import subprocess
 import time
+import ctypes
+import ctypes.util
 
 log = logging.getLogger(__name__)
 
@@ -163,6 +165,48 @@ def getUTCmillis():
     return long(1000 * ((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds()))
 
 
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+_CLOCK_MONOTONIC = 1
+_CLOCK_THREAD_CPUTIME_ID = 3
+_clock_gettime = None
+try:
+    _clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1',
+                                 use_errno=True).clock_gettime
+    _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+except (OSError, AttributeError):
+    _clock_gettime = None
+
+
+def getMonotonicMillis():
+    """
+    Get monotonic clock time in milliseconds.  Unlike getUTCmillis(), it does
+    not jump when wall clock is adjusted (NTP, manual change), so it is only
+    meaningful for measuring intervals.  Falls back to wall clock if
+    CLOCK_MONOTONIC is not available on this platform.
+    :return: monotonic time in milliseconds
+    """
+    if _clock_gettime is not None:
+        t = _Timespec()
+        if _clock_gettime(_CLOCK_MONOTONIC, ctypes.byref(t)) == 0:
+            return long(t.tv_sec * 1000 + t.tv_nsec // 1000000)
+    return long(time.time() * 1000)
+
+
+def getThreadCPUMillis():
+    """
+    Get CPU time consumed by the calling thread in milliseconds.
+    :return: CPU time in milliseconds, or None if CLOCK_THREAD_CPUTIME_ID is
+            not available on this platform
+    """
+    if _clock_gettime is not None:
+        t = _Timespec()
+        if _clock_gettime(_CLOCK_THREAD_CPUTIME_ID, ctypes.byref(t)) == 0:
+            return t.tv_sec * 1000.0 + t.tv_nsec / 1000000.0
+    return None
+
+
 def mkdir(path):
     """
     Create a directory if it does not exists.
@@ -271,13 +315,17 @@ class LiotaConfigPath:
             log.warn('liota.conf file missing')
 
 
-def read_liota_config(section, name):
+def read_liota_config(section, name, default=None):
     """
     Return the value of name within the specified section.
     :param section: configuration section
     :param name: name of a configuration
+    :param default: value returned if the configuration is absent (e.g. from
+            the liota.conf of an older installation, or if there is no
+            liota.conf), None to raise NoOptionError or NoSectionError
     :return: configuration value
     """
+    value = default
     config = ConfigParser.RawConfigParser()
     fullPath = LiotaConfigPath().get_liota_fullpath()
     if fullPath != '':
@@ -285,6 +333,10 @@ def read_liota_config(section, name):
             if config.read(fullPath) != []:
                 try:
                     value = config.get(section, name)
+                except (ConfigParser.NoOptionError, ConfigParser.NoSectionError):
+                    if default is None:
+                        raise
+                    value = default
                 except ConfigParser.ParsingError as err:
                     log.error('Could not parse log config file' + str(err))
             else:
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import atexit
+import logging
+import os
+from threading import Condition, Lock, Thread
+from time import time as _time
+
+log = logging.getLogger(__name__)
+
+
+class WriteBehindFiles(Thread):
+    """
+    Debounced write-behind of whole files.
+
+    write() records the new content of a file and returns at once; a file
+    is written debounce_ms after its first pending change, so that a burst
+    of changes to it costs one write.  Content is either a string or a
+    callable rendering it at write time, which lets a large document be
+    serialized once per burst rather than once per change.  remove() is
+    scheduled the same way, so it is ordered with writes.  Files are
+    written atomically: to a temporary file which is synced and renamed over
+    the target, so readers never see a partial file.  Pending writes are
+    flushed at interpreter exit.
+    """
+
+    def __init__(self, debounce_ms=200, name="WriteBehindFiles"):
+        """
+        :param debounce_ms: delay in ms between the first pending change of
+                a file and its write
+        :param name: name of the writer thread
+        """
+        Thread.__init__(self, name=name)
+        self.daemon = True
+        self.flag_alive = True
+        self._debounce = debounce_ms / 1000.0
+        self._cond = Condition()
+        self._flush_lock = Lock()
+        self._pending = {}
+        self._first_change = None
+        self.num_changes = 0
+        self.num_writes = 0
+        atexit.register(self.stop)
+        self.start()
+
+    def write(self, path, content):
+        """
+        Schedule writing content to path, replacing any pending content.
+
+        :param path: path of the file
+        :param content: string, or callable returning the string
+        :return:
+        """
+        with self._cond:
+            self._pending[path] = content
+            self.num_changes += 1
+            if self._first_change is None:
+                self._first_change = _time()
+                self._cond.notify()
+
+    def remove(self, path):
+        """
+        Schedule removing the file at path, replacing any pending content.
+
+        :param path: path of the file
+        :return:
+        """
+        self.write(path, None)
+
+    def pending(self, path):
+        """
+        :param path: path of the file
+        :return: True if a write of path is pending
+        """
+        with self._cond:
+            return path in self._pending
+
+    def flush(self):
+        """
+        Write all pending files now, in the calling thread.  Returns once
+        they, and a write in progress in the writer thread, are written.
+
+        :return:
+        """
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+                self._first_change = None
+            for path, content in pending.items():
+                self._write_file(path, content)
+
+    def stop(self):
+        """
+        Write all pending files and stop the writer thread.
+
+        :return:
+        """
+        with self._cond:
+            self.flag_alive = False
+            self._cond.notify()
+        self.join()
+        self.flush()
+
+    def run(self):
+        while self.flag_alive:
+            with self._cond:
+                if self._first_change is None:
+                    self._cond.wait()
+                    continue
+                delay = self._first_change + self._debounce - _time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            self.flush()
+
+    def _write_file(self, path, content):
+        try:
+            if content is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            if callable(content):
+                content = content()
+            if isinstance(content, unicode):
+                content = content.encode('utf-8')
+            with open(path + ".tmp", "w") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(path + ".tmp", path)
+            self.num_writes += 1
+        except Exception:
+            log.exception("Could not write %s" % path)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Compare per-event and batched dispatch from the events priority queue to
+the collect queue when many metrics come due in the same millisecond.
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_batch_dispatch.py
+"""
+
+import sys
+import time
+from Queue import Queue
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.core import metric_handler
+from liota.core.metric_handler import EventsPriorityQueue
+from liota.lib.utilities.utility import getUTCmillis
+
+_clock_calls = [0]
+
+
+def _counting_clock():
+    _clock_calls[0] += 1
+    return getUTCmillis()
+
+
+class BenchMetric(object):
+
+    def __init__(self, next_run_time):
+        self.flag_alive = True
+        self._next_run_time = next_run_time
+
+    def get_next_run_time(self):
+        return self._next_run_time
+
+    def __cmp__(self, other):
+        if not isinstance(other, BenchMetric):
+            return -1
+        return cmp(self._next_run_time, other._next_run_time)
+
+
+def dispatch_one_by_one(event_ds, collect_queue, n):
+    for _ in range(n):
+        collect_queue.put(event_ds.get_next_element_when_ready())
+
+
+def dispatch_batched(event_ds, collect_queue, n, batch_size=8):
+    dispatched = 0
+    while dispatched < n:
+        batch = event_ds.get_ready_elements()
+        for i in range(0, len(batch), batch_size):
+            collect_queue.put(batch[i:i + batch_size])
+        dispatched += len(batch)
+
+
+def run(dispatch, n):
+    event_ds = EventsPriorityQueue()
+    collect_queue = Queue()
+    due = getUTCmillis()
+    event_ds.put_all_and_notify([BenchMetric(due) for _ in range(n)])
+    _clock_calls[0] = 0
+    start = time.time()
+    dispatch(event_ds, collect_queue, n)
+    elapsed = time.time() - start
+    return elapsed, _clock_calls[0], collect_queue.qsize()
+
+
+def main():
+    metric_handler.getUTCmillis = _counting_clock
+    print("%-8s %8s %12s %12s %14s" % ("mode", "metrics", "total ms",
+                                       "clock calls", "queue puts"))
+    for n in (100, 1000, 10000):
+        for name, dispatch in (("single", dispatch_one_by_one),
+                               ("batched", dispatch_batched)):
+            elapsed, clock_calls, puts = run(dispatch, n)
+            print("%-8s %8d %12.2f %12d %14d" % (name, n, elapsed * 1e3,
+                                                 clock_calls, puts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Compare insert/expire cost of the metric_handler scheduler backends.
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_event_scheduler.py
+"""
+
+import random
+import sys
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.core.metric_handler import EventsPriorityQueue, EventsTimerWheel
+from liota.lib.utilities.utility import getUTCmillis
+
+
+class BenchMetric(object):
+
+    def __init__(self, next_run_time):
+        self.flag_alive = True
+        self._next_run_time = next_run_time
+
+    def get_next_run_time(self):
+        return self._next_run_time
+
+    def __cmp__(self, other):
+        if not isinstance(other, BenchMetric):
+            return -1
+        return cmp(self._next_run_time, other._next_run_time)
+
+
+def bench(event_ds, n, spread_ms=1000):
+    now = getUTCmillis()
+    metrics = [BenchMetric(now + random.randint(0, spread_ms))
+               for _ in range(n)]
+    start = time.time()
+    for m in metrics:
+        event_ds.put_and_notify(m)
+    t_insert = time.time() - start
+
+    time.sleep(spread_ms / 1000.0 + 0.05)
+    start = time.time()
+    for _ in range(n):
+        event_ds.get_next_element_when_ready()
+    t_expire = time.time() - start
+    return t_insert, t_expire
+
+
+def main():
+    random.seed(42)
+    print("%-12s %8s %14s %14s" % ("scheduler", "metrics",
+                                   "insert us/op", "expire us/op"))
+    for n in (1000, 10000, 100000):
+        for name, factory in (("heap", EventsPriorityQueue),
+                              ("timer_wheel", lambda: EventsTimerWheel(10))):
+            t_insert, t_expire = bench(factory(), n)
+            print("%-12s %8d %14.2f %14.2f" % (name, n,
+                                               t_insert * 1e6 / n,
+                                               t_expire * 1e6 / n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Measure lines per second published by the Graphite DCC with the plaintext
+and carbon pickle protocols, including writes to a local socket drained by
+a reader thread (standing in for carbon).
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_graphite.py
+"""
+
+import socket
+import sys
+import threading
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.dcc_comms.dcc_comms import DCCComms
+from liota.dccs.graphite import Graphite
+from liota.entities.metrics.metric import Metric
+
+
+class SocketPairComms(DCCComms):
+
+    def __init__(self):
+        self.client, self.server = socket.socketpair()
+        self.received = [0]
+        self.reader = threading.Thread(target=self._drain)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def _drain(self):
+        while True:
+            data = self.server.recv(65536)
+            if not data:
+                return
+            self.received[0] += len(data)
+
+    def _connect(self):
+        pass
+
+    def _disconnect(self):
+        self.client.close()
+
+    def send(self, message, msg_attr=None):
+        self.client.sendall(message)
+
+    def receive(self, msg_attr=None):
+        pass
+
+
+def run(protocol, num_metrics, samples_per_metric, rounds):
+    comms = SocketPairComms()
+    graphite = Graphite(comms, protocol=protocol)
+    metrics = [graphite.register(Metric("edge.metric%d" % i))
+               for i in range(num_metrics)]
+    samples = [(1500000000000 + i * 1000, i * 0.5)
+               for i in range(samples_per_metric)]
+    start = time.time()
+    for _ in range(rounds):
+        for m in metrics:
+            m.values.extend(samples)
+        graphite.publish_batch(metrics)
+    elapsed = time.time() - start
+    comms._disconnect()
+    comms.reader.join()
+    lines = num_metrics * samples_per_metric * rounds
+    return lines / elapsed, comms.received[0]
+
+
+def main():
+    print("%-10s %12s %14s" % ("protocol", "lines/s", "bytes"))
+    for protocol in (Graphite.PLAINTEXT, Graphite.PICKLE):
+        rate, size = run(protocol, 100, 10, 100)
+        print("%-10s %12.0f %14d" % (protocol, rate, size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Measure how long registering devices with IoTCC takes with serial register()
+calls and with register_many() at several window sizes, and how long the
+write-behind of entity files still pending at the end takes.  Then measure
+a restart in warm start mode: how long register() of the same devices
+takes, and how long until all of them are revalidated in the background.
+A local stand-in for the broker and IoTCC answers each request after a
+simulated round trip time.
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_iotcc_register.py [num_devices] [rtt_ms]
+"""
+
+import heapq
+import json
+import os
+import Queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+os.environ.setdefault("LIOTA_CONF", join(dirname(__file__), '..', '..', 'config'))
+
+from liota.dcc_comms.dcc_comms import DCCComms
+from liota.dccs import iotcc as iotcc_module
+from liota.dccs.iotcc import IotControlCenter
+from liota.entities.devices.device import Device
+
+
+class Identity(object):
+    username = "user"
+    password = "password"
+
+
+class StandInComms(DCCComms):
+    """
+    Delivers a create_or_find_resource_response to userdata rtt seconds after each request is sent.
+    """
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.identity = Identity()
+        self.userdata = Queue.Queue()
+        self._due = []
+        self._cond = threading.Condition()
+        responder = threading.Thread(target=self._respond)
+        responder.daemon = True
+        responder.start()
+
+    def _connect(self):
+        pass
+
+    def _disconnect(self):
+        pass
+
+    def send(self, message, msg_attr=None):
+        request = json.loads(message)
+        response = json.dumps({
+            "transactionID": request["transactionID"],
+            "version": request["version"],
+            "type": "create_or_find_resource_response",
+            "body": {"uuid": "uuid-" + request["body"]["id"], "id": request["body"]["id"]}
+        })
+        with self._cond:
+            heapq.heappush(self._due, (time.time() + self.rtt, response))
+            self._cond.notify()
+
+    def _respond(self):
+        while True:
+            with self._cond:
+                while not self._due:
+                    self._cond.wait()
+                due, response = self._due[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                heapq.heappop(self._due)
+            self.userdata.put(response)
+
+    def receive(self, msg_attr=None):
+        pass
+
+
+class BenchIotControlCenter(IotControlCenter):
+
+    tmp_dir = None
+
+    def _create_iotcc_json(self):
+        path = join(self.tmp_dir, 'iotcc.json')
+        with open(path, 'w') as f:
+            json.dump({"iotcc": {"EdgeSystem": {}, "OGProperties": {}, "Devices": []}}, f)
+        return path
+
+    def _init_spool(self):
+        # nothing is published
+        pass
+
+    def _get_file_storage_path(self, name):
+        path = join(self.tmp_dir, name)
+        if not os.path.exists(path):
+            os.makedirs(path)
+        return path
+
+
+def run(num_devices, rtt, window):
+    BenchIotControlCenter.tmp_dir = tempfile.mkdtemp()
+    try:
+        iotcc = BenchIotControlCenter(StandInComms(rtt))
+        devices = [Device("dev%d" % i, "id%d" % i, "BenchDevice") for i in range(num_devices)]
+        start = time.time()
+        if window is None:
+            for device in devices:
+                iotcc.register(device)
+        else:
+            for _ in iotcc.register_many(devices, window):
+                pass
+        elapsed = time.time() - start
+        start = time.time()
+        iotcc._store_writer.stop()
+        return elapsed, time.time() - start, iotcc._store_writer.num_writes
+    finally:
+        shutil.rmtree(BenchIotControlCenter.tmp_dir)
+
+
+def run_warm(num_devices, rtt):
+    BenchIotControlCenter.tmp_dir = tempfile.mkdtemp()
+    read_liota_config = iotcc_module.read_liota_config
+    try:
+        iotcc = BenchIotControlCenter(StandInComms(rtt))
+        devices = [Device("dev%d" % i, "id%d" % i, "BenchDevice") for i in range(num_devices)]
+        for _ in iotcc.register_many(devices):
+            pass
+        iotcc._store_writer.stop()
+        iotcc_module.read_liota_config = lambda section, name, *default: \
+            "True" if name == 'iotcc_warm_start' else read_liota_config(section, name, *default)
+        iotcc = BenchIotControlCenter(StandInComms(rtt))
+        start = time.time()
+        for device in devices:
+            iotcc.register(device)
+        elapsed = time.time() - start
+        while iotcc._warm_started:
+            time.sleep(0.001)
+        revalidated = time.time() - start
+        iotcc._store_writer.stop()
+        return elapsed, revalidated
+    finally:
+        iotcc_module.read_liota_config = read_liota_config
+        shutil.rmtree(BenchIotControlCenter.tmp_dir)
+
+
+def main():
+    num_devices = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rtt = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000.0
+    print("%d devices, %.0f ms round trip" % (num_devices, rtt * 1000))
+    print("%-20s %10s %14s %10s %14s" % ("mode", "seconds", "devices/s", "flush s", "files written"))
+    for window in (None, 1, 8, 32, 128):
+        elapsed, flush_elapsed, num_writes = run(num_devices, rtt, window)
+        mode = "register()" if window is None else "register_many(%d)" % window
+        print("%-20s %10.2f %14.0f %10.2f %14d" % (mode, elapsed, num_devices / elapsed, flush_elapsed,
+                                                  num_writes))
+    elapsed, revalidated = run_warm(num_devices, rtt)
+    print("%-20s %10.2f %14.0f   (all revalidated after %.2f s)" % ("warm register()", elapsed,
+                                                                    num_devices / elapsed, revalidated))
+
+
+if __name__ == '__main__':
+    main()
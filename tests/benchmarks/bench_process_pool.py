@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Show multi-core scaling of process mode metrics against the thread pool for
+a CPU-heavy sampling function (naive DFT over a vibration buffer).
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_process_pool.py
+"""
+
+import cmath
+import math
+import multiprocessing
+import sys
+import threading
+import time
+from Queue import Queue
+from multiprocessing.pool import ThreadPool
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.core import metric_handler
+from liota.core.metric_handler import ProcessCollectionEngine
+from liota.entities.metrics.metric import Metric
+from liota.entities.metrics.registered_metric import RegisteredMetric
+
+SAMPLES = 256
+METRICS = 64
+
+
+def vibration_peak():
+    buf = [math.sin(2 * math.pi * 50 * t / SAMPLES) for t in range(SAMPLES)]
+    spectrum = [abs(sum(buf[t] * cmath.exp(-2j * math.pi * k * t / SAMPLES)
+                        for t in range(SAMPLES)))
+                for k in range(SAMPLES // 2)]
+    return spectrum.index(max(spectrum))
+
+
+class CountingEvents(object):
+
+    def __init__(self, n):
+        self._n = n
+        self.done = threading.Event()
+
+    def put_and_notify(self, item):
+        self._n -= 1
+        if self._n == 0:
+            self.done.set()
+
+
+def make_metrics(mode):
+    metrics = []
+    for i in range(METRICS):
+        reg_metric = RegisteredMetric(
+            Metric("vibration-%s-%d" % (mode, i), interval=1,
+                   sampling_function=vibration_peak, execution_mode=mode),
+            None, None)
+        reg_metric.flag_alive = True
+        reg_metric._next_run_time = 0
+        metrics.append(reg_metric)
+    return metrics
+
+
+def bench_threads(workers):
+    metrics = make_metrics("thread")
+    pool = ThreadPool(workers)
+    start = time.time()
+    pool.map(lambda m: m.collect(), metrics)
+    elapsed = time.time() - start
+    pool.terminate()
+    return elapsed
+
+
+def bench_processes(workers):
+    metrics = make_metrics("process")
+    events = CountingEvents(len(metrics))
+    metric_handler.event_ds = events
+    metric_handler.send_queue = Queue()
+    engine = ProcessCollectionEngine(workers)
+    start = time.time()
+    engine.submit(metrics)
+    events.done.wait()
+    elapsed = time.time() - start
+    engine.stop()
+    return elapsed
+
+
+def main():
+    print("%d CPUs, %d metrics per run" % (multiprocessing.cpu_count(),
+                                          METRICS))
+    print("%-8s %8s %14s" % ("mode", "workers", "samples/s"))
+    for workers in (1, 2, 4, 8):
+        for name, bench in (("thread", bench_threads),
+                            ("process", bench_processes)):
+            elapsed = bench(workers)
+            print("%-8s %8d %14.1f" % (name, workers, METRICS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
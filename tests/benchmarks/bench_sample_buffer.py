@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Compare buffering metric samples in a Queue of (ts, v) tuples with the
+array-backed SampleBuffer: memory held by the buffered samples and time to
+fill and drain them.
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_sample_buffer.py
+"""
+
+import sys
+import time
+from Queue import Queue
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.lib.utilities.sample_buffer import SampleBuffer
+
+
+def queue_size(q):
+    return sys.getsizeof(q.queue) + sum(
+        sys.getsizeof(s) + sys.getsizeof(s[1]) for s in q.queue)
+
+
+def buffer_size(buf):
+    return sys.getsizeof(buf._timestamps) + sys.getsizeof(buf._values)
+
+
+def run_queue(samples):
+    q = Queue()
+    start = time.time()
+    for s in samples:
+        q.put(s)
+    size = queue_size(q)
+    timestamps, values = [], []
+    for _ in range(q.qsize()):
+        ts, v = q.get(block=True)
+        timestamps.append(ts)
+        values.append(v)
+    return time.time() - start, size
+
+
+def run_buffer(samples):
+    buf = SampleBuffer()
+    start = time.time()
+    for s in samples:
+        buf.put(s)
+    size = buffer_size(buf)
+    buf.drain()
+    return time.time() - start, size
+
+
+def main():
+    print("%-8s %8s %12s %12s" % ("mode", "samples", "total ms", "bytes"))
+    for n in (1000, 10000, 100000):
+        samples = [(1500000000000 + i * 1000, float(i)) for i in range(n)]
+        for name, run in (("queue", run_queue), ("buffer", run_buffer)):
+            elapsed, size = run(samples)
+            print("%-8s %8d %12.2f %12d" % (name, n, elapsed * 1e3, size))
+
+
+if __name__ == '__main__':
+    main()
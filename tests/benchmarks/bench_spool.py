@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+"""
+Measure append and replay throughput of the on-disk spool, syncing to disk
+on every append versus batched syncs.  Run it on the target storage (e.g.
+eMMC) by passing a directory on it.
+
+Usage (from the top directory):
+
+    python tests/benchmarks/bench_spool.py [directory]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from os.path import abspath, dirname, join
+
+sys.path.insert(0, abspath(join(dirname(__file__), '..', '..')))
+
+from liota.lib.utilities.spool import SegmentSpool
+
+
+def run(directory, n, payload, fsync_batch):
+    spool_dir = tempfile.mkdtemp(dir=directory)
+    try:
+        spool = SegmentSpool(spool_dir, fsync_interval_ms=1000,
+                             fsync_batch=fsync_batch)
+        start = time.time()
+        for _ in range(n):
+            spool.append(payload)
+        spool.sync(force=True)
+        append_elapsed = time.time() - start
+        start = time.time()
+        while spool.get(timeout=0) is not None:
+            spool.commit()
+        replay_elapsed = time.time() - start
+        spool.close()
+        return n / append_elapsed, n / replay_elapsed
+    finally:
+        shutil.rmtree(spool_dir)
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else None
+    payload = "x" * 200
+    print("%-14s %8s %14s %14s" % ("fsync", "messages", "appends/s",
+                                   "replays/s"))
+    for name, fsync_batch, n in (("every append", 1, 2000),
+                                 ("batch of 100", 100, 100000)):
+        appends, replays = run(directory, n, payload, fsync_batch)
+        print("%-14s %8d %14.0f %14.0f" % (name, n, appends, replays))
+
+
+if __name__ == '__main__':
+    main()
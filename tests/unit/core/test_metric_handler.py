@@ -0,0 +1,640 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import gc
+import threading
+import time
+import unittest
+from Queue import Queue
+
+import mock
+
+from liota.core import metric_handler
+from liota.core.metric_handler import EventsPriorityQueue, EventsTimerWheel, \
+    AsyncCollectionEngine, ProcessCollectionEngine, SendStage, asyncio
+from liota.entities.metrics.metric import Metric
+from liota.entities.metrics.registered_metric import RegisteredMetric
+from liota.lib.utilities.utility import getUTCmillis
+
+
+class FakeMetric(object):
+
+    def __init__(self, name, next_run_time, interval=10):
+        self.name = name
+        self.flag_alive = True
+        self.interval = interval
+        self._next_run_time = next_run_time
+
+    def get_next_run_time(self):
+        return self._next_run_time
+
+    def set_interval(self, interval, scheduled=False):
+        if scheduled:
+            self._next_run_time += (interval - self.interval) * 1000
+        self.interval = interval
+
+    def __cmp__(self, other):
+        if not isinstance(other, FakeMetric):
+            return -1
+        return cmp(self._next_run_time, other._next_run_time)
+
+
+def square_sample():
+    return 7 * 7
+
+
+def failing_sample():
+    raise RuntimeError("sensor unplugged")
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class FakeClockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1000000]
+        patchers = [
+            mock.patch.object(metric_handler, 'getUTCmillis',
+                              side_effect=lambda: self.now[0]),
+            mock.patch.object(metric_handler, 'getMonotonicMillis',
+                              side_effect=lambda: self.now[0]),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+
+class TestEventsPriorityQueue(FakeClockTestCase):
+
+    def _check_heap(self, queue):
+        for pos, item in enumerate(queue.queue):
+            self.assertEqual(item._event_index, pos)
+            if pos > 0:
+                self.assertFalse(item < queue.queue[(pos - 1) >> 1])
+
+    def test_cancel(self):
+        queue = EventsPriorityQueue()
+        metrics = [FakeMetric(i, self.now[0] + (i * 37) % 101)
+                   for i in range(50)]
+        for m in metrics:
+            queue.put_and_notify(m)
+        for m in metrics[::3]:
+            self.assertTrue(queue.cancel(m))
+            self.assertIsNone(m._event_index)
+            self._check_heap(queue)
+        self.assertFalse(queue.cancel(metrics[0]))
+        self.assertEqual(queue.qsize(), 50 - len(metrics[::3]))
+
+    def test_reschedule(self):
+        queue = EventsPriorityQueue()
+        slow = FakeMetric("slow", self.now[0] + 10000, interval=10)
+        fast = FakeMetric("fast", self.now[0] + 5000, interval=5)
+        queue.put_and_notify(slow)
+        queue.put_and_notify(fast)
+        self.assertTrue(queue.reschedule(slow, 1))
+        self.assertEqual(slow.get_next_run_time(), self.now[0] + 1000)
+        self._check_heap(queue)
+        self.now[0] += 1000
+        self.assertIs(queue.get_next_element_when_ready(), slow)
+        self.assertFalse(queue.reschedule(slow, 2))
+        self.assertEqual(slow.interval, 2)
+        self.assertEqual(slow.get_next_run_time(), self.now[0])
+
+    def test_get_ready_elements(self):
+        queue = EventsPriorityQueue()
+        due = [FakeMetric(i, self.now[0] - i) for i in range(5)]
+        later = FakeMetric("later", self.now[0] + 1000)
+        queue.put_all_and_notify(due + [later])
+        self._check_heap(queue)
+        ready = queue.get_ready_elements()
+        self.assertEqual(sorted(m.name for m in ready), range(5))
+        self.assertEqual(queue.qsize(), 1)
+
+    def test_get_ready_elements_stops_at_exit(self):
+        queue = EventsPriorityQueue()
+        queue.put_and_notify(SystemExit())
+        ready = queue.get_ready_elements()
+        self.assertEqual(len(ready), 1)
+        self.assertIsInstance(ready[0], SystemExit)
+
+
+class TestEventsTimerWheel(FakeClockTestCase):
+
+    def test_invalid_tick(self):
+        self.assertRaises(ValueError, lambda: EventsTimerWheel(0))
+
+    def test_due_event_is_ready(self):
+        wheel = EventsTimerWheel(tick_ms=10)
+        m = FakeMetric("m", self.now[0])
+        wheel.put_and_notify(m)
+        self.assertEqual(wheel.qsize(), 1)
+        self.assertIs(wheel.get_next_element_when_ready(), m)
+        self.assertEqual(wheel.qsize(), 0)
+
+    def test_expiry_order_across_levels(self):
+        wheel = EventsTimerWheel(tick_ms=10, wheel_bits=2, levels=3)
+        delays = [50, 20, 5000, 700, 10, 90000, 330]
+        for d in delays:
+            wheel.put_and_notify(FakeMetric(d, self.now[0] + d))
+        fired = []
+        for d in sorted(delays):
+            self.now[0] += d - (fired[-1] if fired else 0)
+            m = wheel.get_next_element_when_ready()
+            self.assertEqual(m.name, d)
+            fired.append(d)
+        self.assertEqual(wheel.qsize(), 0)
+
+    def test_event_not_fired_early(self):
+        wheel = EventsTimerWheel(tick_ms=10)
+        wheel.put_and_notify(FakeMetric("m", self.now[0] + 15))
+        self.now[0] += 10
+        wheel._advance(wheel._now_tick())
+        self.assertEqual(len(wheel._ready), 0)
+        self.now[0] += 10
+        self.assertEqual(wheel.get_next_element_when_ready().name, "m")
+
+    def test_cancel_and_reschedule(self):
+        wheel = EventsTimerWheel(tick_ms=10)
+        a = FakeMetric("a", self.now[0] + 5000)
+        b = FakeMetric("b", self.now[0] + 5000)
+        wheel.put_and_notify(a)
+        wheel.put_and_notify(b)
+        self.assertTrue(wheel.cancel(a))
+        self.assertFalse(wheel.cancel(a))
+        self.assertEqual(wheel.qsize(), 1)
+        self.assertTrue(wheel.reschedule(b, 1))
+        self.now[0] += 1000
+        self.assertIs(wheel.get_next_element_when_ready(), b)
+        self.assertEqual(wheel.qsize(), 0)
+
+    def test_get_ready_elements(self):
+        wheel = EventsTimerWheel(tick_ms=10)
+        wheel.put_all_and_notify([FakeMetric(i, self.now[0] + 500)
+                                  for i in range(100)])
+        wheel.put_and_notify(FakeMetric("later", self.now[0] + 2000))
+        self.now[0] += 500
+        self.assertEqual(len(wheel.get_ready_elements()), 100)
+        self.assertEqual(wheel.qsize(), 1)
+
+    def test_system_exit_first(self):
+        wheel = EventsTimerWheel(tick_ms=10)
+        wheel.put_and_notify(FakeMetric("m", self.now[0]))
+        wheel.put_and_notify(SystemExit())
+        self.assertIsInstance(wheel.get_next_element_when_ready(), SystemExit)
+
+
+@unittest.skipIf(asyncio is None, "asyncio or trollius is not installed")
+class TestAsyncCollectionEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.event_ds = mock.Mock()
+        # create child mock up front, creating it lazily is not thread-safe
+        self.event_ds.put_and_notify = mock.Mock()
+        self.send_queue = Queue()
+        patchers = [
+            mock.patch.object(metric_handler, 'event_ds', self.event_ds),
+            mock.patch.object(metric_handler, 'send_queue', self.send_queue),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.engine = AsyncCollectionEngine(max_concurrency=2)
+        self.addCleanup(self.engine.stop)
+        self.start = getUTCmillis()
+
+    def _reg_metric(self, name, sampling_function):
+        reg_metric = RegisteredMetric(
+            Metric(name, interval=1, sampling_function=sampling_function),
+            None, None)
+        reg_metric.flag_alive = True
+        reg_metric._next_run_time = self.start
+        return reg_metric
+
+    def test_accepts_only_coroutines(self):
+        @asyncio.coroutine
+        def async_sample():
+            return 1
+
+        self.assertTrue(AsyncCollectionEngine.accepts(
+            self._reg_metric("async", async_sample)))
+        self.assertFalse(AsyncCollectionEngine.accepts(
+            self._reg_metric("sync", lambda: 1)))
+
+    def test_collect_and_queue_send(self):
+        @asyncio.coroutine
+        def async_sample():
+            return 42
+
+        metrics = [self._reg_metric("m%d" % i, async_sample) for i in range(5)]
+        self.engine.submit(metrics)
+        wait_for(lambda: self.event_ds.put_and_notify.call_count == 5)
+        self.assertEqual(self.event_ds.put_and_notify.call_count, 5)
+        self.assertEqual(self.send_queue.qsize(), 5)
+        for m in metrics:
+            self.assertEqual(m.values.get()[1], 42)
+            self.assertEqual(m.get_next_run_time(), self.start + 1000)
+        self.assertEqual(self.engine.get_stats(), [0, 0])
+
+    def test_failing_sampling_function(self):
+        @asyncio.coroutine
+        def async_failing_sample():
+            raise ValueError("sampling failed")
+
+        metric = self._reg_metric("failing", async_failing_sample)
+        self.engine.submit([metric])
+        wait_for(lambda: self.event_ds.put_and_notify.called)
+        self.assertEqual(self.engine.get_stats(), [0, 0])
+        # rescheduled, so that the metric keeps being collected
+        self.event_ds.put_and_notify.assert_called_once_with(metric)
+        self.assertGreater(metric.get_next_run_time(), self.start)
+        self.assertEqual(metric.values.qsize(), 0)
+
+    def test_sampling_function_not_a_coroutine(self):
+        metric = self._reg_metric("broken", lambda: 1)
+        self.engine.submit([metric])
+        wait_for(lambda: self.event_ds.put_and_notify.called)
+        self.event_ds.put_and_notify.assert_called_once_with(metric)
+        self.assertEqual(self.engine.get_stats(), [0, 0])
+
+
+class TestProcessCollectionEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.event_ds = mock.Mock()
+        # create child mock up front, creating it lazily is not thread-safe
+        self.event_ds.put_and_notify = mock.Mock()
+        self.send_queue = Queue()
+        patchers = [
+            mock.patch.object(metric_handler, 'event_ds', self.event_ds),
+            mock.patch.object(metric_handler, 'send_queue', self.send_queue),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.engine = ProcessCollectionEngine(1)
+        self.addCleanup(self.engine.stop)
+
+    def _reg_metric(self, name, sampling_function):
+        reg_metric = RegisteredMetric(
+            Metric(name, interval=1, sampling_function=sampling_function,
+                   execution_mode="process"),
+            None, None)
+        reg_metric.flag_alive = True
+        reg_metric._next_run_time = 0
+        return reg_metric
+
+    def test_collect_in_worker(self):
+        metric = self._reg_metric("square", square_sample)
+        self.assertTrue(ProcessCollectionEngine.accepts(metric))
+        self.engine.submit([metric])
+        wait_for(lambda: self.event_ds.put_and_notify.called)
+        self.event_ds.put_and_notify.assert_called_once_with(metric)
+        self.assertEqual(metric.values.get()[1], 49)
+        self.assertIs(self.send_queue.get(), metric)
+
+    def test_failing_sampling_function(self):
+        metric = self._reg_metric("failing", failing_sample)
+        self.engine.submit([metric])
+        wait_for(lambda: self.event_ds.put_and_notify.called)
+        self.assertEqual(self.engine.get_stats(), [0])
+        # rescheduled, so that the metric keeps being collected
+        self.event_ds.put_and_notify.assert_called_once_with(metric)
+        self.assertGreater(metric.get_next_run_time(), 0)
+        self.assertEqual(metric.values.qsize(), 0)
+
+    def test_unpicklable_arguments(self):
+        metric = self._reg_metric("square", square_sample)
+        metric.get_sampling_args = lambda: (lambda: 7,)
+        self.engine.submit([metric])
+        self.assertEqual(self.engine.get_stats(), [0])
+        self.event_ds.put_and_notify.assert_called_once_with(metric)
+
+    def test_started_before_threads(self):
+        started = []
+        # restored along with the patched ones once initialized
+        settings = dict((name, getattr(metric_handler, name)) for name in (
+            'metric_buffer_capacity', 'collect_batch_size',
+            'async_max_concurrency', 'process_pool_size', 'phase_spreading',
+            'collect_timeout_s', 'quarantine_max_backoff_s',
+            'metric_stats_enabled', 'max_jitter_ms'))
+        with mock.patch.multiple(
+                metric_handler, is_initialization_done=False,
+                process_engine=None, event_ds=None, event_checker_thread=None,
+                collect_queue=None, send_queue=None, collect_thread_pool=None,
+                read_liota_config=lambda section, name, default=None:
+                default if default is not None else '2',
+                ProcessCollectionEngine=mock.Mock(
+                    side_effect=lambda *args: started.append("processes")),
+                EventCheckerThread=mock.Mock(
+                    side_effect=lambda **kwargs: started.append("checker")),
+                SendStage=mock.Mock(
+                    side_effect=lambda *args: started.append("senders")),
+                CollectionThreadPool=mock.Mock(
+                    side_effect=lambda *args: started.append("collectors")),
+                **settings):
+            metric_handler.initialize()
+        self.assertEqual(started[0], "processes")
+        self.assertEqual(sorted(started[1:]),
+                         ["checker", "collectors", "senders"])
+
+
+class FakeSendMetric(object):
+
+    def __init__(self, ref_dcc, sent, gate=None):
+        self.ref_dcc = ref_dcc
+        self.flag_alive = True
+        self._sent = sent
+        self._gate = gate
+
+    def send_data(self):
+        if self._gate is not None:
+            self._gate.wait()
+        self._sent.append(self)
+        return True
+
+
+class FakeDcc(object):
+    pass
+
+
+class TestSendStage(unittest.TestCase):
+
+    def setUp(self):
+        self.stage = SendStage(num_workers_per_dcc=1, maxsize_per_dcc=2)
+        self.addCleanup(self.stage.put, SystemExit())
+        self.slow_dcc = FakeDcc()
+        self.fast_dcc = FakeDcc()
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+        self.sent = []
+
+    def test_slow_dcc_does_not_block_others(self):
+        self.stage.put(FakeSendMetric(self.slow_dcc, self.sent, self.gate))
+        fast = [FakeSendMetric(self.fast_dcc, self.sent) for _ in range(2)]
+        for m in fast:
+            self.stage.put(m)
+        wait_for(lambda: len(self.sent) == 2)
+        self.assertEqual(self.sent, fast)
+        self.gate.set()
+        wait_for(lambda: len(self.sent) == 3)
+        self.assertEqual(len(self.sent), 3)
+
+    def test_coalesce_and_drop(self):
+        blocker = FakeSendMetric(self.slow_dcc, self.sent, self.gate)
+        self.stage.put(blocker)
+        lane = self.stage.get_lane(self.slow_dcc)
+        wait_for(lambda: lane.qsize() == 0)
+        self.stage.put(blocker)
+        queued = [FakeSendMetric(self.slow_dcc, self.sent) for _ in range(3)]
+        for m in queued:
+            self.stage.put(m)
+        queued_stat, sent, failed, dropped, coalesced, workers = \
+            lane.get_stats()
+        self.assertEqual((queued_stat, dropped, coalesced, workers),
+                         (2, 1, 1, 1))
+        self.gate.set()
+        wait_for(lambda: len(self.sent) == 3)
+        self.assertEqual(self.sent, [blocker] + queued[:2])
+
+    def test_drop_oldest(self):
+        stage = SendStage(num_workers_per_dcc=1, maxsize_per_dcc=2,
+                          policy="drop_oldest")
+        self.addCleanup(stage.put, SystemExit())
+        blocker = FakeSendMetric(self.slow_dcc, self.sent, self.gate)
+        stage.put(blocker)
+        lane = stage.get_lane(self.slow_dcc)
+        wait_for(lambda: lane.qsize() == 0)
+        queued = [FakeSendMetric(self.slow_dcc, self.sent) for _ in range(3)]
+        for m in queued:
+            stage.put(m)
+        self.assertEqual(lane.get_stats()[3], 1)
+        # the dropped metric can be queued again
+        stage.put(queued[0])
+        self.assertEqual(lane.get_stats()[3], 2)
+        self.gate.set()
+        wait_for(lambda: len(self.sent) == 3)
+        self.assertEqual(self.sent, [blocker, queued[2], queued[0]])
+
+    def test_lane_of_collected_dcc_is_stopped(self):
+        dcc = FakeDcc()
+        lane = self.stage.get_lane(dcc)
+        self.assertIs(self.stage.get_lane(dcc), lane)
+        workers = list(lane._workers)
+        del dcc
+        gc.collect()
+        wait_for(lambda: not any(w.is_alive() for w in workers))
+        self.assertFalse(any(w.is_alive() for w in workers))
+        self.assertNotIn(lane.name, self.stage.get_stats())
+        # a new DCC, possibly at the address of the collected one, gets a lane of its own
+        self.assertIsNot(self.stage.get_lane(FakeDcc()), lane)
+
+
+class TestBoundedQueue(unittest.TestCase):
+
+    def test_policies(self):
+        dropped = []
+        queue = metric_handler.BoundedQueue(2, "drop_oldest", dropped.append)
+        for i in range(4):
+            queue.put(i)
+        self.assertEqual((queue.get(), queue.get()), (2, 3))
+        self.assertEqual(dropped, [0, 1])
+        queue = metric_handler.BoundedQueue(2, "drop_newest", dropped.append)
+        for i in range(3):
+            queue.put(i)
+        self.assertEqual(queue.qsize(), 2)
+        self.assertEqual(queue.num_dropped, 1)
+        self.assertEqual(dropped, [0, 1, 2])
+        queue = metric_handler.BoundedQueue(1, "drop_oldest")
+        queue.put(SystemExit())
+        self.assertFalse(queue.put(1))
+        self.assertTrue(isinstance(queue.get(), SystemExit))
+        self.assertRaises(ValueError, metric_handler.BoundedQueue, 1, "lifo")
+
+    def test_block(self):
+        queue = metric_handler.BoundedQueue(1, "block")
+        queue.put(1)
+        self.assertRaises(metric_handler.Full, queue.put, 2, True, 0.01)
+        self.assertEqual(queue.num_dropped, 0)
+
+    def test_skip_dropped_collection(self):
+        event_ds = mock.Mock()
+        metric = mock.Mock(flag_alive=True)
+        dead = mock.Mock(flag_alive=False)
+        queue = metric_handler.BoundedQueue(
+            1, "drop_oldest", metric_handler.skip_collection)
+        with mock.patch.object(metric_handler, 'event_ds', event_ds):
+            queue.put([metric, dead])
+            queue.put([metric])
+        metric.set_next_run_time.assert_called_once_with()
+        self.assertFalse(dead.set_next_run_time.called)
+        event_ds.put_all_and_notify.assert_called_once_with([metric])
+
+
+class TestSendStageBatch(unittest.TestCase):
+
+    def test_publish_batch_within_linger(self):
+        stage = SendStage(num_workers_per_dcc=1, maxsize_per_dcc=100,
+                          batch_linger_ms=200, batch_max_size=10)
+        self.addCleanup(stage.put, SystemExit())
+        dcc = mock.Mock()
+        dcc.publish_batch = mock.Mock()
+        metrics = []
+        for i in range(5):
+            metric = mock.Mock(flag_alive=True, ref_dcc=dcc)
+            metric.values.qsize.return_value = 1
+            metrics.append(metric)
+            stage.put(metric)
+        wait_for(lambda: dcc.publish_batch.called)
+        dcc.publish_batch.assert_called_once_with(metrics)
+        wait_for(lambda: stage.get_lane(dcc).get_stats()[1] == 5)
+        self.assertEqual(stage.get_lane(dcc).get_stats()[1], 5)
+
+
+class TestCollectionThreadPool(unittest.TestCase):
+
+    def setUp(self):
+        self.collect_queue = Queue()
+        self.event_ds = mock.Mock()
+        # create child mock up front, creating it lazily is not thread-safe
+        self.event_ds.put_all_and_notify = mock.Mock()
+        send_queue = mock.Mock()
+        send_queue.put = mock.Mock()
+        patchers = [
+            mock.patch.object(metric_handler, 'collect_queue',
+                              self.collect_queue),
+            mock.patch.object(metric_handler, 'event_ds', self.event_ds),
+            mock.patch.object(metric_handler, 'send_queue', send_queue),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+        self.gate = threading.Event()
+        self.addCleanup(self.gate.set)
+
+    def _blocking_metric(self):
+        metric = mock.Mock(flag_alive=True, hung_collection=False, sinks=[])
+        metric.get_collection_timeout.return_value = 0
+        metric.get_next_run_time.return_value = getUTCmillis()
+        metric.collect.side_effect = lambda: self.gate.wait()
+        return metric
+
+    def test_grow_and_shrink(self):
+        pool = metric_handler.CollectionThreadPool(
+            3, min_threads=1, idle_timeout_s=0, grow_queue_depth=1)
+        self.assertEqual(pool.get_stats_working()[1:5], [1, 1, 3, 1])
+        for _ in range(4):
+            self.collect_queue.put([self._blocking_metric()])
+        wait_for(lambda: pool.get_stats_working()[0] == 1)
+        self.assertEqual(pool.autoscale(), 2)
+        wait_for(lambda: pool.get_stats_working()[0] == 3)
+        # at max size, does not grow further
+        self.assertEqual(pool.autoscale(), 0)
+        self.gate.set()
+        wait_for(lambda: self.event_ds.put_all_and_notify.call_count == 4)
+        wait_for(lambda: pool.autoscale() == -2)
+        wait_for(lambda: pool.get_stats_working()[2] == 1)
+        self.assertEqual(pool.get_stats_working(), [0, 1, 1, 3, 1, 2, 2, 0])
+        self.assertEqual(pool.autoscale(), 0)
+        self.collect_queue.put(SystemExit())
+
+    def test_fixed_size(self):
+        pool = metric_handler.CollectionThreadPool(2)
+        self.collect_queue.put([self._blocking_metric()])
+        self.assertEqual(pool.autoscale(), 0)
+        self.assertEqual(pool.get_stats_working()[2:], [2, 2, 2, 0, 0, 0])
+        self.gate.set()
+        for _ in range(2):
+            self.collect_queue.put(SystemExit())
+        wait_for(lambda: pool.get_stats_working()[2] == 0)
+
+    def test_replace_hung_thread(self):
+        pool = metric_handler.CollectionThreadPool(2, min_threads=1)
+        hung = self._blocking_metric()
+        hung.get_collection_timeout.return_value = 0.5
+        waiting = mock.Mock(flag_alive=True, hung_collection=False, sinks=[])
+        self.collect_queue.put([hung, waiting])
+        wait_for(lambda: pool.get_stats_working()[0] == 1)
+        self.assertEqual(pool.check_hung(), 0)
+        time.sleep(0.6)
+        self.assertEqual(pool.check_hung(), 1)
+        self.assertTrue(hung.hung_collection)
+        hung.quarantine.assert_called_once_with()
+        self.assertIn(mock.call([hung]),
+                      self.event_ds.put_all_and_notify.call_args_list)
+        # the rest of the batch is collected by the fresh thread
+        wait_for(lambda: waiting.collect.called)
+        waiting.collect.assert_called_once_with()
+        self.assertEqual(pool.get_stats_working()[1:3], [1, 1])
+        self.assertEqual(pool.get_stats_working()[-1], 1)
+        # the hung thread exits without putting the metric back again
+        self.gate.set()
+        wait_for(lambda: not hung.hung_collection)
+        time.sleep(0.05)
+        self.assertFalse(hung.hung_collection)
+        self.assertEqual(len([c for c in self.event_ds.put_all_and_notify.call_args_list
+                              if hung in c[0][0]]), 1)
+        self.collect_queue.put(SystemExit())
+
+
+class PhasedMetric(FakeMetric):
+
+    def __init__(self, name, next_run_time, interval, phase):
+        super(PhasedMetric, self).__init__(name, next_run_time, interval)
+        self.ref_entity = mock.Mock(interval=interval)
+        self.phase = phase
+
+    def get_phase(self):
+        return self.phase
+
+
+class TestScheduleStats(FakeClockTestCase):
+
+    def test_schedule_stats(self):
+        for event_ds in (EventsPriorityQueue(), EventsTimerWheel()):
+            metrics = [PhasedMetric(i, self.now[0] + 1000 + i, 5, i * 1000)
+                       for i in range(5)]
+            metrics += [PhasedMetric(i, self.now[0] + 1000, 10, 30)
+                        for i in range(3)]
+            event_ds.put_all_and_notify(metrics)
+            self.assertEqual(len(event_ds.snapshot()), 8)
+            with mock.patch.object(metric_handler, 'event_ds', event_ds):
+                self.assertEqual(metric_handler.get_schedule_stats(),
+                                 {5: [5, 1], 10: [3, 3]})
+
+
+if __name__ == '__main__':
+    unittest.main()
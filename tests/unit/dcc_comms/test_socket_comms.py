@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+import socket
+import threading
+import time
+import unittest
+
+from liota.dcc_comms.socket_comms import SocketDccComms
+
+
+class Server(object):
+    """
+    Local stand-in for a BSD socket server, recording what its clients write.
+    """
+
+    def __init__(self, port=0):
+        self.listener = socket.socket()
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", port))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.received = []
+        self.clients = []
+        self.thread = threading.Thread(target=self._accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                client = self.listener.accept()[0]
+            except Exception:
+                return
+            self.clients.append(client)
+            reader = threading.Thread(target=self._read, args=(client,))
+            reader.daemon = True
+            reader.start()
+
+    def _read(self, client):
+        while True:
+            try:
+                data = client.recv(65536)
+            except Exception:
+                return
+            if not data:
+                return
+            self.received.append(data)
+
+    def data(self):
+        return ''.join(self.received)
+
+    def close(self):
+        for sock in [self.listener] + self.clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+
+
+class FailingSocket(object):
+    """
+    Socket wrapper whose writes fail once limit bytes are written.
+    """
+
+    def __init__(self, sock, limit):
+        self.sock = sock
+        self.limit = limit
+
+    def send(self, data):
+        if self.limit <= 0:
+            raise socket.error("connection reset")
+        data = data[:self.limit]
+        self.sock.sendall(data)
+        self.limit -= len(data)
+        return len(data)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+
+def wait_for(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSocketDccComms(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_send_and_reconnect(self):
+        comms = SocketDccComms("127.0.0.1", self.server.port, reconnect_min_s=0)
+        self.addCleanup(comms._disconnect)
+        comms.send("a 1 1\n")
+        assert wait_for(lambda: self.server.data() == "a 1 1\n")
+        port = self.server.port
+        self.server.close()
+        self.server = Server(port)
+        assert wait_for(lambda: comms._connections[0]._peer_closed())
+        comms.send("b 2 2\n")
+        assert wait_for(lambda: self.server.data() == "b 2 2\n")
+        assert comms.get_stats()[0][3:] == [2, 1]
+
+    def test_reconnect_back_off(self):
+        comms = SocketDccComms("127.0.0.1", self.server.port, reconnect_min_s=60)
+        self.addCleanup(comms._disconnect)
+        self.server.close()
+        wait_for(lambda: comms._connections[0]._peer_closed())
+        with self.assertRaises(socket.error):
+            comms.send("a 1 1\n")
+        connects = comms.get_stats()[0][3]
+        with self.assertRaises(socket.error):
+            comms.send("a 1 1\n")
+        assert comms.get_stats()[0][3] == connects
+
+    def test_coalesce_writes(self):
+        comms = SocketDccComms("127.0.0.1", self.server.port, flush_interval_ms=50, max_buffer_size=1000)
+        self.addCleanup(comms._disconnect)
+        for i in range(10):
+            comms.send("m %d 1\n" % i)
+        assert comms.get_stats()[0][2] > 0
+        assert wait_for(lambda: len(self.server.data()) == 60)
+        assert wait_for(lambda: comms.get_stats()[0][2] == 0)
+
+    def test_failed_flush_keeps_unwritten_messages(self):
+        comms = SocketDccComms("127.0.0.1", self.server.port, flush_interval_ms=60000, max_buffer_size=1000,
+                               reconnect_min_s=0)
+        self.addCleanup(comms._disconnect)
+        for name in "abc":
+            comms.send("%s 1 1\n" % name)
+        conn = comms._connections[0]
+        with conn.lock:
+            conn.sock = FailingSocket(conn.sock, 9)
+            with self.assertRaises(socket.error):
+                conn.flush()
+        # "a" was written, "b" only partly: it is written again whole
+        assert conn.buffer == ["b 1 1\n", "c 1 1\n"]
+        assert comms.get_stats()[0][2] == 12
+        with conn.lock:
+            conn.flush()
+        assert wait_for(lambda: len(self.server.data()) == 21)
+        assert self.server.data().count("a 1 1\n") == 1
+        assert self.server.data().count("b 1 1\n") == 1
+        assert self.server.data().count("c 1 1\n") == 1
+        assert comms.get_stats()[0][2] == 0
+
+    def test_pool_spreads_connections(self):
+        other = Server()
+        try:
+            comms = SocketDccComms("127.0.0.1", self.server.port, addresses=[("127.0.0.1", other.port)])
+            self.addCleanup(comms._disconnect)
+            for i in range(4):
+                comms.send("m %d 1\n" % i)
+            assert wait_for(lambda: len(self.server.data()) == 12 and len(other.data()) == 12)
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
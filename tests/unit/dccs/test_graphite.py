@@ -30,16 +30,43 @@
 #  THE POSSIBILITY OF SUCH DAMAGE.                                            #
 # ----------------------------------------------------------------------------#
 
+import pickle
+import shutil
+import struct
+import tempfile
+import threading
+import time
 import unittest
 
 import mock
 
+from liota.dccs.dcc import DataCenterComponent
 from liota.dccs.graphite import Graphite
 from liota.dcc_comms.dcc_comms import DCCComms
+from liota.entities.metrics.metric import Metric
 
 
 class TestDCCGraphite(unittest.TestCase):
 
+    def setUp(self):
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+        self.config = {'spool_enabled': 'False', 'spool_dir': spool_dir, 'spool_segment_size': '65536',
+                       'spool_replay_rate': '0'}
+        patches = [
+            mock.patch('liota.dccs.dcc.read_liota_config',
+                       side_effect=lambda section, name, default=None: self.config.get(name, default)),
+            mock.patch.object(DataCenterComponent, '_spool_names', set())
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _stop_spool(self, dcc):
+        dcc._spool_replayer.flag_alive = False
+        dcc._spool_replayer.join(5)
+        dcc.spool.close()
+
     def test_graphite_dcc_init_fail_without_DCCComms(self):
         with self.assertRaises(Exception):
             g = Graphite("asd")
@@ -54,6 +81,142 @@ class TestDCCGraphite(unittest.TestCase):
         mock_dccc = mock.create_autospec(DCCComms)
         g = Graphite(mock_dccc)
         assert isinstance(g, Graphite)
+    def test_graphite_publish_batch_sends_once(self):
+        mock_dccc = mock.create_autospec(DCCComms)
+        g = Graphite(mock_dccc)
+        cpu = g.register(Metric("cpu"))
+        mem = g.register(Metric("mem"))
+        cpu.add_collected_data([(1000, 10), (2000, 20)])
+        mem.add_collected_data((1000, 30))
+        g.publish_batch([cpu, mem])
+        mock_dccc.send.assert_called_once_with(
+            "cpu 10 1\ncpu 20 2\nmem 30 1\n", None)
+        assert cpu.values.qsize() == 0 and mem.values.qsize() == 0
+    def test_publish_batch_without_batch_support(self):
+        mock_dccc = mock.create_autospec(DCCComms)
+        g = Graphite(mock_dccc)
+        g.supports_batch = False
+        cpu = g.register(Metric("cpu"))
+        mem = g.register(Metric("mem"))
+        cpu.add_collected_data((1000, 10))
+        mem.add_collected_data((1000, 30))
+        g.publish_batch([cpu, mem])
+        assert mock_dccc.send.call_args_list == [
+            mock.call("cpu 10 1\n", None), mock.call("mem 30 1\n", None)]
+    def test_graphite_pickle_protocol(self):
+        mock_dccc = mock.create_autospec(DCCComms)
+        g = Graphite(mock_dccc, protocol=Graphite.PICKLE)
+        cpu = g.register(Metric("cpu"))
+        cpu.add_collected_data([(1000, 10), (2000, 20.5)])
+        g.publish(cpu)
+        message = mock_dccc.send.call_args[0][0]
+        length = struct.unpack('!L', message[:4])[0]
+        assert length == len(message) - 4
+        assert pickle.loads(message[4:]) == [("cpu", (1, 10)), ("cpu", (2, 20.5))]
+    def test_graphite_max_bytes_per_write(self):
+        mock_dccc = mock.create_autospec(DCCComms)
+        g = Graphite(mock_dccc, max_bytes_per_write=20)
+        cpu = g.register(Metric("cpu"))
+        cpu.add_collected_data([(1000, 10), (2000, 20), (3000, 30)])
+        g.publish(cpu)
+        assert mock_dccc.send.call_args_list == [
+            mock.call("cpu 10 1\ncpu 20 2\n", None), mock.call("cpu 30 3\n", None)]
+        g = Graphite(mock_dccc, protocol=Graphite.PICKLE, max_bytes_per_write=60)
+        cpu = g.register(Metric("cpu"))
+        cpu.add_collected_data([(i * 1000, i) for i in range(10)])
+        mock_dccc.reset_mock()
+        g.publish(cpu)
+        records = []
+        for call in mock_dccc.send.call_args_list:
+            assert len(call[0][0]) <= 60
+            records.extend(pickle.loads(call[0][0][4:]))
+        assert records == [("cpu", (i, i)) for i in range(10)]
+        with self.assertRaises(ValueError):
+            Graphite(mock_dccc, protocol="json")
+    def test_graphite_publish_spools_failed_send(self):
+        mock_dccc = mock.create_autospec(DCCComms)
+        mock_dccc.send.side_effect = IOError("link down")
+        g = Graphite(mock_dccc)
+        g.spool = mock.Mock()
+        cpu = g.register(Metric("cpu"))
+        cpu.add_collected_data((1000, 10))
+        g.publish(cpu)
+        g.spool.append.assert_called_once_with(
+            pickle.dumps(("cpu 10 1\n", None), 2))
+        # live messages do not wait for spooled ones
+        mock_dccc.send.side_effect = None
+        cpu.add_collected_data((2000, 20))
+        g.publish(cpu)
+        assert mock_dccc.send.call_count == 2
+        assert g.spool.append.call_count == 1
+
+    def test_graphite_publish_faster_than_replay(self):
+        sent = []
+        link_up = threading.Event()
+
+        def send(message, msg_attr=None):
+            if not link_up.is_set():
+                raise IOError("link down")
+            sent.append(message)
+
+        mock_dccc = mock.create_autospec(DCCComms)
+        mock_dccc.send.side_effect = send
+        g = Graphite(mock_dccc)
+        g.enable_spool("graphite-test", replay_rate=5)
+        self.addCleanup(self._stop_spool, g)
+        cpu = g.register(Metric("cpu"))
+        for ts in range(1, 4):
+            cpu.add_collected_data((ts * 1000, ts))
+            g.publish(cpu)
+        link_up.set()
+        start = time.time()
+        for ts in range(4, 104):
+            cpu.add_collected_data((ts * 1000, ts))
+            g.publish(cpu)
+        # 100 live messages sent at once, while the backlog replays at 5 messages per second
+        assert time.time() - start < 1
+        assert ["cpu %d %d\n" % (ts, ts) for ts in range(4, 104)] == [m for m in sent if m != "cpu 1 1\n"]
+        assert g.spool.get_stats()[0] == 3
+        deadline = time.time() + 10
+        while g.spool.has_backlog() and time.time() < deadline:
+            time.sleep(0.05)
+        assert not g.spool.has_backlog()
+        assert sorted(sent) == sorted("cpu %d %d\n" % (ts, ts) for ts in range(1, 104))
+
+    def test_graphite_spool_enabled_by_config(self):
+        self.config['spool_enabled'] = 'True'
+        sent = []
+
+        def send(message, msg_attr=None):
+            if not sent:
+                sent.append(None)
+                raise IOError("link down")
+            sent.append(message)
+
+        mock_dccc = mock.create_autospec(DCCComms)
+        mock_dccc.send.side_effect = send
+        mock_dccc.ip, mock_dccc.port = "10.0.0.1", 2003
+        g = Graphite(mock_dccc)
+        self.addCleanup(self._stop_spool, g)
+        assert g._spool_replayer.name == "SpoolReplayer-graphite-10.0.0.1-2003"
+        cpu = g.register(Metric("cpu"))
+        for ts in (1000, 2000, 3000):
+            cpu.add_collected_data((ts, ts / 100))
+            g.publish(cpu)
+        deadline = time.time() + 5
+        while len(sent) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        # replayed once sending succeeds again
+        assert sorted(sent[1:]) == ["cpu 10 1\n", "cpu 20 2\n", "cpu 30 3\n"]
+        # named after the endpoint, whatever the order DCCs are created in
+        other_dccc = mock.create_autospec(DCCComms)
+        other_dccc.url, other_dccc.port = "carbon.example.com", 2004
+        other = Graphite(other_dccc)
+        self.addCleanup(self._stop_spool, other)
+        assert other._spool_replayer.name == "SpoolReplayer-graphite-carbon.example.com-2004"
+        # a spool is used by one DCC only, and none is enabled without a known endpoint
+        assert Graphite(mock_dccc).spool is None
+        assert Graphite(mock.create_autospec(DCCComms)).spool is None
 
 if __name__ == '__main__':
     unittest.main()
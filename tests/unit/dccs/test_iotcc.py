@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+import json
+import os
+import Queue
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+
+# liota.dccs.iotcc reads liota.conf on import: use the one of the source tree unless another one is installed
+os.environ.setdefault("LIOTA_CONF", os.path.join(os.path.dirname(__file__), "..", "..", "..", "config"))
+
+from liota.dccs import iotcc
+from liota.dccs.dcc import RegistrationFailure
+from liota.dccs.iotcc import IotControlCenter
+from liota.entities.devices.device import Device
+from liota.entities.metrics.metric import Metric
+from liota.entities.registered_entity import RegisteredEntity
+from liota.entities.metrics.registered_metric import RegisteredMetric
+
+
+class Responder(object):
+    """
+    Stand-in for IoTCC: answers registration requests in reverse order once window of them (or all remaining ones)
+    are outstanding.
+    """
+
+    def __init__(self, comms, total, window):
+        self.comms = comms
+        self.remaining = total
+        self.window = window
+        self.held = []
+        self.max_held = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send(self, message, msg_attr=None):
+        with self.lock:
+            self.held.append(json.loads(message))
+            self.max_held = max(self.max_held, len(self.held))
+
+    def _run(self):
+        while self.remaining:
+            with self.lock:
+                if len(self.held) < min(self.window, self.remaining):
+                    held = None
+                else:
+                    held, self.held = self.held, []
+            if held is None:
+                time.sleep(0.001)
+                continue
+            for request in reversed(held):
+                self.comms.userdata.put(json.dumps({
+                    "transactionID": request["transactionID"],
+                    "version": 20171118,
+                    "type": "create_or_find_resource_response",
+                    "body": {"uuid": "uuid-" + request["body"]["id"], "id": request["body"]["id"]}
+                }))
+                self.remaining -= 1
+
+
+class TestIotControlCenter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmp_dir, "dev_file_path"))
+        os.mkdir(os.path.join(self.tmp_dir, "entity_file_path"))
+        patches = [
+            mock.patch.object(IotControlCenter, '_create_iotcc_json', return_value=self.tmp_dir + '/iotcc.json'),
+            mock.patch.object(IotControlCenter, '_get_file_storage_path',
+                              side_effect=lambda name: os.path.join(self.tmp_dir, name)),
+            mock.patch('liota.dccs.iotcc.time.sleep'),
+            mock.patch.object(IotControlCenter, '_init_spool')
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.comms = mock.Mock()
+        self.comms.userdata = Queue.Queue()
+        self.iotcc = IotControlCenter(self.comms)
+
+    def tearDown(self):
+        # Let the callbacks of answered requests store their results before the files go away
+        deadline = time.time() + 5
+        while self.iotcc._mux.outstanding() and time.time() < deadline:
+            time.sleep(0.01)
+        callbacks_done = threading.Event()
+        self.iotcc._mux._callbacks.put(callbacks_done.set)
+        callbacks_done.wait(5)
+        self.iotcc._store_writer.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_register_many_pipelines_requests(self):
+        devices = [Device("dev%d" % i, "id%d" % i, "Dev") for i in range(10)]
+        responder = Responder(self.comms, len(devices), 4)
+        self.comms.send.side_effect = responder.send
+        results = list(self.iotcc.register_many(devices + [Metric("cpu")], window=4))
+        assert responder.max_held == 4
+        assert len(results) == 11
+        reg_entities = dict(results)
+        for device in devices:
+            assert isinstance(reg_entities[device], RegisteredEntity)
+            assert reg_entities[device].reg_entity_id == "uuid-" + device.entity_id
+        assert isinstance(results[0][1], RegisteredEntity)
+        assert [r for r in results if isinstance(r[1], RegisteredMetric)]
+
+    def test_register_many_rejects_invalid_name(self):
+        results = list(self.iotcc.register_many([Device("bad/name", "id0", "Dev")]))
+        assert isinstance(results[0][1], ValueError)
+        assert not self.comms.send.called
+
+    def test_register_async_completes_out_of_order(self):
+        devices = [Device("dev%d" % i, "id%d" % i, "Dev") for i in range(3)]
+        responder = Responder(self.comms, len(devices), len(devices))
+        self.comms.send.side_effect = responder.send
+        futures = [self.iotcc.register_async(device) for device in devices]
+        assert [f.result(5).reg_entity_id for f in futures] == ["uuid-id0", "uuid-id1", "uuid-id2"]
+        assert self.iotcc.register_async(Metric("cpu")).done()
+        assert self.iotcc._mux.outstanding() == 0
+
+    def test_register_without_uuid_fails(self):
+        def respond(message, msg_attr=None):
+            request = json.loads(message)
+            self.comms.userdata.put(json.dumps({
+                "transactionID": request["transactionID"],
+                "version": 20171118,
+                "type": "create_or_find_resource_response",
+                "body": {"id": request["body"]["id"]}
+            }))
+
+        self.comms.send.side_effect = respond
+        self.assertRaises(RegistrationFailure, self.iotcc.register, Device("dev0", "id0", "Dev"))
+        self.assertRaises(RegistrationFailure, self.iotcc.register_async(Device("dev1", "id1", "Dev")).result, 5)
+        results = list(self.iotcc.register_many([Device("dev2", "id2", "Dev")]))
+        assert isinstance(results[0][1], RegistrationFailure)
+
+    def test_actions_do_not_delay_responses(self):
+        release = threading.Event()
+        actions = []
+        self.iotcc.add_message_handler("action", lambda msg: actions.append(msg["body"]) or release.wait(5))
+        for i in range(10):
+            self.comms.userdata.put(json.dumps({"transactionID": 2 * i + 1, "type": "action", "body": i}))
+        future = self.iotcc._request(lambda transaction_id: {"transactionID": transaction_id})
+        self.comms.userdata.put(json.dumps({"transactionID": json.loads(self.comms.send.call_args[0][0])[
+            "transactionID"], "type": "response"}))
+        assert future.result(5)["type"] == "response"
+        release.set()
+        deadline = time.time() + 5
+        while len(actions) < 10 and time.time() < deadline:
+            time.sleep(0.01)
+        assert sorted(actions) == range(10)
+
+    def test_nested_transaction_id_is_not_routed(self):
+        actions = []
+        self.iotcc.add_message_handler("action", lambda msg: actions.append(msg["body"]))
+        future = self.iotcc._request(lambda transaction_id: {"transactionID": transaction_id})
+        transaction_id = json.loads(self.comms.send.call_args[0][0])["transactionID"]
+        self.comms.userdata.put('{"type": "action", "body": {"transactionID": %d}}' % transaction_id)
+        self.comms.userdata.put('{"type": "response", "transactionID": %d}' % transaction_id)
+        assert future.result(5)["type"] == "response"
+        deadline = time.time() + 5
+        while not actions and time.time() < deadline:
+            time.sleep(0.01)
+        assert actions == [{"transactionID": transaction_id}]
+
+    def test_entity_store_writes_behind(self):
+        device = Device("dev0", "id0", "Dev")
+        with self.iotcc.file_ops_lock:
+            for _ in range(3):
+                self.iotcc._store_reg_entity_details("Dev", "dev0", "uuid0", "id0")
+            self.iotcc._store_reg_entity_attributes("Devices", device, "uuid0", "Dev", {"k": "v"})
+            self.iotcc._store_reg_entity_attributes("Devices", device, "uuid0", "Dev", {"k2": "v2"})
+        self.iotcc._store_writer.flush()
+        with open(self.tmp_dir + '/iotcc.json') as f:
+            devices = json.load(f)["iotcc"]["Devices"]
+        assert devices == [{"DeviceName": "dev0", "uuid": "uuid0", "EntityType": "Dev", "LocalUuid": "id0"}]
+        with open(self.tmp_dir + '/dev_file_path/uuid0.json') as f:
+            attributes = json.load(f)["discovery"]["attributes"]
+        assert {"k": "v"} in attributes and {"k2": "v2"} in attributes
+        assert self.iotcc._store_writer.num_writes == 3
+
+        with self.iotcc.file_ops_lock:
+            self.iotcc._remove_reg_entity_details("dev0", "uuid0")
+        self.iotcc._store_writer.flush()
+        with open(self.tmp_dir + '/iotcc.json') as f:
+            assert json.load(f)["iotcc"]["Devices"] == []
+
+    def test_warm_start_register(self):
+        devices = [Device("dev%d" % i, "id%d" % i, "Dev") for i in range(3)]
+        self.comms.send.side_effect = Responder(self.comms, len(devices), 1).send
+        for device in devices:
+            self.iotcc.register(device)
+        self.iotcc._store_writer.stop()
+
+        # The receive queue of the first instance is still served by its dispatch thread
+        self.comms = mock.Mock()
+        self.comms.userdata = Queue.Queue()
+
+        # Revalidation responses are held back until the warm started registrations are checked
+        registrations = []
+        held = []
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def respond(message, msg_attr=None):
+            request = json.loads(message)
+            if request["type"] != "create_or_find_resource_request":
+                return
+            registrations.append(request["body"]["id"])
+            response = json.dumps({
+                "transactionID": request["transactionID"],
+                "version": 20171118,
+                "type": "create_or_find_resource_response",
+                "body": {"uuid": "new-" + request["body"]["id"] if request["body"]["id"] == "id2" else
+                         "uuid-" + request["body"]["id"], "id": request["body"]["id"]}
+            })
+            with lock:
+                if request["body"]["id"] != "id9" and not release.is_set():
+                    held.append(response)
+                    return
+            self.comms.userdata.put(response)
+
+        self.comms.send.side_effect = respond
+        read_liota_config = iotcc.read_liota_config
+        with mock.patch('liota.dccs.iotcc.read_liota_config',
+                        side_effect=lambda s, n, *d: "True" if n == 'iotcc_warm_start' else read_liota_config(s, n, *d)):
+            self.iotcc = IotControlCenter(self.comms)
+        reg_entities = [self.iotcc.register(device) for device in devices + [Device("dev9", "id9", "Dev")]]
+        assert [r.reg_entity_id for r in reg_entities] == ["uuid-id0", "uuid-id1", "uuid-id2", "uuid-id9"]
+        with lock:
+            release.set()
+            for response in held:
+                self.comms.userdata.put(response)
+        deadline = time.time() + 5
+        while self.iotcc._warm_started and time.time() < deadline:
+            time.sleep(0.01)
+        assert not self.iotcc._warm_started
+        assert reg_entities[2].reg_entity_id == "new-id2"
+        assert sorted(registrations) == ["id0", "id1", "id2", "id9"]
+        # the entity file of the previous resource is not warm started again
+        self.iotcc._store_writer.flush()
+        entity_files = os.listdir(os.path.join(self.tmp_dir, "entity_file_path"))
+        assert "new-id2.json" in entity_files and "uuid-id2.json" not in entity_files
+
+    def test_warm_cache_prefers_newest_entity_file(self):
+        entity_file_path = os.path.join(self.tmp_dir, "entity_file_path")
+        for reg_entity_id, timestamp in (("a-uuid", "2026-10-18T10:00:00"), ("b-uuid", "2026-10-17T10:00:00")):
+            with open(os.path.join(entity_file_path, reg_entity_id + ".json"), "w") as f:
+                json.dump({"local uuid": "id0", "entity type": "Devices", "device type": "Dev", "name": "dev0",
+                           "Entity_Timestamp": timestamp}, f)
+        for file_names in (["a-uuid.json", "b-uuid.json"], ["b-uuid.json", "a-uuid.json"]):
+            with mock.patch('liota.dccs.iotcc.os.listdir', return_value=file_names):
+                assert self.iotcc._load_warm_cache()["id0"][0] == "a-uuid"
+
+    def test_properties_are_diffed_and_coalesced(self):
+        requests = []
+
+        def respond(message, msg_attr=None):
+            request = json.loads(message)
+            requests.append(request)
+            self.comms.userdata.put(json.dumps({
+                "transactionID": request["transactionID"],
+                "version": 20171118,
+                "type": "add_properties_response",
+                "body": {"result": "succeeded"}
+            }))
+
+        self.comms.send.side_effect = respond
+        reg_device = RegisteredEntity(Device("dev0", "id0", "Dev"), self.iotcc, "uuid0")
+        self.iotcc._queue_properties(reg_device, {"temp_unit": "celsius"})
+        self.iotcc._queue_properties(reg_device, {"hum_unit": "percent"})
+        self.iotcc._flush_properties(force=True)
+        deadline = time.time() + 5
+        while not requests and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(requests) == 1
+        assert sorted(p["propertyKey"] for p in requests[0]["body"]["property_data"]) == ["hum_unit", "temp_unit"]
+
+        self.iotcc.set_properties(reg_device, {"temp_unit": "celsius", "hum_unit": "percent"})
+        assert len(requests) == 1
+        self.iotcc.set_properties(reg_device, {"temp_unit": "kelvin", "hum_unit": "percent"})
+        assert len(requests) == 2
+        assert requests[1]["body"]["property_data"] == [{"propertyKey": "temp_unit", "propertyValue": "kelvin"}]
+
+    def test_properties_follow_registration(self):
+        requests = []
+
+        def respond(message, msg_attr=None):
+            request = json.loads(message)
+            requests.append(request)
+            self.comms.userdata.put(json.dumps({
+                "transactionID": request["transactionID"],
+                "version": 20171118,
+                "type": request["type"].replace("_request", "_response"),
+                "body": {"result": "succeeded"}
+            }))
+
+        self.comms.send.side_effect = respond
+        reg_device = RegisteredEntity(Device("dev0", "id0", "Dev"), self.iotcc, "uuid0")
+        self.iotcc.set_properties(reg_device, {"temp_unit": "celsius"})
+        self.iotcc._queue_properties(reg_device, {"hum_unit": "percent"})
+        self.iotcc.unregister(reg_device)
+        assert len(requests) == 2
+        assert self.iotcc._pending_props == {}
+
+        # Re-registered under the same uuid, IoTCC knows none of the properties any more
+        self.iotcc.set_properties(reg_device, {"temp_unit": "celsius"})
+        assert len(requests) == 3
+        assert requests[2]["body"]["property_data"] == [{"propertyKey": "temp_unit", "propertyValue": "celsius"}]
+
+        # Properties move along when the resource turns out to be registered under another uuid
+        self.iotcc._reset_properties(reg_device, "uuid1")
+        assert reg_device.reg_entity_id == "uuid1"
+        self.iotcc._flush_properties(force=True)
+        deadline = time.time() + 5
+        while len(requests) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(requests) == 4
+        assert requests[3]["body"]["property_data"] == [{"propertyKey": "temp_unit", "propertyValue": "celsius"}]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -60,6 +60,17 @@ class TestEntitiesMetric(unittest.TestCase):
         with self.assertRaises(TypeError):
             m = Metric("test5s", interval=(5 * ureg.second))
             assert m is None
+    def test_metric_execution_mode(self):
+        m = Metric("test_process", execution_mode="process",
+                   sampling_function=sorted)
+        assert m.execution_mode == "process"
+
+        with self.assertRaises(ValueError):
+            Metric("test_bad_mode", execution_mode="fiber")
+
+        with self.assertRaises(TypeError):
+            Metric("test_lambda", execution_mode="process",
+                   sampling_function=lambda: 1)
 
 if __name__ == '__main__':
     unittest.main()
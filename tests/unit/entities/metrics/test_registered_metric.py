@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+import mock
+
+from liota.core import metric_handler
+from liota.entities.metrics import registered_metric
+from liota.entities.metrics.metric import Metric
+from liota.entities.metrics.registered_metric import RegisteredMetric
+
+
+class TestRegisteredMetricOverrun(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [0]
+        patcher = mock.patch.object(registered_metric, 'getUTCmillis',
+                                    lambda: self.now[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _reg_metric(self, **kwargs):
+        reg_metric = RegisteredMetric(Metric("m", interval=1, **kwargs),
+                                      None, None)
+        reg_metric._next_run_time = 1000
+        return reg_metric
+
+    def test_on_time(self):
+        m = self._reg_metric()
+        self.now[0] = 1500
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 2000)
+        self.assertEqual(m.overrun_count, 0)
+
+    def test_skip(self):
+        m = self._reg_metric(overrun_policy="skip")
+        self.now[0] = 4500
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 5000)
+        self.assertEqual(m.overrun_count, 1)
+        self.assertEqual(m.skipped_ticks, 3)
+
+    def test_catch_up(self):
+        m = self._reg_metric(overrun_policy="catch_up")
+        self.now[0] = 4500
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 4500)
+        self.assertEqual(m.skipped_ticks, 2)
+        # back on the interval grid after the catch-up run
+        self.now[0] = 4600
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 5000)
+        self.assertEqual(m.overrun_count, 1)
+
+    def test_burst(self):
+        m = self._reg_metric(overrun_policy="burst", max_burst=2)
+        self.now[0] = 4500
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 2000)
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 3000)
+        m.set_next_run_time()
+        self.assertEqual(m.get_next_run_time(), 5000)
+        self.assertEqual(m.overrun_count, 3)
+        self.assertEqual(m.skipped_ticks, 1)
+
+    def test_quarantine_backoff(self):
+        m = self._reg_metric()
+        with mock.patch.object(metric_handler, 'quarantine_max_backoff_s', 5):
+            for backoff in [2, 4, 5, 5]:
+                m.quarantine()
+                self.assertEqual(m.get_next_run_time(), backoff * 1000)
+        self.assertEqual(m.quarantine_count, 4)
+        with mock.patch.object(metric_handler, 'collect_timeout_s', 60):
+            self.assertEqual(m.get_collection_timeout(), 60)
+            self.assertEqual(RegisteredMetric(
+                Metric("m", collection_timeout=2), None, None
+            ).get_collection_timeout(), 2)
+
+    def test_max_batch_latency(self):
+        m = self._reg_metric(aggregation_size=10, max_batch_latency=2)
+        self.assertFalse(m.is_ready_to_send())
+        self.now[0] = 1000
+        m.add_sample(None)
+        self.now[0] = 1500
+        m.add_sample(1)
+        self.now[0] = 3400
+        m.add_sample(2)
+        self.assertFalse(m.is_ready_to_send())
+        self.now[0] = 3500
+        self.assertTrue(m.is_ready_to_send())
+        m.reset_aggregation_size()
+        self.assertFalse(m.is_ready_to_send())
+        self.assertRaises(TypeError, Metric, "m", max_batch_latency=0)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            Metric("m", overrun_policy="ignore")
+        with self.assertRaises(TypeError):
+            Metric("m", max_burst=0)
+
+
+class TestRegisteredMetricPhase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1000000]
+        patchers = [
+            mock.patch.object(registered_metric, 'getUTCmillis',
+                              lambda: self.now[0]),
+            mock.patch.object(metric_handler, 'initialize', lambda: None),
+            mock.patch.object(metric_handler, 'event_ds', mock.Mock()),
+            mock.patch.object(metric_handler, 'phase_spreading', True),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_phase_from_uuid(self):
+        offsets = set()
+        for i in range(20):
+            m = RegisteredMetric(Metric("m%d" % i, interval=5), None, None)
+            m.start_collecting()
+            offset = m.get_phase_offset()
+            self.assertTrue(0 <= offset < 5000)
+            self.assertEqual(m.get_phase(), offset)
+            self.assertTrue(1000000 < m.get_next_run_time() <= 1005000)
+            offsets.add(offset)
+            same = RegisteredMetric(Metric("m%d" % i, interval=5), None, None)
+            self.assertEqual(same.get_phase_offset(), offset)
+        self.assertTrue(len(offsets) > 10)
+
+    def test_jitter_is_bounded(self):
+        with mock.patch.object(metric_handler, 'max_jitter_ms', 100):
+            m = RegisteredMetric(Metric("m", interval=5), None, None)
+            m.start_collecting()
+            for _ in range(20):
+                scheduled = m._scheduled_time
+                self.assertTrue(scheduled <= m.get_next_run_time() <= scheduled + 100)
+                self.now[0] = m.get_next_run_time()
+                m.set_next_run_time()
+                self.assertEqual(m._scheduled_time, scheduled + 5000)
+            self.assertEqual(m.get_phase(), m.get_phase_offset())
+            self.assertEqual(m.overrun_count, 0)
+
+
+class TestRegisteredMetricStats(unittest.TestCase):
+
+    def test_collect_and_send(self):
+        m = RegisteredMetric(Metric("m", interval=1,
+                                    sampling_function=lambda: 5),
+                             mock.Mock(), None)
+        m._next_run_time = 1000
+        with mock.patch.object(registered_metric, 'getUTCmillis',
+                               lambda: 1250):
+            m.collect()
+        self.assertEqual(m.stats.schedule_lag.get_stats()[:2], [1, 250])
+        self.assertEqual(m.stats.sampling_wall.count, 1)
+        m.stats.send_queued_at = 0
+        m.ref_dcc.publish.side_effect = Exception("down")
+        self.assertFalse(m.send_data())
+        self.assertEqual(m.stats.send_queue.count, 1)
+        self.assertEqual(m.stats.publish.count, 1)
+        self.assertEqual(m.stats.num_publish_failed, 1)
+
+    def test_top_metrics(self):
+        metrics = [RegisteredMetric(Metric("m%d" % i), None, None)
+                   for i in range(3)]
+        for i, m in enumerate(metrics):
+            m.stats.sampling_wall.record(i * 10)
+        with mock.patch.object(metric_handler, 'collecting_metrics',
+                               set(metrics)):
+            top = metric_handler.get_top_metrics(2)
+        self.assertEqual([(name, total) for name, total, _ in top],
+                         [("m2", 20), ("m1", 10)])
+
+
+class TestRegisteredMetricSinks(unittest.TestCase):
+
+    def test_fan_out(self):
+        calls = []
+
+        def sampling_function():
+            calls.append(None)
+            return 7
+
+        metric = Metric("cpu", aggregation_size=2,
+                        sampling_function=sampling_function)
+        primary = RegisteredMetric(metric, mock.Mock(), None)
+        sink = RegisteredMetric(metric, mock.Mock(), None)
+        primary.add_sink(sink)
+        self.assertRaises(ValueError, primary.add_sink,
+                          RegisteredMetric(Metric("mem"), None, None))
+        primary.flag_alive = sink.flag_alive = True
+        primary._next_run_time = registered_metric.getUTCmillis()
+        send_queue = mock.Mock()
+        with mock.patch.object(metric_handler, 'send_queue', send_queue):
+            for _ in range(2):
+                primary.collect()
+                self.assertTrue(metric_handler.complete_collection(primary))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(send_queue.put.call_args_list,
+                         [mock.call(primary), mock.call(sink)])
+        self.assertEqual(primary.values.drain(), sink.values.drain())
+        primary.stop_collecting()
+        self.assertFalse(sink.flag_alive)
+
+
+    def test_sinks_are_bounded(self):
+        metric = Metric("cpu", overflow_policy="drop_newest")
+        primary = RegisteredMetric(metric, mock.Mock(), None)
+        sink = RegisteredMetric(metric, mock.Mock(), None)
+        late_sink = RegisteredMetric(metric, mock.Mock(), None)
+        primary.add_sink(sink)
+        patches = [
+            mock.patch.object(metric_handler, 'initialize', lambda: None),
+            mock.patch.object(metric_handler, 'event_ds', mock.Mock()),
+            mock.patch.object(metric_handler, 'metric_buffer_capacity', 2),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        primary.start_collecting()
+        self.addCleanup(primary.stop_collecting)
+        primary.add_sink(late_sink)
+        for ts in range(3):
+            primary.add_sample((ts, ts))
+        for m in (primary, sink, late_sink):
+            self.assertEqual(list(m.values.drain()[1]), [0, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
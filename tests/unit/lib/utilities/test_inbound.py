@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import threading
+import unittest
+
+import mock
+
+from liota.lib.utilities.inbound import LazyMessage, WorkerPool, peek_transaction_id
+
+
+class TestInbound(unittest.TestCase):
+
+    def test_peek_transaction_id(self):
+        assert peek_transaction_id(' { "transactionID": 42, "body": {}}') == 42
+        assert peek_transaction_id('{"transactionID" : -4}') == -4
+        assert peek_transaction_id('{"type": "x", "transactionID": 42}') is None
+        assert peek_transaction_id('{"body": {"transactionID": 7}, "transactionID": 42}') is None
+        assert peek_transaction_id('{"transactionID": "abc"}') is None
+        assert peek_transaction_id('{"transactionID": 1.5}') is None
+        assert peek_transaction_id('{"type": "x"}') is None
+
+    def test_lazy_message_decodes_once(self):
+        with mock.patch('liota.lib.utilities.inbound.json.loads', return_value={"type": "x"}) as loads:
+            msg = LazyMessage('{"type": "x"}')
+            assert not loads.called
+            assert msg["type"] == "x" and msg.get("body") is None and "type" in msg
+            assert loads.call_count == 1
+        self.assertRaises(ValueError, LazyMessage("not json").get, "type")
+
+    def test_lazy_message_transaction_id(self):
+        assert LazyMessage('{"transactionID": 42, "body": {}}').transaction_id() == 42
+        assert LazyMessage('{"body": {"transactionID": 7}, "transactionID": 42}').transaction_id() == 42
+        assert LazyMessage('{"body": {"transactionID": 7}, "type": "action"}').transaction_id() is None
+        assert LazyMessage('{"type": "x", "transactionID": true}').transaction_id() is None
+        assert LazyMessage('[{"transactionID": 7}]').transaction_id() is None
+        assert LazyMessage('not json').transaction_id() is None
+
+    def test_worker_pool_drops_when_full(self):
+        release = threading.Event()
+        started = threading.Event()
+        pool = WorkerPool(size=1, queue_size=1)
+        pool.submit(lambda: started.set() or release.wait())
+        started.wait(5)
+        done = threading.Event()
+        assert pool.submit(done.set)
+        assert not pool.submit(done.set)
+        assert pool.num_dropped == 1
+        release.set()
+        assert done.wait(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import threading
+import time
+import unittest
+
+import mock
+
+from liota.lib.utilities.request_mux import Future, RequestCancelled, RequestMultiplexer, RequestTimeout
+
+
+class TestRequestMultiplexer(unittest.TestCase):
+
+    def setUp(self):
+        self.send = mock.Mock()
+        self.mux = RequestMultiplexer(self.send, max_outstanding=2, timeout=5)
+
+    def test_responses_complete_requests_out_of_order(self):
+        futures = [self.mux.submit(i, "request %d" % i) for i in range(2)]
+        assert self.send.call_args_list == [mock.call("request 0"), mock.call("request 1")]
+        assert self.mux.dispatch(1, "response 1")
+        assert not futures[0].done()
+        assert self.mux.dispatch(0, "response 0")
+        assert [future.result(1) for future in futures] == ["response 0", "response 1"]
+        assert not self.mux.dispatch(0, "response 0")
+        assert self.mux.outstanding() == 0
+
+    def test_accept_keeps_request_waiting(self):
+        future = self.mux.submit(1, "request", accept=lambda response: response == "created")
+        assert self.mux.dispatch(1, "pending")
+        assert not future.done()
+        self.mux.dispatch(1, "created")
+        assert future.result(1) == "created"
+
+    def test_completed_requests_leave_deadlines(self):
+        mux = RequestMultiplexer(self.send, max_outstanding=2, timeout=600)
+        pending = mux.submit(-1, "request")
+        for i in range(1000):
+            mux.submit(i, "request %d" % i)
+            assert mux.dispatch(i, "response %d" % i)
+            assert len(mux._deadlines) <= 2 * mux.outstanding() + 65
+        assert mux.dispatch(-1, "response")
+        assert pending.result(1) == "response"
+
+    def test_timeout_and_cancel(self):
+        expiring = self.mux.submit(1, "request", timeout=0.05)
+        self.assertRaises(RequestTimeout, expiring.result, 5)
+        assert self.mux.num_timeouts == 1
+        cancelled = self.mux.submit(2, "request")
+        assert cancelled.then(lambda response: response).cancel()
+        self.assertRaises(RequestCancelled, cancelled.result, 1)
+        assert self.mux.outstanding() == 0
+        assert not self.mux.dispatch(2, "response")
+
+    def test_submit_blocks_while_max_outstanding(self):
+        self.mux.submit(0, "request")
+        self.mux.submit(1, "request")
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: self.mux.submit(2, "request") and submitted.set())
+        thread.start()
+        time.sleep(0.05)
+        assert not submitted.is_set()
+        self.mux.dispatch(0, "response")
+        thread.join(5)
+        assert submitted.is_set()
+
+    def test_then_chains_in_callback_thread(self):
+        future = self.mux.submit(1, "request")
+        threads = []
+        chained = future.then(lambda response: threads.append(threading.current_thread()) or response.upper())
+        failing = future.then(lambda response: 1 / 0)
+        self.mux.dispatch(1, "response")
+        assert chained.result(1) == "RESPONSE"
+        self.assertRaises(ZeroDivisionError, failing.result, 1)
+        assert threads != [threading.current_thread()]
+        assert Future.completed("done").then(len).result() == 4
+
+
+if __name__ == '__main__':
+    unittest.main()
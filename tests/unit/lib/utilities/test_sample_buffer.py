@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import unittest
+from Queue import Empty
+
+import mock
+
+from liota.lib.utilities.sample_buffer import SampleBuffer
+
+
+class TestSampleBuffer(unittest.TestCase):
+
+    def test_drain_returns_columns_in_order(self):
+        buf = SampleBuffer()
+        buf.put((1000, 1))
+        buf.extend([(2000, 2), (3000, 3)])
+        self.assertEqual(3, buf.qsize())
+        timestamps, values = buf.drain()
+        self.assertEqual([1000, 2000, 3000], list(timestamps))
+        self.assertEqual([1, 2, 3], list(values))
+        self.assertEqual('l', values.typecode)
+        self.assertEqual(0, buf.qsize())
+
+    def test_column_types(self):
+        buf = SampleBuffer()
+        buf.extend([(1, 1.5), (2, 2.5)])
+        self.assertEqual('d', buf.drain()[1].typecode)
+        buf.extend([(1, 1), (2, 2.5), (3, "x")])
+        self.assertEqual([1, 2.5, "x"], buf.drain()[1])
+
+    def test_drop_oldest(self):
+        buf = SampleBuffer(3, SampleBuffer.DROP_OLDEST)
+        buf.extend([(i, i) for i in range(5)])
+        timestamps, values = buf.drain()
+        self.assertEqual([2, 3, 4], list(timestamps))
+        self.assertEqual([2, 3, 4], list(values))
+        self.assertEqual(2, buf.num_dropped)
+
+    def test_drop_newest(self):
+        buf = SampleBuffer(3, SampleBuffer.DROP_NEWEST)
+        buf.extend([(i, i) for i in range(5)])
+        self.assertEqual([0, 1, 2], list(buf.drain()[1]))
+        self.assertEqual(2, buf.num_dropped)
+
+    def test_downsample(self):
+        buf = SampleBuffer(4, SampleBuffer.DOWNSAMPLE)
+        buf.extend([(i, i) for i in range(5)])
+        self.assertEqual([1, 3, 4], list(buf.drain()[1]))
+        self.assertEqual(2, buf.num_dropped)
+
+    def test_get_compat(self):
+        buf = SampleBuffer(2)
+        buf.extend([(1, 10), (2, 20), (3, 30)])
+        self.assertEqual((2, 20), buf.get())
+        self.assertEqual((3, 30), buf.get())
+        self.assertRaises(Empty, buf.get)
+
+    def test_millisecond_timestamps_with_32_bit_long(self):
+        with mock.patch('liota.lib.utilities.sample_buffer._TIMESTAMP_TYPECODE', 'd'):
+            buf = SampleBuffer(2)
+            buf.extend([(1700000000001, 1), (1700000000002, 2),
+                        (1700000000003, 3)])
+            self.assertEqual((1700000000002, 2), buf.get())
+            timestamps, values = buf.drain()
+        self.assertEqual([1700000000003], timestamps)
+        self.assertIsInstance(timestamps[0], long)
+
+    def test_invalid_arguments(self):
+        self.assertRaises(TypeError, SampleBuffer, -1)
+        self.assertRaises(ValueError, SampleBuffer, 1, "drop_all")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)
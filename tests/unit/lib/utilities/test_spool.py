@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from liota.lib.utilities.spool import SegmentSpool, SpoolReplayer
+
+
+class TestSegmentSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _drain(self, spool):
+        payloads = []
+        while True:
+            payload = spool.get(timeout=0)
+            if payload is None:
+                return payloads
+            payloads.append(payload)
+            spool.commit()
+
+    def test_in_order_across_segments(self):
+        spool = SegmentSpool(self.directory, segment_size=64, max_size=4096)
+        payloads = ["message %d" % i for i in range(20)] + ["x" * 100]
+        for payload in payloads:
+            spool.append(payload)
+        self.assertTrue(spool.has_backlog())
+        self.assertEqual(spool.get(timeout=0), payloads[0])
+        # not committed yet, same record again
+        self.assertEqual(spool.get(timeout=0), payloads[0])
+        self.assertEqual(self._drain(spool), payloads)
+        self.assertFalse(spool.has_backlog())
+        # consumed segments are removed
+        self.assertEqual(len([f for f in os.listdir(self.directory)
+                              if f.endswith(".seg")]), 1)
+        spool.close()
+
+    def test_recover_after_restart(self):
+        spool = SegmentSpool(self.directory, segment_size=64, max_size=4096)
+        for i in range(10):
+            spool.append("message %d" % i)
+        for _ in range(3):
+            spool.get()
+            spool.commit()
+        spool.close()
+        spool = SegmentSpool(self.directory, segment_size=64, max_size=4096)
+        spool.append("message 10")
+        self.assertEqual(self._drain(spool),
+                         ["message %d" % i for i in range(3, 11)])
+        spool.close()
+
+    def test_retention_drops_oldest_segments(self):
+        spool = SegmentSpool(self.directory, segment_size=64, max_size=256)
+        for i in range(40):
+            spool.append("message %02d" % i)
+        self.assertTrue(spool.get_size() <= 256)
+        self.assertTrue(spool.get_stats()[2] > 0)
+        payloads = self._drain(spool)
+        self.assertEqual(payloads[-1], "message 39")
+        self.assertEqual(payloads, sorted(payloads))
+        spool.close()
+
+
+class TestSpoolReplayer(unittest.TestCase):
+
+    def test_replay_after_failure(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        spool = SegmentSpool(directory, segment_size=1024, max_size=4096)
+        for i in range(3):
+            spool.append(pickle.dumps(("message %d" % i, None), 2))
+        sent = []
+        done = threading.Event()
+
+        def send(message, msg_attr):
+            if not sent:
+                sent.append(None)
+                raise IOError("link down")
+            sent.append(message)
+            if len(sent) == 4:
+                done.set()
+
+        with mock.patch('liota.lib.utilities.spool._sleep'):
+            replayer = SpoolReplayer(spool, send)
+            done.wait(5)
+            replayer.flag_alive = False
+            replayer.join(5)
+        self.assertEqual(sent[1:], ["message 0", "message 1", "message 2"])
+        self.assertFalse(spool.has_backlog())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import ConfigParser
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from liota.lib.utilities.utility import LiotaConfigPath, read_liota_config
+
+
+class TestReadLiotaConfig(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'liota.conf')
+        with open(path, 'w') as f:
+            f.write("[CORE_CFG]\ncollect_thread_pool_size = 30\n")
+        patch = mock.patch.object(LiotaConfigPath, 'path_liota_config', path)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_present_configuration(self):
+        self.assertEqual('30', read_liota_config('CORE_CFG', 'collect_thread_pool_size', '10'))
+
+    def test_absent_configuration_uses_default(self):
+        self.assertEqual('8', read_liota_config('CORE_CFG', 'collect_batch_size', '8'))
+        self.assertEqual('False', read_liota_config('IOTCC_PATH', 'iotcc_warm_start', 'False'))
+
+    def test_absent_configuration_without_default(self):
+        self.assertRaises(ConfigParser.NoOptionError, read_liota_config, 'CORE_CFG', 'collect_batch_size')
+
+
+if __name__ == '__main__':
+    unittest.main()
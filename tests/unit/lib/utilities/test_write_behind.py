@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ----------------------------------------------------------------------------#
+#  Copyright © 2015-2016 VMware, Inc. All Rights Reserved.                    #
+#                                                                             #
+#  Licensed under the BSD 2-Clause License (the “License”); you may not use   #
+#  this file except in compliance with the License.                           #
+#                                                                             #
+#  The BSD 2-Clause License                                                   #
+#                                                                             #
+#  Redistribution and use in source and binary forms, with or without         #
+#  modification, are permitted provided that the following conditions are met:#
+#                                                                             #
+#  - Redistributions of source code must retain the above copyright notice,   #
+#      this list of conditions and the following disclaimer.                  #
+#                                                                             #
+#  - Redistributions in binary form must reproduce the above copyright        #
+#      notice, this list of conditions and the following disclaimer in the    #
+#      documentation and/or other materials provided with the distribution.   #
+#                                                                             #
+#  THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"#
+#  AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE  #
+#  IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE #
+#  ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE  #
+#  LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR        #
+#  CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF       #
+#  SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS   #
+#  INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN    #
+#  CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)    #
+#  ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF     #
+#  THE POSSIBILITY OF SUCH DAMAGE.                                            #
+# ----------------------------------------------------------------------------#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+
+from liota.lib.utilities.write_behind import WriteBehindFiles
+
+
+class TestWriteBehindFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_changes_are_coalesced(self):
+        writer = WriteBehindFiles(debounce_ms=50)
+        path = os.path.join(self.directory, "a.json")
+        render = mock.Mock(return_value="rendered")
+        for i in range(10):
+            writer.write(path, str(i))
+        writer.write(path, render)
+        assert writer.pending(path)
+        assert not os.path.exists(path)
+        deadline = time.time() + 5
+        while writer.pending(path) and time.time() < deadline:
+            time.sleep(0.01)
+        writer.flush()
+        with open(path) as f:
+            assert f.read() == "rendered"
+        assert render.call_count == 1
+        assert writer.num_changes == 11 and writer.num_writes == 1
+        assert os.listdir(self.directory) == ["a.json"]
+
+    def test_flush_writes_pending_files(self):
+        writer = WriteBehindFiles(debounce_ms=60000)
+        paths = [os.path.join(self.directory, "%d.json" % i) for i in range(3)]
+        for path in paths:
+            writer.write(path, u"caf\xe9")
+        writer.flush()
+        for path in paths:
+            assert not writer.pending(path)
+            with open(path) as f:
+                assert f.read().decode('utf-8') == u"caf\xe9"
+
+    def test_remove_is_ordered_with_writes(self):
+        writer = WriteBehindFiles(debounce_ms=60000)
+        path = os.path.join(self.directory, "a.json")
+        writer.write(path, "a")
+        writer.flush()
+        writer.write(path, "b")
+        writer.remove(path)
+        assert writer.pending(path)
+        writer.flush()
+        assert not os.path.exists(path)
+        writer.remove(path)
+        writer.flush()
+        assert os.listdir(self.directory) == []
+
+
+if __name__ == '__main__':
+    unittest.main()